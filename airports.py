@@ -0,0 +1,208 @@
+import array
+import csv
+import mmap
+import os
+import re
+import unicodedata
+from collections import namedtuple
+
+# Bundled airport dataset: iata,icao,name,city,country,lat,lon,aliases ('|'-separated).
+# It is a curated subset (about 150 major airports), not a full list; other places fall back to
+# name lookups upstream. A larger file in the same format can replace it.
+# The first airport listed for a city is the one used when only the city is known.
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'airports.csv')
+
+Airport = namedtuple('Airport', ['iata', 'icao', 'name', 'city', 'country', 'lat', 'lon'])
+
+NON_ALNUM_RE = re.compile(r'[^a-z0-9]+')
+
+
+# Function to normalize a place name for lookups (lower-case, no accents or punctuation)
+def normalize_name(name):
+    if not name.isascii():
+        name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode('ascii')
+    return NON_ALNUM_RE.sub(' ', name.lower()).strip()
+
+
+# Function to compute the edit distance (Levenshtein plus adjacent transpositions, so 'yrok' is one
+# typo from 'york'), only filling the diagonal band that can stay within max_distance and giving up
+# as soon as every cell in a row exceeds it
+def edit_distance(a, b, max_distance):
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    too_far = max_distance + 1
+    before = None
+    previous = [j if j <= max_distance else too_far for j in range(len(b) + 1)]
+    for i, char_a in enumerate(a, 1):
+        low, high = max(1, i - max_distance), min(len(b), i + max_distance)
+        current = [too_far] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        for j in range(low, high + 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != b[j - 1]))
+            if before is not None and j > 1 and char_a == b[j - 2] and a[i - 2] == b[j - 1]:
+                cost = min(cost, before[j - 2] + 1)
+            current[j] = cost
+        if min(current[low - 1:high + 1]) > max_distance:
+            return too_far
+        before, previous = previous, current
+    return min(previous[-1], too_far)
+
+
+# Function to split a name into padded trigrams for the fuzzy-match candidate filter
+def trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# Function to pick how many typos to tolerate for a query of this length
+def default_max_distance(name):
+    if len(name) < 5:
+        return 0
+    return 1 if len(name) < 8 else 2
+
+
+# Function to pick how many typos to tolerate in one word of a multi-word name
+def word_max_distance(word):
+    if len(word) < 4:
+        return 0
+    return 1 if len(word) < 8 else 2
+
+
+# Function to check a multi-word match word by word, so that exact words cannot absorb the whole
+# typo budget and carry an unrelated one ('san fran' is not 'san juan')
+def words_match(name, candidate):
+    words, candidate_words = name.split(), candidate.split()
+    if len(words) != len(candidate_words):
+        return False
+    return all(
+        edit_distance(word, candidate_word, word_max_distance(word)) <= word_max_distance(word)
+        for word, candidate_word in zip(words, candidate_words)
+    )
+
+
+# Read-only airport index over a memory-mapped copy of the dataset. Only byte offsets, IATA codes
+# and small key -> row maps are kept in memory; full rows are decoded from the mapping on demand.
+class AirportIndex:
+    def __init__(self, path=DATA_PATH):
+        with open(path, 'rb') as data_file:
+            self._data = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = array.array('I')
+        self._iata = []
+        self._codes = {}
+        self._names = {}
+        self._trigrams = {}
+        self._leading_words = set()
+
+        self._data.readline()  # Skip the header
+        while True:
+            offset = self._data.tell()
+            line = self._data.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            row = len(self._offsets)
+            self._offsets.append(offset)
+            fields = next(csv.reader([line.decode('utf-8')]))
+            iata, icao, name, city = fields[0], fields[1], fields[2], fields[3]
+            self._iata.append(iata)
+            self._codes.setdefault(iata.upper(), row)
+            self._codes.setdefault(icao.upper(), row)
+            aliases = [alias for alias in fields[7].split('|') if alias]
+            for place in [city, *aliases, name]:
+                self._add_name(normalize_name(place), row)
+        self._offsets.append(len(self._data))
+
+    def _add_name(self, name, row):
+        rows = self._names.setdefault(name, [])
+        if row not in rows:
+            rows.append(row)
+        if ' ' in name:
+            self._leading_words.add(name.split(' ', 1)[0])
+        for gram in trigrams(name):
+            self._trigrams.setdefault(gram, set()).add(name)
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _airport(self, row):
+        line = self._data[self._offsets[row]:self._offsets[row + 1]].decode('utf-8')
+        iata, icao, name, city, country, lat, lon, _aliases = next(csv.reader([line]))
+        return Airport(iata, icao, name, city, country, float(lat), float(lon))
+
+    # Function to look up an airport by IATA or ICAO code
+    def lookup_code(self, code):
+        row = self._codes.get(code.strip().upper())
+        return None if row is None else self._airport(row)
+
+    # Function to list the airports serving a city or alias (primary airport first)
+    def find_city(self, name):
+        return [self._airport(row) for row in self._names.get(normalize_name(name), [])]
+
+    # Function to check whether a normalized word starts a multi-word place name ('san', 'los')
+    def starts_name(self, word):
+        return word in self._leading_words
+
+    # Function to get the primary airport's IATA code for an already-normalized place name
+    def primary_code(self, normalized_name):
+        rows = self._names.get(normalized_name)
+        return self._iata[rows[0]] if rows else None
+
+    # Function to find the closest known place name within max_distance typos. Multi-word names must
+    # also match word by word, and a tie between places served by different airports is ambiguous.
+    def fuzzy_name(self, name, max_distance=None):
+        name = normalize_name(name)
+        if name in self._names:
+            return name
+        if max_distance is None:
+            max_distance = default_max_distance(name)
+        if max_distance == 0:
+            return None
+        # Each edit destroys at most four trigrams (a transposition), so real matches share at least this many
+        grams = trigrams(name)
+        needed = max(1, len(grams) - 4 * max_distance)
+        shared = {}
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        multi_word = ' ' in name
+        best, best_distance, ambiguous = None, max_distance + 1, False
+        for candidate, count in shared.items():
+            if count < needed:
+                continue
+            distance = edit_distance(name, candidate, max_distance)
+            if distance > max_distance or (multi_word and not words_match(name, candidate)):
+                continue
+            if distance < best_distance:
+                best, best_distance, ambiguous = candidate, distance, False
+            elif distance == best_distance and self._names[candidate][0] != self._names[best][0]:
+                ambiguous = True
+        return None if ambiguous else best
+
+    # Function to find the primary airport for a code, city, alias or misspelled city name
+    def resolve(self, query, fuzzy=True):
+        if not query or not query.strip():
+            return None
+        airport = self.lookup_code(query)
+        if airport:
+            return airport
+        airports = self.find_city(query)
+        if airports:
+            return airports[0]
+        if fuzzy:
+            name = self.fuzzy_name(query)
+            if name:
+                return self._airport(self._names[name][0])
+        return None
+
+
+_index = None
+
+
+# Function to get the process-wide airport index, loading it on first use
+def get_airport_index():
+    global _index
+    if _index is None:
+        _index = AirportIndex()
+    return _index
@@ -0,0 +1,93 @@
+# Micro-benchmark comparing the precompiled intent router with the original keyword-scan path.
+# Run from the repository root: python -m benchmarks.bench_intents
+import os
+import re
+import timeit
+from datetime import datetime
+
+from intents import route
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'sample_queries.txt')
+
+
+# Original routing path from submit_input: repeated lower-casing, separate keyword scans and
+# regexes compiled (or looked up in the re cache) on every call
+def legacy_route(user_input):
+    flight_status_requested = any(keyword in user_input.lower() for keyword in ['status', 'delayed', 'delay'])
+    weather_requested = any(keyword in user_input.lower() for keyword in ['weather', 'temperature', 'forecast', 'weather like'])
+    baggage_inquiry = any(keyword in user_input.lower() for keyword in ['baggage', 'luggage', 'bag', 'carry-on', 'checked bag', 'baggage allowance', 'baggage policy', 'baggage fees'])
+    cancellation_inquiry = any(keyword in user_input.lower() for keyword in ['cancel', 'change', 'refund', 'reschedule', 'cancellation policy', 'change flight'])
+    frequent_flyer_inquiry = any(keyword in user_input.lower() for keyword in ['frequent flyer', 'loyalty program', 'miles', 'points', 'membership', 'reward program'])
+
+    flight_number_match = re.search(r'\b([A-Za-z]{2}\s?\d{1,4})\b', user_input)
+    flight_number = flight_number_match.group(1).replace(" ", "") if flight_number_match else None
+    if flight_number and flight_status_requested:
+        return 'flight_status'
+
+    text = re.sub(r'(\d+)(st|nd|rd|th)', r'\1', user_input.lower())
+    date_match = re.search(r'\b(\w+\s\d{1,2}(?:,|\s)\d{4})\b', text)
+    if not date_match:
+        date_match = re.search(r'\b(\d{4}/\d{2}/\d{2})\b', text)
+    if not date_match:
+        date_match = re.search(r'\b(\d{4}-\d{2}-\d{2})\b', text)
+    if not date_match:
+        date_match = re.search(r'\b(\d{1,2}/\d{1,2}/\d{4})\b', text)
+    date = None
+    if date_match:
+        for fmt in ('%B %d %Y', '%B %d, %Y', '%Y/%m/%d', '%Y-%m-%d', '%m/%d/%Y'):
+            try:
+                date = datetime.strptime(date_match.group(1), fmt).strftime('%Y-%m-%d')
+                break
+            except ValueError:
+                date = None
+    city_to_iata = {
+        'new york': 'JFK', 'los angeles': 'LAX', 'san francisco': 'SFO', 'chicago': 'ORD', 'miami': 'MIA',
+        'california': 'LAX', 'atlanta': 'ATL', 'dallas': 'DFW', 'denver': 'DEN', 'seattle': 'SEA', 'boston': 'BOS',
+    }
+    departure_city = None
+    arrival_city = None
+    for city in city_to_iata.keys():
+        if city in text.lower():
+            if any(prefix + city in text.lower() for prefix in ['from ', 'leaving ', 'departing ']):
+                departure_city = city_to_iata[city]
+            elif any(prefix + city in text.lower() for prefix in ['to ', 'arriving at ', 'going to ', 'destination ', 'arriving in ']):
+                arrival_city = city_to_iata[city]
+    if departure_city and arrival_city and date:
+        return 'flight_schedules'
+
+    if weather_requested and not flight_number:
+        clean = re.sub(r'[^\w\s]', '', user_input.lower())
+        re.search(r'weather.*(?:at|in|like at|like in|for)?\s+([a-zA-Z\s]{3,})', clean)
+        return 'weather'
+    if baggage_inquiry:
+        return 'baggage'
+    if cancellation_inquiry:
+        return 'cancellation'
+    if frequent_flyer_inquiry:
+        return 'frequent_flyer'
+    return 'chat'
+
+
+def load_corpus():
+    with open(CORPUS_PATH, encoding='utf-8') as corpus_file:
+        return [line.strip() for line in corpus_file if line.strip()]
+
+
+def main(repeat=5, number=200):
+    corpus = load_corpus()
+    mismatches = [(query, legacy_route(query), route(query).intent) for query in corpus
+                  if legacy_route(query) != route(query).intent]
+    for query, legacy, routed in mismatches:
+        print(f"MISMATCH {query!r}: legacy={legacy} router={routed}")
+
+    results = {}
+    for name, router in (('legacy', legacy_route), ('router', route)):
+        timer = timeit.Timer(lambda: [router(query) for query in corpus])
+        best = min(timer.repeat(repeat=repeat, number=number))
+        results[name] = best / (number * len(corpus)) * 1e6
+        print(f"{name:>7}: {results[name]:.2f} µs per query ({len(corpus)} queries)")
+    print(f"speedup: {results['legacy'] / results['router']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
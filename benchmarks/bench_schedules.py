@@ -0,0 +1,125 @@
+# Benchmark of schedule handling on a large synthetic AviationStack response: the original path
+# (json.loads + markdown for every flight) against streamed FlightRecords + a rendered first page.
+# Run from the repository root: python -m benchmarks.bench_schedules [flights]
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from cache import estimate_size
+from flights import parse_schedule, render_schedule_page, ijson
+
+AIRLINES = ['American Airlines', 'Delta Air Lines', 'United Airlines', 'JetBlue Airways', 'Alaska Airlines']
+STATUSES = ['scheduled', 'active', 'landed', 'cancelled', 'diverted']
+
+
+# Function to build an AviationStack-shaped /flights payload with the given number of flights
+def synthetic_payload(flights, seed=7):
+    rng = random.Random(seed)
+    data = []
+    for index in range(flights):
+        hour, minute = rng.randrange(24), rng.randrange(0, 60, 5)
+        data.append({
+            'flight_date': '2025-03-05',
+            'flight_status': rng.choice(STATUSES),
+            'departure': {
+                'airport': 'John F Kennedy International', 'timezone': 'America/New_York', 'iata': 'JFK',
+                'icao': 'KJFK', 'terminal': str(rng.randrange(1, 9)), 'gate': f"B{rng.randrange(1, 60)}",
+                'delay': rng.choice([None, 5, 15, 40]), 'scheduled': f"2025-03-05T{hour:02d}:{minute:02d}:00+00:00",
+                'estimated': f"2025-03-05T{hour:02d}:{minute:02d}:00+00:00", 'actual': None,
+                'estimated_runway': None, 'actual_runway': None,
+            },
+            'arrival': {
+                'airport': 'Los Angeles International', 'timezone': 'America/Los_Angeles', 'iata': 'LAX',
+                'icao': 'KLAX', 'terminal': str(rng.randrange(1, 8)), 'gate': f"{rng.randrange(20, 80)}",
+                'baggage': str(rng.randrange(1, 12)), 'delay': None,
+                'scheduled': f"2025-03-05T{(hour + 6) % 24:02d}:{minute:02d}:00+00:00",
+                'estimated': None, 'actual': None, 'estimated_runway': None, 'actual_runway': None,
+            },
+            'airline': {'name': rng.choice(AIRLINES), 'iata': 'XX', 'icao': 'XXX'},
+            'flight': {'number': str(index), 'iata': f"XX{index}", 'icao': f"XXX{index}", 'codeshared': None},
+            'aircraft': None,
+            'live': None,
+        })
+    payload = {'pagination': {'limit': flights, 'offset': 0, 'count': flights, 'total': flights}, 'data': data}
+    return json.dumps(payload).encode('utf-8')
+
+
+# Original get_flight_schedules: every flight is formatted and the whole string is kept
+def legacy_schedules(payload):
+    data = json.loads(payload)
+    flights_info = []
+    for flight in data['data']:
+        airline = flight.get('airline', {}).get('name', 'Unknown Airline')
+        flight_iata = flight.get('flight', {}).get('iata', 'Unknown Flight')
+        departure_airport = flight.get('departure', {}).get('airport', 'Unknown Departure Airport')
+        departure_time = flight.get('departure', {}).get('scheduled', 'Unknown Departure Time')
+        arrival_airport = flight.get('arrival', {}).get('airport', 'Unknown Arrival Airport')
+        arrival_time = flight.get('arrival', {}).get('scheduled', 'Unknown Arrival Time')
+        flight_status = flight.get('flight_status', 'Status not available').capitalize()
+        departure_terminal = flight.get('departure', {}).get('terminal', 'N/A')
+        departure_gate = flight.get('departure', {}).get('gate', 'N/A')
+        arrival_terminal = flight.get('arrival', {}).get('terminal', 'N/A')
+        arrival_gate = flight.get('arrival', {}).get('gate', 'N/A')
+        flights_info.append(
+            f"- **Airline:** {airline}\n"
+            f"  **Flight Number:** {flight_iata}\n"
+            f"  **Status:** {flight_status}\n"
+            f"  **Departure Airport:** {departure_airport}\n"
+            f"    - **Terminal:** {departure_terminal}\n"
+            f"    - **Gate:** {departure_gate}\n"
+            f"  **Scheduled Departure:** {departure_time}\n"
+            f"  **Arrival Airport:** {arrival_airport}\n"
+            f"    - **Terminal:** {arrival_terminal}\n"
+            f"    - **Gate:** {arrival_gate}\n"
+            f"  **Scheduled Arrival:** {arrival_time}\n"
+        )
+    response_message = "Here are the available flights from JFK to LAX on 2025-03-05:\n\n"
+    response_message += "\n".join(flights_info)
+    # The legacy path cached the parsed payload and kept the markdown in the session
+    return (data, response_message), response_message
+
+
+# New path: records parsed from the byte stream, only the first page rendered
+def record_schedules(payload):
+    result = parse_schedule(io.BytesIO(payload))
+    page = render_schedule_page(result.records)
+    return result.records, page
+
+
+# Function to time a path (best of several runs, untraced) and measure its peak and retained memory
+def measure(function, payload, repeat=3):
+    elapsed = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(payload)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    tracemalloc.start()
+    retained, shown = function(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, estimate_size(retained), len(shown)
+
+
+def main(flights=5000):
+    payload = synthetic_payload(flights)
+    print(f"payload: {flights} flights, {len(payload) / 1e6:.1f} MB, parser: {'ijson' if ijson else 'json'}")
+    results = {}
+    for name, function in (('legacy', legacy_schedules), ('records', record_schedules)):
+        elapsed, peak, retained, shown = measure(function, payload)
+        results[name] = (elapsed, peak, retained)
+        print(
+            f"{name:>8}: {elapsed * 1e3:8.1f} ms, peak {peak / 1e6:6.1f} MB, "
+            f"retained {retained / 1e6:6.1f} MB, rendered {shown / 1e3:7.1f} KB"
+        )
+    legacy, records = results['legacy'], results['records']
+    print(
+        f"speedup: {legacy[0] / records[0]:.2f}x, peak memory {legacy[1] / records[1]:.2f}x lower, "
+        f"retained memory {legacy[2] / records[2]:.2f}x lower"
+    )
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,254 @@
+# Load test: virtual users replay the sample corpus through ChatEngine concurrently, against the local
+# stub servers, and the run reports per-intent latency percentiles, upstream calls, throughput and
+# memory per session. Run from the repository root:
+#   python -m benchmarks.load_test --users 50
+#   python -m benchmarks.load_test --users 500 --save-baseline
+#   python -m benchmarks.load_test --users 500 --compare
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_intents import load_corpus
+from benchmarks.stub_servers import StubConfig, start_stubs, stop_stubs
+from cache import TTLCache, estimate_size
+from engine import ChatEngine, ChatSession, EngineConfig
+from upstream import UpstreamClient
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+# Allowed relative slowdown before a metric counts as a regression against the baseline
+DEFAULT_TOLERANCE = 0.2
+
+# Latency differences below this many seconds are treated as noise
+LATENCY_NOISE_FLOOR = 0.005
+
+# Replies that mean the turn failed rather than answered
+ERROR_PREFIXES = ("Error:", "Sorry, there was an error")
+
+
+# Function to pick the value at a percentile (nearest rank) from sorted samples
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    rank = max(1, int(round(fraction * len(samples) + 0.5)))
+    return samples[min(rank, len(samples)) - 1]
+
+
+# Function to summarize latency samples in seconds
+def latency_summary(samples, errors=0):
+    samples = sorted(samples)
+    return {
+        'count': len(samples),
+        'errors': errors,
+        'p50': percentile(samples, 0.50),
+        'p95': percentile(samples, 0.95),
+        'p99': percentile(samples, 0.99),
+        'max': samples[-1] if samples else None,
+    }
+
+
+# Function to run one virtual user: a fresh session sending the corpus in a shuffled order
+def run_user(engine, corpus, messages, seed, stream, think_time):
+    rng = random.Random(seed)
+    session = ChatSession()
+    engine.greet(session)
+    samples = []
+    for index in range(messages):
+        if index % len(corpus) == 0:
+            order = rng.sample(corpus, len(corpus))
+        message = order[index % len(corpus)]
+        start = time.perf_counter()
+        response = engine.respond(session, message, stream)
+        if response.stream is not None:
+            for _ in response.stream:
+                pass
+        elapsed = time.perf_counter() - start
+        failed = any(reply.startswith(ERROR_PREFIXES) for reply in response.replies)
+        samples.append((response.intent, elapsed, failed))
+        if think_time:
+            time.sleep(rng.uniform(0, 2 * think_time))
+    return session, samples
+
+
+# Function to run the whole load test and return its report
+def run_load_test(users=50, messages=None, stream=False, think_time=0.0, latency=0.05, jitter=0.02,
+                  llm_latency=0.3, token_delay=0.002, error_rate=0.0, schedule_size=40, seed=1):
+    corpus = load_corpus()
+    messages = messages or len(corpus)
+    stubs = start_stubs({
+        'aviationstack': StubConfig(latency, jitter, error_rate),
+        'openweather': StubConfig(latency, jitter, error_rate),
+        'openai': StubConfig(llm_latency, jitter, error_rate, token_delay=token_delay),
+    }, schedule_size=schedule_size)
+    try:
+        upstream = UpstreamClient(
+            base_urls={name: stubs[name].base_url for name in ('aviationstack', 'openweather')},
+            pool_maxsize=max(20, users)
+        )
+        config = EngineConfig(
+            openai_api_key='stub', aviationstack_api_key='stub', openweather_api_key='stub',
+            openai_base_url=stubs['openai'].base_url, stream_responses=stream,
+            tool_workers=max(8, users // 4), track_flights=False
+        )
+        engine = ChatEngine(config, upstream=upstream, cache=TTLCache())
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=users, thread_name_prefix="load-user") as pool:
+            futures = [
+                pool.submit(run_user, engine, corpus, messages, seed + user, stream, think_time)
+                for user in range(users)
+            ]
+            results = [future.result() for future in futures]
+        wall_time = time.perf_counter() - start
+        upstream_calls = {name: {'calls': stub.calls, 'errors': stub.errors} for name, stub in stubs.items()}
+    finally:
+        stop_stubs(stubs)
+
+    by_intent = {}
+    all_samples = []
+    errors = {}
+    for _, samples in results:
+        for intent, elapsed, failed in samples:
+            by_intent.setdefault(intent, []).append(elapsed)
+            all_samples.append(elapsed)
+            errors[intent] = errors.get(intent, 0) + failed
+    sessions = [session for session, _ in results]
+    session_bytes = [estimate_size(session.messages) + estimate_size(session.schedule) for session in sessions]
+    total_calls = sum(calls['calls'] for calls in upstream_calls.values())
+
+    return {
+        'config': {
+            'users': users, 'messages_per_user': messages, 'stream': stream, 'think_time': think_time,
+            'latency': latency, 'jitter': jitter, 'llm_latency': llm_latency, 'token_delay': token_delay,
+            'error_rate': error_rate, 'schedule_size': schedule_size, 'seed': seed,
+        },
+        'requests': len(all_samples),
+        'wall_time': wall_time,
+        'throughput': len(all_samples) / wall_time,
+        'overall': latency_summary(all_samples, sum(errors.values())),
+        'intents': {intent: latency_summary(samples, errors[intent]) for intent, samples in sorted(by_intent.items())},
+        'upstream_calls': upstream_calls,
+        'upstream_calls_per_message': total_calls / max(1, len(all_samples)),
+        'cache': engine.cache.stats(),
+        'response_cache': engine.response_cache.stats(),
+        'memory': {
+            'per_session_bytes': sum(session_bytes) / max(1, len(session_bytes)),
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+    }
+
+
+def _ms(value):
+    return "     n/a" if value is None else f"{value * 1e3:8.1f}"
+
+
+def print_report(report):
+    config = report['config']
+    print(
+        f"{config['users']} users x {config['messages_per_user']} messages, stream={config['stream']}, "
+        f"error rate {config['error_rate']:.0%}"
+    )
+    print(f"{'intent':<18}{'count':>7}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for intent, summary in list(report['intents'].items()) + [('overall', report['overall'])]:
+        print(
+            f"{intent:<18}{summary['count']:>7}{summary['errors']:>8}"
+            f"{_ms(summary['p50'])}{_ms(summary['p95'])}{_ms(summary['p99'])}"
+        )
+    print(f"throughput: {report['throughput']:.1f} messages/s over {report['wall_time']:.1f}s")
+    calls = ", ".join(
+        f"{name} {counts['calls']} ({counts['errors']} injected errors)"
+        for name, counts in report['upstream_calls'].items()
+    )
+    print(f"upstream calls: {calls}; {report['upstream_calls_per_message']:.2f} per message")
+    print(f"cache hit rate: {report['cache']['hit_rate']:.1%}, coalesced loads: {report['cache']['coalesced']}")
+    print(
+        f"memory: {report['memory']['per_session_bytes'] / 1024:.1f} KB per session, "
+        f"peak RSS {report['memory']['peak_rss_mb']:.0f} MB"
+    )
+
+
+def baseline_path(users, stream):
+    return os.path.join(BASELINE_DIR, f"load_{users}u{'_stream' if stream else ''}.json")
+
+
+# Function to list the metrics that got worse than the baseline by more than the tolerance
+def compare_reports(baseline, report, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for intent, summary in report['intents'].items():
+        previous = baseline['intents'].get(intent)
+        if not previous:
+            continue
+        for metric in ('p95', 'p99'):
+            old, new = previous[metric], summary[metric]
+            if old is not None and new is not None and new > old * (1 + tolerance) and new - old > LATENCY_NOISE_FLOOR:
+                regressions.append(f"{intent} {metric}: {old * 1e3:.1f} ms -> {new * 1e3:.1f} ms")
+    if report['throughput'] < baseline['throughput'] * (1 - tolerance):
+        regressions.append(f"throughput: {baseline['throughput']:.1f} -> {report['throughput']:.1f} messages/s")
+    for name, old, new in (
+        ('upstream calls per message', baseline['upstream_calls_per_message'], report['upstream_calls_per_message']),
+        ('memory per session', baseline['memory']['per_session_bytes'], report['memory']['per_session_bytes']),
+    ):
+        if new > old * (1 + tolerance):
+            regressions.append(f"{name}: {old:.2f} -> {new:.2f}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the sample corpus through ChatEngine against stub upstreams.")
+    parser.add_argument('--users', type=int, default=50, help="concurrent virtual users (e.g. 50 or 500)")
+    parser.add_argument('--messages', type=int, default=None, help="messages per user (default: the whole corpus)")
+    parser.add_argument('--stream', action='store_true', help="stream fallback replies")
+    parser.add_argument('--think-ms', type=float, default=0, help="mean pause between a user's messages")
+    parser.add_argument('--latency-ms', type=float, default=50, help="mean AviationStack/OpenWeather latency")
+    parser.add_argument('--jitter-ms', type=float, default=20, help="latency standard deviation")
+    parser.add_argument('--llm-latency-ms', type=float, default=300, help="mean OpenAI latency before the first token")
+    parser.add_argument('--token-delay-ms', type=float, default=2, help="delay between streamed tokens")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="fraction of upstream requests that fail")
+    parser.add_argument('--schedule-size', type=int, default=40, help="flights returned per schedule search")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help="also write the report to this file")
+    parser.add_argument('--save-baseline', action='store_true', help="store the report as the baseline for this setup")
+    parser.add_argument('--compare', action='store_true', help="fail if the run regressed against the saved baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    report = run_load_test(
+        users=args.users, messages=args.messages, stream=args.stream, think_time=args.think_ms / 1e3,
+        latency=args.latency_ms / 1e3, jitter=args.jitter_ms / 1e3, llm_latency=args.llm_latency_ms / 1e3,
+        token_delay=args.token_delay_ms / 1e3, error_rate=args.error_rate, schedule_size=args.schedule_size,
+        seed=args.seed
+    )
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as report_file:
+            json.dump(report, report_file, indent=2)
+
+    path = baseline_path(args.users, args.stream)
+    if args.compare:
+        if not os.path.exists(path):
+            print(f"no baseline at {path}; run with --save-baseline first")
+            return 2
+        with open(path, encoding='utf-8') as baseline_file:
+            regressions = compare_reports(json.load(baseline_file), report, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"no regressions against {path}")
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+        print(f"baseline saved to {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
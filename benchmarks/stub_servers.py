@@ -0,0 +1,319 @@
+# Local stand-ins for AviationStack, OpenWeather and OpenAI used by the load test. Responses are
+# built from the recorded fixtures in benchmarks/fixtures with configurable latency and error injection.
+import copy
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Canned fallback reply streamed word by word by the OpenAI stub
+LLM_REPLY = (
+    "Thanks for reaching out! I'm happy to help with that. Our team can assist with bookings, seating, "
+    "meals and special requests, and you can manage most of them from the My Trips page."
+)
+
+# Text the OpenAI stub sends along with tool calls, and its answer once the tool results are in
+TOOL_PREAMBLE = "Let me look that up."
+TOOL_REPLY = "Here is what I found from {count} tool results."
+
+FLIGHT_RE = re.compile(r'\b([A-Z]{2}\s?\d{1,4})\b')
+WEATHER_PLACE_RE = re.compile(r'weather (?:in|at|for) ([A-Za-z ]+?)(?:[?.!,]|$)', re.IGNORECASE)
+POLICY_TOOLS = (
+    ('baggage', 'get_baggage_policy'), ('cancel', 'get_cancellation_policy'), ('refund', 'get_cancellation_policy'),
+    ('miles', 'get_frequent_flyer_info'),
+)
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as fixture_file:
+        return json.load(fixture_file)
+
+
+# Latency and failure behaviour of one stub provider
+class StubConfig:
+    def __init__(self, latency=0.05, jitter=0.02, error_rate=0.0, error_status=503, token_delay=0.0,
+                 tool_calls=False):
+        self.latency = latency
+        self.jitter = jitter
+        # Fraction of requests answered with error_status instead of a fixture
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # Extra delay between streamed chunks (OpenAI only)
+        self.token_delay = token_delay
+        # Answer requests that offer tools with tool calls picked from the question (OpenAI only)
+        self.tool_calls = tool_calls
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _begin(self):
+        stub = self.server.stub
+        stub.record_call()
+        config = stub.config
+        time.sleep(max(0.0, random.gauss(config.latency, config.jitter)))
+        if config.error_rate and random.random() < config.error_rate:
+            stub.record_error()
+            self._send_json(config.error_status, {'error': {'message': 'injected failure'}})
+            return None
+        split = urlsplit(self.path)
+        return split.path, {name: values[0] for name, values in parse_qs(split.query).items()}
+
+    def do_GET(self):
+        request = self._begin()
+        if request is not None:
+            path, params = request
+            self._send_json(*self.server.stub.handle_get(path, params))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        request = self._begin()
+        if request is not None:
+            self.server.stub.handle_post(self, request[0], json.loads(body or b'{}'))
+
+
+# Base stub: a threaded HTTP server on an ephemeral local port that counts the calls it serves
+class StubServer:
+    def __init__(self, config=None):
+        self.config = config or StubConfig()
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}{self.prefix}"
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def start(self):
+        server_class = type('StubHTTPServer', (ThreadingHTTPServer,), {'request_queue_size': 1024})
+        self._server = server_class(('127.0.0.1', 0), _StubHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"stub-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def handle_get(self, path, params):
+        return 404, {'error': {'message': f"unknown path {path}"}}
+
+    def handle_post(self, handler, path, body):
+        handler._send_json(404, {'error': {'message': f"unknown path {path}"}})
+
+
+# AviationStack /flights: a record per requested flight_iata, or schedule_size flights for a route search
+class AviationStackStub(StubServer):
+    name = 'aviationstack'
+    prefix = '/v1'
+
+    def __init__(self, config=None, schedule_size=40):
+        super().__init__(config)
+        self.schedule_size = schedule_size
+        self.flight = load_fixture('aviationstack_flight.json')
+
+    def _record(self, flight_iata, index=0):
+        record = copy.deepcopy(self.flight)
+        record['flight']['iata'] = flight_iata
+        record['flight']['number'] = ''.join(character for character in flight_iata if character.isdigit())
+        record['airline']['iata'] = flight_iata[:2]
+        record['departure']['gate'] = f"B{index % 40 + 1}"
+        record['departure']['scheduled'] = f"2025-03-05T{index % 24:02d}:{index * 5 % 60:02d}:00+00:00"
+        return record
+
+    def handle_get(self, path, params):
+        if path != '/v1/flights':
+            return super().handle_get(path, params)
+        if 'flight_iata' in params:
+            data = [self._record(flight.upper()) for flight in params['flight_iata'].split(',') if flight]
+        else:
+            data = [self._record(f"XX{index + 1}", index) for index in range(self.schedule_size)]
+            for record in data:
+                record['departure']['iata'] = params.get('dep_iata', record['departure']['iata'])
+                record['arrival']['iata'] = params.get('arr_iata', record['arrival']['iata'])
+                record['flight_date'] = params.get('flight_date', record['flight_date'])
+        pagination = {'limit': 100, 'offset': 0, 'count': len(data), 'total': len(data)}
+        return 200, {'pagination': pagination, 'data': data}
+
+
+# OpenWeather /weather and /forecast by coordinates or by city name
+class OpenWeatherStub(StubServer):
+    name = 'openweather'
+    prefix = '/data/2.5'
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        self.weather = load_fixture('openweather_weather.json')
+        self.forecast = load_fixture('openweather_forecast.json')
+
+    def handle_get(self, path, params):
+        if path == '/data/2.5/forecast':
+            forecast = dict(self.forecast)
+            forecast['list'] = forecast['list'][:int(params.get('cnt', len(forecast['list'])))]
+            forecast['cnt'] = len(forecast['list'])
+            return 200, forecast
+        if path != '/data/2.5/weather':
+            return super().handle_get(path, params)
+        weather = dict(self.weather)
+        if 'lat' in params:
+            weather['coord'] = {'lat': float(params['lat']), 'lon': float(params['lon'])}
+        if 'q' in params:
+            weather['name'] = params['q'].title()
+        return 200, weather
+
+
+# Function to pick the tool calls a model would make for a question: a status lookup per flight
+# number, a weather lookup per place and the matching policy tools
+def pick_tool_calls(question):
+    calls = [('get_flight_status', {'flight_number': flight.replace(' ', '')}) for flight in FLIGHT_RE.findall(question)]
+    calls += [('get_weather_info', {'location': place.strip()}) for place in WEATHER_PLACE_RE.findall(question)]
+    for keyword, tool in POLICY_TOOLS:
+        if keyword in question.lower() and (tool, {}) not in calls:
+            calls.append((tool, {}))
+    return [
+        {'id': f"call_{index}", 'type': 'function', 'function': {'name': name, 'arguments': json.dumps(arguments)}}
+        for index, (name, arguments) in enumerate(calls)
+    ]
+
+
+# OpenAI /chat/completions, plain or server-sent events when stream is set. With tool_calls enabled a
+# request offering tools is answered with tool calls for the latest question, and once the tool
+# results are in, with a reply counting them.
+class OpenAIStub(StubServer):
+    name = 'openai'
+    prefix = '/v1'
+
+    def __init__(self, config=None):
+        super().__init__(config)
+        self.tool_requests = 0
+
+    def _tool_step(self, messages, tools_offered):
+        if not self.config.tool_calls or not messages:
+            return None, LLM_REPLY
+        if messages[-1].get('role') == 'tool':
+            results = 0
+            for message in reversed(messages):
+                if message.get('role') != 'tool':
+                    break
+                results += 1
+            return None, TOOL_REPLY.format(count=results)
+        calls = pick_tool_calls(str(messages[-1].get('content') or '')) if tools_offered else []
+        if not calls:
+            return None, LLM_REPLY
+        with self._lock:
+            self.tool_requests += 1
+        return calls, TOOL_PREAMBLE
+
+    def handle_post(self, handler, path, body):
+        if path != '/v1/chat/completions':
+            return super().handle_post(handler, path, body)
+        model = body.get('model', 'stub')
+        prompt_tokens = sum(len(str(message.get('content') or '')) // 4 for message in body.get('messages', []))
+        calls, reply = self._tool_step(body.get('messages', []), bool(body.get('tools')))
+        completion_tokens = len(reply) // 4
+        if not body.get('stream'):
+            message = {'role': 'assistant', 'content': reply}
+            if calls:
+                message['tool_calls'] = calls
+            handler._send_json(200, {
+                'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{
+                    'index': 0, 'message': message, 'finish_reason': 'tool_calls' if calls else 'stop'
+                }],
+                'usage': {
+                    'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                },
+            })
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        handler.close_connection = True
+        deltas = [{'content': word if index == 0 else f" {word}"} for index, word in enumerate(reply.split(' '))]
+        # Tool calls arrive in fragments: the id and name first, then the arguments in two pieces
+        for index, call in enumerate(calls or ()):
+            arguments = call['function']['arguments']
+            half = len(arguments) // 2
+            deltas.append({'tool_calls': [{
+                'index': index, 'id': call['id'], 'type': 'function',
+                'function': {'name': call['function']['name'], 'arguments': ''},
+            }]})
+            for piece in (arguments[:half], arguments[half:]):
+                deltas.append({'tool_calls': [{'index': index, 'function': {'arguments': piece}}]})
+        for delta in deltas:
+            chunk = {
+                'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'delta': delta, 'finish_reason': None}],
+            }
+            handler.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            handler.wfile.flush()
+            if self.config.token_delay:
+                time.sleep(self.config.token_delay)
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+
+# Function to start all three stubs; returns {provider: stub}
+def start_stubs(configs=None, schedule_size=40):
+    configs = configs or {}
+    stubs = {
+        'aviationstack': AviationStackStub(configs.get('aviationstack'), schedule_size),
+        'openweather': OpenWeatherStub(configs.get('openweather')),
+        'openai': OpenAIStub(configs.get('openai')),
+    }
+    for stub in stubs.values():
+        stub.start()
+    return stubs
+
+
+def stop_stubs(stubs):
+    for stub in stubs.values():
+        stub.stop()
+
+
+# Run the stubs on their own so the Streamlit app or server can be pointed at them by hand
+if __name__ == '__main__':
+    running = start_stubs()
+    print(f"export AVIATIONSTACK_BASE_URL={running['aviationstack'].base_url}")
+    print(f"export OPENWEATHER_BASE_URL={running['openweather'].base_url}")
+    print(f"export OPENAI_BASE_URL={running['openai'].base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stop_stubs(running)
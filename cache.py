@@ -0,0 +1,212 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+# Per-source time-to-live values (in seconds)
+FLIGHT_STATUS_TTL = 60
+WEATHER_TTL = 10 * 60
+FORECAST_TTL = 30 * 60
+SCHEDULES_TTL = 60 * 60
+
+# Upper bound for the memory held by the shared cache (in bytes)
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+# How long expired entries are kept as a fallback for when the upstream is down or out of quota
+DEFAULT_STALE_TTL = 60 * 60
+
+
+# Function to build a cache key from a source name and its normalized query params
+def make_key(source, **params):
+    normalized = []
+    for name, value in sorted(params.items()):
+        if isinstance(value, str):
+            value = " ".join(value.split()).upper()
+        normalized.append((name, value))
+    return (source, tuple(normalized))
+
+
+# Function to roughly estimate the memory used by a cached value
+def estimate_size(value):
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        for item in value:
+            size += estimate_size(item)
+    elif hasattr(type(value), '__slots__'):
+        for name in type(value).__slots__:
+            size += estimate_size(getattr(value, name, None))
+    return size
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "stale_until", "size")
+
+    def __init__(self, value, expires_at, stale_until, size):
+        self.value = value
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.size = size
+
+
+# In-progress upstream call shared by every concurrent miss on the same key
+class _InFlight:
+    __slots__ = ("event", "value", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# Thread-safe LRU cache with per-entry TTLs, a memory bound and single-flight loading
+class TTLCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, default_ttl=60, stale_ttl=DEFAULT_STALE_TTL, clock=time.monotonic):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    # Whether key holds an unexpired value (without counting a hit or miss or touching the LRU order)
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry.expires_at > self._clock()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        now = self._clock()
+        if entry.expires_at <= now:
+            # Expired entries linger (still LRU-evictable) until their stale window ends
+            if entry.stale_until <= now:
+                self._remove(key)
+                self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _store(self, key, value, ttl):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires_at = self._clock() + ttl
+        self._entries[key] = _Entry(value, expires_at, expires_at + self.stale_ttl, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return entry.value
+
+    # Return the value for key once it has expired but is still within its stale window
+    def get_stale(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            now = self._clock()
+            if entry is None or entry.expires_at > now or entry.stale_until <= now:
+                return default
+            self.stale_hits += 1
+            return entry.value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, self.default_ttl if ttl is None else ttl)
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # Return the cached value for key, or call loader once for all concurrent misses.
+    # Results for which should_cache returns False are handed back but not stored.
+    def get_or_load(self, key, loader, ttl=None, should_cache=None):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry.value
+            self.misses += 1
+            in_flight = self._in_flight.get(key)
+            leader = in_flight is None
+            if leader:
+                in_flight = self._in_flight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            in_flight.event.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.value
+
+        try:
+            value = loader()
+        except BaseException as error:
+            in_flight.error = error
+            raise
+        else:
+            in_flight.value = value
+            if should_cache is None or should_cache(value):
+                with self._lock:
+                    self._store(key, value, self.default_ttl if ttl is None else ttl)
+            return value
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.event.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "coalesced": self.coalesced,
+                "stale_hits": self.stale_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+# Process-wide cache shared by every Streamlit session (modules are only imported once)
+shared_cache = TTLCache()
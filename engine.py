@@ -0,0 +1,730 @@
+import contextvars
+import logging
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from flights import ScheduleResult, ScheduleView, parse_schedule, DEFAULT_PAGE_SIZE
+from cache import shared_cache, make_key, FLIGHT_STATUS_TTL, WEATHER_TTL, FORECAST_TTL, SCHEDULES_TTL
+from history import compact_history, DEFAULT_TOKEN_BUDGET
+from intents import route, extract_weather_location, mentions_flight_number
+from policies import get_baggage_policy, get_cancellation_policy, get_frequent_flyer_info
+from poller import FlightStatusPoller, format_flight_update, DEFAULT_POLL_INTERVAL, DEFAULT_SUBSCRIPTION_TTL
+from ratelimit import PRIORITY_INTERACTIVE, PRIORITY_ENRICHMENT, PRIORITY_BACKGROUND
+from semantic_cache import SemanticCache, is_self_contained
+from tools import ToolDispatcher, stream_completion, EMPTY_REPLY, MAX_TOOL_ROUNDS
+from tracing import default_tracer, traced, TURN_SPAN
+from upstream import default_client, UpstreamUnavailable
+from weather import WeatherService, parse_timestamp, DEFAULT_WEATHER_WORKERS
+
+logger = logging.getLogger("aerochat")
+
+SYSTEM_PROMPT = "You are a friendly and helpful airline customer service assistant. Engage with the user warmly, like a human would. You can assist with flight status, flight availability, booking assistance, baggage policies, cancellation policies, frequent flyer program information, and provide real-time updates including weather information."
+GREETING_MESSAGE = "Hello! Welcome to **AeroChat** ✈️. How can I assist you today?"
+WEATHER_UNAVAILABLE = "Weather information not available."
+STALE_DATA_NOTE = "_Live data is temporarily limited, so some details above may be slightly out of date._"
+
+# Seconds to wait for the concurrent weather lookups before replying without them
+WEATHER_TIMEOUT = 5
+
+ARRIVAL_AIRPORT_RE = re.compile(r'\*\*Arrival Airport:\*\*\s+(.+)')
+
+# Sources answered from expired cache entries during the current turn
+_stale_sources = contextvars.ContextVar("aerochat_stale_sources", default=None)
+
+
+# Function to read a boolean setting that may come from an environment variable
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
+    return bool(value)
+
+
+# Function to extract destination from flight information
+def extract_destination_from_flight_info(flight_info_text):
+    match = ARRIVAL_AIRPORT_RE.search(flight_info_text)
+    if match:
+        return match.group(1).strip()
+    return None
+
+
+# Function to check whether the user's recent messages mention a specific flight, in which case a
+# reply cached for a similar-looking question may not apply. Replies are not checked: policy text
+# such as "up to 23 kg" is not flight context.
+def has_flight_context(messages, recent_messages=6):
+    for message in messages[-recent_messages:]:
+        if message["role"] == "user" and mentions_flight_number(message["content"] or ""):
+            return True
+    return False
+
+
+# Explicit engine settings (nothing is read from Streamlit secrets or the environment implicitly)
+class EngineConfig:
+    def __init__(self, openai_api_key=None, aviationstack_api_key=None, openweather_api_key=None,
+                 openai_base_url=None, model="gpt-3.5-turbo", stream_responses=True,
+                 history_token_budget=DEFAULT_TOKEN_BUDGET, semantic_cache_path=None,
+                 weather_timeout=WEATHER_TIMEOUT, weather_workers=DEFAULT_WEATHER_WORKERS, tool_workers=8, track_flights=True,
+                 poll_interval=DEFAULT_POLL_INTERVAL, poll_batch_size=1, subscription_ttl=DEFAULT_SUBSCRIPTION_TTL,
+                 trace_path=None, trace_sample_rate=1.0, tool_calling=True, max_tool_rounds=MAX_TOOL_ROUNDS):
+        self.openai_api_key = openai_api_key
+        self.aviationstack_api_key = aviationstack_api_key
+        self.openweather_api_key = openweather_api_key
+        self.openai_base_url = openai_base_url
+        self.model = model
+        self.stream_responses = stream_responses
+        self.history_token_budget = history_token_budget
+        self.semantic_cache_path = semantic_cache_path
+        self.weather_timeout = weather_timeout
+        # Threads looking up weather grid cells (shared by answers, schedule rows and prefetches)
+        self.weather_workers = weather_workers
+        self.tool_workers = tool_workers
+        # Follow flights users ask about and push status changes to them
+        self.track_flights = track_flights
+        self.poll_interval = poll_interval
+        # AviationStack's flight_iata filter takes a single flight; raise this only for a provider
+        # that accepts comma-separated flight lists
+        self.poll_batch_size = poll_batch_size
+        # Seconds a flight stays tracked after a session last asked about it
+        self.subscription_ttl = subscription_ttl
+        # Optional JSONL file receiving every span of a sampled fraction of the turns
+        self.trace_path = trace_path
+        self.trace_sample_rate = trace_sample_rate
+        # Let the model call the flight, weather and policy tools for open-ended and multi-topic questions,
+        # with at most max_tool_rounds model round trips per turn
+        self.tool_calling = tool_calling
+        self.max_tool_rounds = max_tool_rounds
+
+    # Build a config from st.secrets, os.environ or any other mapping of setting names
+    @classmethod
+    def from_mapping(cls, mapping):
+        return cls(
+            openai_api_key=mapping.get("OPENAI_API_KEY"),
+            aviationstack_api_key=mapping.get("AVIATIONSTACK_API_KEY"),
+            openweather_api_key=mapping.get("OPENWEATHER_API_KEY"),
+            openai_base_url=mapping.get("OPENAI_BASE_URL"),
+            model=mapping.get("OPENAI_MODEL", "gpt-3.5-turbo"),
+            stream_responses=_as_bool(mapping.get("STREAM_RESPONSES", True)),
+            history_token_budget=int(mapping.get("HISTORY_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET)),
+            semantic_cache_path=mapping.get("SEMANTIC_CACHE_PATH"),
+            weather_timeout=float(mapping.get("WEATHER_TIMEOUT", WEATHER_TIMEOUT)),
+            weather_workers=int(mapping.get("WEATHER_WORKERS", DEFAULT_WEATHER_WORKERS)),
+            track_flights=_as_bool(mapping.get("TRACK_FLIGHTS", True)),
+            poll_interval=float(mapping.get("FLIGHT_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)),
+            poll_batch_size=int(mapping.get("FLIGHT_POLL_BATCH_SIZE", 1)),
+            subscription_ttl=float(mapping.get("FLIGHT_TRACKING_TTL", DEFAULT_SUBSCRIPTION_TTL)),
+            trace_path=mapping.get("TRACE_PATH"),
+            trace_sample_rate=float(mapping.get("TRACE_SAMPLE_RATE", 1.0)),
+            tool_calling=_as_bool(mapping.get("TOOL_CALLING", True)),
+            max_tool_rounds=int(mapping.get("TOOL_MAX_ROUNDS", MAX_TOOL_ROUNDS)),
+        )
+
+
+# Conversation state for one user
+class ChatSession:
+    def __init__(self, session_id=None, messages=None, greeted=False, schedule=None, offset=0, persisted=0):
+        self.session_id = session_id or uuid.uuid4().hex
+        self.messages = messages if messages is not None else [{"role": "system", "content": SYSTEM_PROMPT}]
+        self.greeted = greeted
+        # Latest schedule search as structured records (a ScheduleView), rendered a page at a time
+        self.schedule = schedule
+        # Position of messages[1] in the stored conversation (older turns stay in the session store)
+        # and how many of the conversation's messages the store already holds
+        self.offset = offset
+        self.persisted = persisted
+
+    def add_message(self, role, content):
+        self.messages.append({"role": role, "content": content})
+
+
+# Result of one turn. Streamed replies carry a generator of text deltas in `stream`; the
+# assembled reply is added to the session and to `replies` once the stream is exhausted.
+class ChatResponse:
+    def __init__(self, intent, replies=None, stream=None, cached=False, history_report=None, timings=None,
+                 degraded=False):
+        self.intent = intent
+        self.replies = replies if replies is not None else []
+        self.stream = stream
+        self.cached = cached
+        # Part of the answer came from expired cache entries because live data was throttled or down
+        self.degraded = degraded
+        self.history_report = history_report
+        self.timings = timings if timings is not None else {}
+
+    def to_dict(self):
+        return {
+            "intent": self.intent,
+            "replies": self.replies,
+            "cached": self.cached,
+            "degraded": self.degraded,
+            "history_report": self.history_report,
+            "timings": self.timings,
+        }
+
+
+# Headless AeroChat: intent routing, upstream tools and the OpenAI fallback behind one call.
+# Clients (Streamlit, HTTP, benchmarks) own the sessions and pass them in on every turn.
+class ChatEngine:
+    def __init__(self, config, upstream=None, cache=None, tracer=None):
+        self.config = config
+        self.upstream = upstream if upstream is not None else default_client
+        self.cache = cache if cache is not None else shared_cache
+        self.tracer = tracer if tracer is not None else default_tracer
+        if config.trace_path:
+            self.tracer.open_trace_file(config.trace_path, config.trace_sample_rate)
+        self._lock = threading.Lock()
+        self._client = None
+        self._executor = None
+        self._response_cache = None
+        self._poller = None
+        self.weather = WeatherService(self.fetch_weather, self.cache, config.weather_workers)
+        self.dispatcher = ToolDispatcher(self, config.max_tool_rounds)
+
+    # OpenAI client, built on first use (OPENAI_BASE_URL points it at any OpenAI-compatible server)
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = openai.OpenAI(
+                    api_key=self.config.openai_api_key, base_url=self.config.openai_base_url,
+                    timeout=30, max_retries=2
+                )
+            return self._client
+
+    # Thread pool for running upstream calls concurrently
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.config.tool_workers, thread_name_prefix="aerochat-tools"
+                )
+            return self._executor
+
+    # Semantic cache of fallback replies (persisted if semantic_cache_path is set)
+    @property
+    def response_cache(self):
+        with self._lock:
+            if self._response_cache is None:
+                self._response_cache = SemanticCache(path=self.config.semantic_cache_path)
+            return self._response_cache
+
+    # Background poller shared by every session, started on first use
+    @property
+    def poller(self):
+        with self._lock:
+            if self._poller is None:
+                self._poller = FlightStatusPoller(
+                    self.fetch_flight_records, interval=self.config.poll_interval,
+                    batch_size=self.config.poll_batch_size, subscription_ttl=self.config.subscription_ttl
+                )
+                self._poller.start()
+            return self._poller
+
+    # Function to load through the shared cache. When the provider is throttled, out of quota or down
+    # (or its monthly budget is running low) a recently expired copy is served instead, if there is one.
+    def load_cached(self, source, provider, key, loader, ttl, should_cache):
+        limiter = getattr(self.upstream, 'limiter', None)
+        with self.tracer.span(f"cache.{source}") as span:
+            if limiter is not None and limiter.budget_low(provider):
+                stale = self.cache.get_stale(key)
+                if stale is not None:
+                    span.set('cache', 'stale')
+                    self._note_stale(source)
+                    return stale
+
+            loaded = False
+
+            def load():
+                nonlocal loaded
+                loaded = True
+                return loader()
+
+            result = self.cache.get_or_load(key, load, ttl=ttl, should_cache=should_cache)
+            if not should_cache(result):
+                stale = self.cache.get_stale(key)
+                if stale is not None:
+                    span.set('cache', 'stale')
+                    self._note_stale(source)
+                    return stale
+            span.set('cache', 'miss' if loaded else 'hit')
+            return result
+
+    def _note_stale(self, source):
+        sources = _stale_sources.get()
+        if sources is not None:
+            sources.append(source)
+
+    # Function to fetch a JSON payload, sharing successful responses across sessions through the cache
+    def fetch_cached_json(self, source, provider, path, params, ttl, secret_params=None, priority=PRIORITY_INTERACTIVE):
+        def load():
+            try:
+                response = self.upstream.get(
+                    provider, path, params={**params, **(secret_params or {})}, priority=priority
+                )
+            except UpstreamUnavailable as error:
+                # Fail fast with the caller's usual fallback while the provider is down or throttled
+                return error.status_code or 503, None
+            data = response.json() if response.status_code == 200 else None
+            return response.status_code, data
+
+        def should_cache(result):
+            status_code, data = result
+            return status_code == 200 and isinstance(data, dict) and 'error' not in data
+
+        return self.load_cached(source, provider, make_key(source, **params), load, ttl, should_cache)
+
+    # Function to fetch OpenWeather current conditions ('weather') or forecast for one grid cell through the cache
+    def fetch_weather(self, endpoint, params, priority=PRIORITY_INTERACTIVE):
+        return self.fetch_cached_json(
+            endpoint, 'openweather', endpoint, params, FORECAST_TTL if endpoint == 'forecast' else WEATHER_TTL,
+            secret_params={'appid': self.config.openweather_api_key}, priority=priority
+        )
+
+    # Function to run several weather lookups at the same time, degrading any that time out or fail
+    @traced('tool.weather')
+    def get_weather_info_concurrently(self, locations, timeout=None):
+        timeout = self.config.weather_timeout if timeout is None else timeout
+        reports = self.weather.lookup_many(locations, PRIORITY_ENRICHMENT, timeout)
+        return [
+            reports[location].to_markdown() if reports[location] is not None else WEATHER_UNAVAILABLE
+            for location in locations
+        ]
+
+    # Function to fetch the latest AviationStack record for each flight number in one request.
+    # Goes through the shared cache, so polls and user lookups of the same flight share one call.
+    def fetch_flight_records(self, flight_numbers):
+        wanted = {flight_number.upper() for flight_number in flight_numbers}
+        params = {
+            'flight_iata': ','.join(sorted(wanted))
+        }
+        status_code, data = self.fetch_cached_json(
+            'flight_status', 'aviationstack', 'flights', params, FLIGHT_STATUS_TTL,
+            secret_params={'access_key': self.config.aviationstack_api_key}, priority=PRIORITY_BACKGROUND
+        )
+        records = {}
+        if status_code == 200:
+            for record in data.get('data') or []:
+                flight_iata = ((record.get('flight') or {}).get('iata') or '').upper()
+                if flight_iata in wanted and flight_iata not in records:
+                    records[flight_iata] = record
+        # Keep the weather at tracked flights' airports warm so status answers need no weather call
+        self.weather.prefetch(
+            airport for record in records.values()
+            for airport in ((record.get('departure') or {}).get('iata'), (record.get('arrival') or {}).get('iata'))
+        )
+        return records
+
+    # Function to fetch the AviationStack payload for one flight number; returns (status_code, data)
+    def fetch_flight_status(self, flight_number):
+        params = {
+            'flight_iata': flight_number.upper()
+        }
+        return self.fetch_cached_json(
+            'flight_status', 'aviationstack', 'flights', params, FLIGHT_STATUS_TTL,
+            secret_params={'access_key': self.config.aviationstack_api_key}
+        )
+
+    # Function to get flight status from AviationStack
+    def get_flight_status(self, flight_number):
+        return self.get_flight_status_details(flight_number)['text']
+
+    # Function to get flight status along with the arrival details needed by follow-up questions
+    @traced('tool.flight_status')
+    def get_flight_status_details(self, flight_number):
+        status_code, data = self.fetch_flight_status(flight_number)
+
+        if status_code == 200:
+            if 'data' in data and len(data['data']) > 0:
+                flight_info = data['data'][0]
+                airline = flight_info.get('airline', {}).get('name', 'Unknown Airline')
+                flight_iata = flight_info.get('flight', {}).get('iata', 'Unknown Flight')
+                flight_status = flight_info.get('flight_status', 'Status not available')
+                departure_airport = flight_info.get('departure', {}).get('airport', 'Unknown Departure Airport')
+                arrival_airport = flight_info.get('arrival', {}).get('airport', 'Unknown Arrival Airport')
+                departure_time = flight_info.get('departure', {}).get('scheduled', 'Unknown Departure Time')
+                arrival_time = flight_info.get('arrival', {}).get('scheduled', 'Unknown Arrival Time')
+                departure_terminal = flight_info.get('departure', {}).get('terminal', 'N/A')
+                departure_gate = flight_info.get('departure', {}).get('gate', 'N/A')
+                arrival_terminal = flight_info.get('arrival', {}).get('terminal', 'N/A')
+                arrival_gate = flight_info.get('arrival', {}).get('gate', 'N/A')
+
+                # Get weather information
+                departure_iata = flight_info.get('departure', {}).get('iata')
+                arrival_iata = flight_info.get('arrival', {}).get('iata')
+                departure_weather, arrival_weather = self.get_weather_info_concurrently([departure_iata, arrival_iata])
+
+                flight_details = (
+                    f"**Flight Status for {flight_iata}:**\n"
+                    f"- **Airline:** {airline}\n"
+                    f"- **Status:** {flight_status.capitalize()}\n"
+                    f"- **Departure Airport:** {departure_airport}\n"
+                    f"  - **Terminal:** {departure_terminal}\n"
+                    f"  - **Gate:** {departure_gate}\n"
+                    f"- **Scheduled Departure:** {departure_time}\n"
+                    f"- **Arrival Airport:** {arrival_airport}\n"
+                    f"  - **Terminal:** {arrival_terminal}\n"
+                    f"  - **Gate:** {arrival_gate}\n"
+                    f"- **Scheduled Arrival:** {arrival_time}\n"
+                    f"\n**Departure Weather at {departure_airport}:**\n{departure_weather}"
+                    f"\n**Arrival Weather at {arrival_airport}:**\n{arrival_weather}"
+                )
+                return {
+                    'text': flight_details, 'record': flight_info,
+                    'arrival_airport': arrival_airport, 'arrival_weather': arrival_weather
+                }
+            else:
+                text = "I'm sorry, I couldn't find any data for that flight number. Please double-check the flight number and try again."
+        else:
+            text = f"Error: Unable to retrieve data (Status Code: {status_code}). Please try again later."
+        return {'text': text, 'record': None, 'arrival_airport': None, 'arrival_weather': None}
+
+    # Function to fetch the flights between two airports on a date as compact records. The body is
+    # parsed as it streams in and only the records are cached, never the raw payload.
+    def fetch_schedule(self, departure_city, arrival_city, date):
+        params = {
+            'dep_iata': departure_city,
+            'arr_iata': arrival_city,
+            'flight_date': date
+        }
+
+        def load():
+            try:
+                response = self.upstream.get(
+                    'aviationstack', 'flights', params={**params, 'access_key': self.config.aviationstack_api_key},
+                    stream=True, priority=PRIORITY_INTERACTIVE
+                )
+            except UpstreamUnavailable as error:
+                return ScheduleResult(error.status_code or 503)
+            with response:
+                if response.status_code != 200:
+                    return ScheduleResult(response.status_code)
+                response.raw.decode_content = True
+                result = parse_schedule(response.raw)
+                self.tracer.current_span().set('bytes', response.raw.tell())
+                return result
+
+        def should_cache(result):
+            return result.status_code == 200 and result.error is None
+
+        key = make_key('flight_schedules', **params)
+        return self.load_cached('flight_schedules', 'aviationstack', key, load, SCHEDULES_TTL, should_cache)
+
+    # Function to get flight schedules as a ScheduleView; returns (view, None) or (None, error message)
+    @traced('tool.flight_schedules')
+    def get_flight_schedule_view(self, departure_city, arrival_city, date):
+        # Weather for both ends loads while the schedule streams in, ready for the rendered rows
+        self.weather.prefetch([departure_city, arrival_city], PRIORITY_ENRICHMENT)
+        result = self.fetch_schedule(departure_city, arrival_city, date)
+        if result.status_code != 200:
+            return None, f"Error: Unable to retrieve data (Status Code: {result.status_code}). Please try again later."
+        # Check for error in API response
+        if result.error is not None:
+            return None, f"Sorry, there was an error retrieving flight data: {result.error}"
+        if not result.records:
+            return None, f"I'm sorry, I couldn't find any flights from {departure_city.upper()} to {arrival_city.upper()} on {date}."
+        return ScheduleView(departure_city, arrival_city, date, result.records), None
+
+    # Function to get flight schedules from AviationStack, rendering only the requested page
+    def get_flight_schedules(self, departure_city, arrival_city, date, page=1, page_size=DEFAULT_PAGE_SIZE):
+        view, message = self.get_flight_schedule_view(departure_city, arrival_city, date)
+        if view is None:
+            return message
+        return f"{view.summary()}\n\n{self.render_schedule(view, page, page_size)}"
+
+    # Function to render a page of a ScheduleView with the weather at each row's airports. A schedule
+    # only spans a few airports, so this is one batched lookup (usually already prefetched).
+    def render_schedule(self, view, page=1, page_size=DEFAULT_PAGE_SIZE, sort_by='departure', airline=None, status=None):
+        airports = {record.departure_iata for record in view.records} | {record.arrival_iata for record in view.records}
+        reports = self.weather.lookup_many(airports, PRIORITY_ENRICHMENT, self.config.weather_timeout)
+
+        def weather(airport, scheduled):
+            report = reports.get(airport)
+            return report.brief(parse_timestamp(scheduled)) if report is not None else None
+
+        return view.render(page, page_size, sort_by, airline, status, weather)
+
+    # Function to render a page of the session's latest schedule search, or None if there is none
+    @traced('render.schedule')
+    def schedule_page(self, session, page=1, page_size=DEFAULT_PAGE_SIZE, sort_by='departure', airline=None, status=None):
+        if session.schedule is None:
+            return None
+        return self.render_schedule(session.schedule, page, page_size, sort_by, airline, status)
+
+    # Function to get weather information from OpenWeatherMap
+    @traced('tool.weather')
+    def get_weather_info(self, location, priority=PRIORITY_INTERACTIVE):
+        if location is None or location == '':
+            return WEATHER_UNAVAILABLE
+
+        # Looked up by grid cell when the location is a known airport code, city or alias (typos included),
+        # with the current conditions and short-range forecast shared by every airport in the cell
+        report = self.weather.lookup(location, priority, self.config.weather_timeout)
+        if report is not None:
+            return report.to_markdown()
+        else:
+            return WEATHER_UNAVAILABLE
+
+    # Function to provide weather information
+    def get_weather_response(self, user_input, location=None):
+        if location is None:
+            location = extract_weather_location(user_input)
+
+        # Check if location is valid
+        if not location:
+            return "I'm sorry, I couldn't determine the location for the weather information. Please specify the city or airport."
+
+        weather_info = self.get_weather_info(location)
+        return f"**Current weather at {location.title()}:**\n{weather_info}"
+
+    # Function to get chatbot response from OpenAI
+    @traced('llm.completion')
+    def get_chatbot_response(self, messages):
+        span = self.tracer.current_span()
+        try:
+            response = self.client.chat.completions.create(
+                model=self.config.model,
+                messages=messages
+            )
+            if response.usage is not None:
+                span.set('prompt_tokens', response.usage.prompt_tokens)
+                span.set('completion_tokens', response.usage.completion_tokens)
+            return response.choices[0].message.content or EMPTY_REPLY
+        except Exception as e:
+            span.set('error', type(e).__name__)
+            return f"Error: {str(e)}"
+
+    # Function to stream the chatbot response from OpenAI as text deltas, recording latency in timings
+    # The span is passed in by callers that consume the stream on another thread or after returning
+    def stream_chatbot_response(self, messages, timings=None, span=None):
+        timings = {} if timings is None else timings
+        span = span or self.tracer.start_span('llm.stream')
+        start = time.perf_counter()
+        try:
+            yield from stream_completion(self.client, messages, span, timings, start, [], model=self.config.model)
+        finally:
+            timings['total_time'] = time.perf_counter() - start
+            span.set('time_to_first_token', timings.get('time_to_first_token'))
+            span.end()
+            logger.info(
+                "LLM stream: time to first token %s, total %.3fs",
+                f"{timings['time_to_first_token']:.3f}s" if 'time_to_first_token' in timings else "n/a",
+                timings['total_time']
+            )
+
+    # Function to render the tracer's metrics plus cache, breaker and poller gauges for /metrics
+    def metrics_text(self):
+        lines = []
+        cache_stats = self.cache.stats()
+        for name in ('hits', 'misses', 'coalesced', 'evictions', 'expirations', 'stale_hits'):
+            lines.append(f"# TYPE aerochat_cache_{name}_total counter")
+            lines.append(f"aerochat_cache_{name}_total {cache_stats[name]}")
+        for name in ('entries', 'bytes'):
+            lines.append(f"# TYPE aerochat_cache_{name} gauge")
+            lines.append(f"aerochat_cache_{name} {cache_stats[name]}")
+        if self._response_cache is not None:
+            semantic_stats = self._response_cache.stats()
+            for name in ('hits', 'misses', 'skips', 'evictions'):
+                lines.append(f"# TYPE aerochat_semantic_cache_{name}_total counter")
+                lines.append(f"aerochat_semantic_cache_{name}_total {semantic_stats[name]}")
+            lines.append("# TYPE aerochat_semantic_cache_entries gauge")
+            lines.append(f"aerochat_semantic_cache_entries {semantic_stats['entries']}")
+        breakers = getattr(self.upstream, 'breakers', {})
+        if breakers:
+            lines.append("# TYPE aerochat_circuit_open gauge")
+            for provider, breaker in sorted(breakers.items()):
+                lines.append(f'aerochat_circuit_open{{provider="{provider}"}} {int(breaker.state != breaker.CLOSED)}')
+        limiter = getattr(self.upstream, 'limiter', None)
+        if limiter is not None:
+            limiter_stats = limiter.stats()
+            for name in ('granted', 'denied'):
+                lines.append(f"# TYPE aerochat_rate_limit_{name}_total counter")
+                for provider, stats in sorted(limiter_stats.items()):
+                    lines.append(f'aerochat_rate_limit_{name}_total{{provider="{provider}"}} {stats[name]}')
+            lines.append("# TYPE aerochat_quota_used gauge")
+            for provider, stats in sorted(limiter_stats.items()):
+                lines.append(f'aerochat_quota_used{{provider="{provider}"}} {stats["quota_used"]}')
+            lines.append("# TYPE aerochat_quota_remaining gauge")
+            for provider, stats in sorted(limiter_stats.items()):
+                if stats['quota_remaining'] is not None:
+                    lines.append(f'aerochat_quota_remaining{{provider="{provider}"}} {stats["quota_remaining"]}')
+        weather_stats = self.weather.stats()
+        for name in ('lookups', 'prefetches'):
+            lines.append(f"# TYPE aerochat_weather_{name}_total counter")
+            lines.append(f"aerochat_weather_{name}_total {weather_stats[name]}")
+        if self._poller is not None:
+            lines.append("# TYPE aerochat_tracked_flights gauge")
+            lines.append(f"aerochat_tracked_flights {len(self._poller.tracked_flights())}")
+        return self.tracer.render_prometheus() + "\n".join(lines) + "\n"
+
+    # Function to add the greeting to a new session; returns it, or None if already greeted
+    def greet(self, session):
+        if session.greeted:
+            return None
+        session.add_message("assistant", GREETING_MESSAGE)
+        session.greeted = True
+        return GREETING_MESSAGE
+
+    # Function to collect the flight status changes pushed to a session, recorded as assistant messages
+    def pending_updates(self, session):
+        if self._poller is None:
+            return []
+        updates = [format_flight_update(update) for update in self._poller.drain(session.session_id)]
+        for update in updates:
+            session.add_message("assistant", update)
+        return updates
+
+    # Function to stop following flights for a session that has ended
+    def end_session(self, session_id):
+        if self._poller is not None:
+            self._poller.unsubscribe(session_id)
+
+    # Function to answer one user message, recording the turn in the session
+    def respond(self, session, user_input, stream=None):
+        # The turn span stays open until a streamed reply has been fully consumed
+        turn = self.tracer.start_span(TURN_SPAN)
+        stale_sources = []
+        token = _stale_sources.set(stale_sources)
+        with self.tracer.activate(turn):
+            try:
+                response = self._respond(session, user_input, stream, turn)
+            except Exception as error:
+                turn.set('error', type(error).__name__)
+                turn.end()
+                raise
+            finally:
+                _stale_sources.reset(token)
+        turn.set('intent', response.intent)
+        if stale_sources:
+            response.degraded = True
+            turn.set('stale_sources', sorted(set(stale_sources)))
+        if response.stream is None:
+            turn.end()
+        return response
+
+    def _respond(self, session, user_input, stream, turn):
+        stream = self.config.stream_responses if stream is None else stream
+        session.add_message("user", user_input)
+
+        # Normalize the input once and score every intent in a single pass
+        with self.tracer.span('route'):
+            routed = route(user_input)
+            # Questions touching several topics ("is AA100 on time and what's the weather in Denver?")
+            # go to the model, which calls every tool it needs in one step
+            if self.config.tool_calling and len(routed.topics) > 1:
+                routed = routed._replace(intent='tools')
+
+        # Check if user is asking for flight status by flight number
+        if routed.intent == 'flight_status':
+            flight_details = self.get_flight_status_details(routed.flight_number)
+            replies = [flight_details['text']]
+
+            # Keep following the flight so later changes are pushed instead of asked for again
+            if self.config.track_flights and flight_details['record'] is not None:
+                self.poller.subscribe(session.session_id, routed.flight_number, flight_details['record'])
+
+            # If weather at destination is requested, reuse the arrival weather fetched with the flight
+            if 'weather' in routed.scores:
+                destination = flight_details['arrival_airport'] or extract_destination_from_flight_info(replies[0])
+                if destination:
+                    weather_info = flight_details['arrival_weather'] or self.get_weather_info(destination)
+                    replies.append(f"**Weather at {destination}:**\n{weather_info}")
+                else:
+                    replies.append("I'm sorry, I couldn't determine the destination for the weather information.")
+            if _stale_sources.get():
+                replies[-1] = f"{replies[-1]}\n\n{STALE_DATA_NOTE}"
+            for reply in replies:
+                session.add_message("assistant", reply)
+            return ChatResponse(routed.intent, replies)
+
+        # Answer tool and policy intents directly
+        if routed.intent == 'flight_schedules':
+            view, reply = self.get_flight_schedule_view(routed.departure_city, routed.arrival_city, routed.date)
+            if view is not None:
+                # Keep the records in the session and only the one-line summary in the history;
+                # pages are rendered from the records on demand
+                session.schedule = view
+                session.add_message("assistant", view.summary())
+                reply = f"{view.summary()}\n\n{self.render_schedule(view)}"
+                if _stale_sources.get():
+                    reply = f"{reply}\n\n{STALE_DATA_NOTE}"
+                return ChatResponse(routed.intent, [reply])
+        elif routed.intent == 'weather':
+            reply = self.get_weather_response(user_input, routed.weather_location)
+        elif routed.intent == 'baggage':
+            reply = get_baggage_policy()
+        elif routed.intent == 'cancellation':
+            reply = get_cancellation_policy()
+        elif routed.intent == 'frequent_flyer':
+            reply = get_frequent_flyer_info()
+        else:
+            reply = None
+        if reply is not None:
+            if _stale_sources.get():
+                reply = f"{reply}\n\n{STALE_DATA_NOTE}"
+            session.add_message("assistant", reply)
+            return ChatResponse(routed.intent, [reply])
+
+        # Default response using OpenAI API, reusing the reply to a near-identical question when possible.
+        # The cache is shared by every session, so only self-contained questions without flight context use it.
+        use_response_cache = (
+            routed.intent != 'tools' and is_self_contained(user_input) and not has_flight_context(session.messages)
+        )
+        if not use_response_cache:
+            self.response_cache.record_skip()
+        with self.tracer.span('cache.semantic') as span:
+            reply = self.response_cache.lookup(user_input) if use_response_cache else None
+            span.set('cache', 'skip' if not use_response_cache else 'miss' if reply is None else 'hit')
+        if reply is not None:
+            session.add_message("assistant", reply)
+            return ChatResponse(routed.intent, [reply], cached=True)
+
+        # Compact older turns to fit the token budget
+        with self.tracer.span('history.compact') as span:
+            messages, history_report = compact_history(session.messages, self.config.history_token_budget)
+            span.set('saved_tokens', history_report["saved_tokens"])
+        logger.info(
+            "History compaction: %d -> %d tokens (saved %d, %d summarized, %d dropped)",
+            history_report["original_tokens"], history_report["compacted_tokens"], history_report["saved_tokens"],
+            history_report["summarized_messages"], history_report["dropped_messages"]
+        )
+        response = ChatResponse(routed.intent, history_report=history_report)
+        # Replies built from tool results depend on live data and are never reused
+        tool_state = {'tools_used': False}
+        if stream:
+            if self.config.tool_calling:
+                deltas = self.dispatcher.stream(session, messages, response.timings, turn, tool_state)
+            else:
+                deltas = self.stream_chatbot_response(messages, response.timings, self.tracer.start_span('llm.stream'))
+            response.stream = self._record_stream(
+                session, response, deltas, user_input, use_response_cache, turn, tool_state
+            )
+        else:
+            if self.config.tool_calling:
+                reply, tool_state['tools_used'] = self.dispatcher.complete(session, messages)
+            else:
+                reply = self.get_chatbot_response(messages)
+            self._record_reply(session, response, reply, user_input, use_response_cache and not tool_state['tools_used'])
+        return response
+
+    def _record_stream(self, session, response, deltas, user_input, use_response_cache, turn, tool_state):
+        parts = []
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield delta
+            self._record_reply(
+                session, response, "".join(parts), user_input, use_response_cache and not tool_state['tools_used']
+            )
+        finally:
+            turn.end()
+
+    def _record_reply(self, session, response, reply, user_input, use_response_cache):
+        reply = reply or EMPTY_REPLY
+        session.add_message("assistant", reply)
+        response.replies.append(reply)
+        if use_response_cache and not reply.startswith("Error:"):
+            self.response_cache.store(user_input, reply)
@@ -0,0 +1,223 @@
+import json
+import math
+from collections import namedtuple
+
+try:
+    import ijson
+except ImportError:  # Fall back to parsing the whole payload at once when ijson is not installed
+    ijson = None
+
+# Flights shown per schedule page
+DEFAULT_PAGE_SIZE = 10
+
+# AviationStack error payloads are small, so this much of a schedule response is kept while it is
+# streamed in order to read the error message of one that holds no flights
+ERROR_PAYLOAD_MAX_BYTES = 64 * 1024
+
+# Sort orders offered for schedules, mapped to the record attribute they sort on
+SORT_KEYS = {
+    'departure': 'departure_scheduled',
+    'arrival': 'arrival_scheduled',
+    'airline': 'airline',
+    'status': 'status',
+    'flight': 'flight_iata',
+}
+
+# Outcome of a schedule lookup: HTTP status, parsed records and the API's error message, if any
+ScheduleResult = namedtuple('ScheduleResult', ['status_code', 'records', 'error'], defaults=((), None))
+
+
+# Compact, fixed-layout view of one AviationStack flight
+class FlightRecord:
+    __slots__ = (
+        'airline', 'flight_iata', 'status',
+        'departure_airport', 'departure_iata', 'departure_terminal', 'departure_gate', 'departure_scheduled',
+        'arrival_airport', 'arrival_iata', 'arrival_terminal', 'arrival_gate', 'arrival_scheduled',
+    )
+
+    def __init__(self, airline, flight_iata, status, departure_airport, departure_iata, departure_terminal,
+                 departure_gate, departure_scheduled, arrival_airport, arrival_iata, arrival_terminal,
+                 arrival_gate, arrival_scheduled):
+        self.airline = airline
+        self.flight_iata = flight_iata
+        self.status = status
+        self.departure_airport = departure_airport
+        self.departure_iata = departure_iata
+        self.departure_terminal = departure_terminal
+        self.departure_gate = departure_gate
+        self.departure_scheduled = departure_scheduled
+        self.arrival_airport = arrival_airport
+        self.arrival_iata = arrival_iata
+        self.arrival_terminal = arrival_terminal
+        self.arrival_gate = arrival_gate
+        self.arrival_scheduled = arrival_scheduled
+
+    # Build a record from a raw AviationStack flight, looking each nested object up once
+    @classmethod
+    def from_api(cls, flight):
+        airline = flight.get('airline') or {}
+        number = flight.get('flight') or {}
+        departure = flight.get('departure') or {}
+        arrival = flight.get('arrival') or {}
+        return cls(
+            airline.get('name') or 'Unknown Airline',
+            number.get('iata') or 'Unknown Flight',
+            flight.get('flight_status') or 'Status not available',
+            departure.get('airport') or 'Unknown Departure Airport',
+            departure.get('iata'),
+            departure.get('terminal') or 'N/A',
+            departure.get('gate') or 'N/A',
+            departure.get('scheduled') or 'Unknown Departure Time',
+            arrival.get('airport') or 'Unknown Arrival Airport',
+            arrival.get('iata'),
+            arrival.get('terminal') or 'N/A',
+            arrival.get('gate') or 'N/A',
+            arrival.get('scheduled') or 'Unknown Arrival Time',
+        )
+
+    # Field values in slot order, for compact serialization (FlightRecord(*row) rebuilds the record)
+    def to_row(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    # weather(airport_iata, scheduled_time) -> short text or None adds the expected weather at each end
+    def to_markdown(self, weather=None):
+        departure_weather = weather(self.departure_iata, self.departure_scheduled) if weather else None
+        arrival_weather = weather(self.arrival_iata, self.arrival_scheduled) if weather else None
+        return (
+            f"- **Airline:** {self.airline}\n"
+            f"  **Flight Number:** {self.flight_iata}\n"
+            f"  **Status:** {self.status.capitalize()}\n"
+            f"  **Departure Airport:** {self.departure_airport}\n"
+            f"    - **Terminal:** {self.departure_terminal}\n"
+            f"    - **Gate:** {self.departure_gate}\n"
+            + (f"    - **Weather:** {departure_weather}\n" if departure_weather else "") +
+            f"  **Scheduled Departure:** {self.departure_scheduled}\n"
+            f"  **Arrival Airport:** {self.arrival_airport}\n"
+            f"    - **Terminal:** {self.arrival_terminal}\n"
+            f"    - **Gate:** {self.arrival_gate}\n"
+            + (f"    - **Weather:** {arrival_weather}\n" if arrival_weather else "") +
+            f"  **Scheduled Arrival:** {self.arrival_scheduled}\n"
+        )
+
+
+# Byte stream wrapper remembering the start of what was read from it, up to a size limit
+class _HeadRecorder:
+    def __init__(self, stream, limit=ERROR_PAYLOAD_MAX_BYTES):
+        self._stream = stream
+        self.limit = limit
+        self.head = []
+        self.size = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        if self.size + len(data) <= self.limit:
+            self.head.append(data)
+        self.size += len(data)
+        return data
+
+    # The whole payload, if it fit within the limit
+    def payload(self):
+        return b''.join(self.head) if self.size <= self.limit else None
+
+
+# Function to parse an AviationStack /flights payload from a file-like byte stream. With ijson the
+# flights are built one at a time by its C backend as they arrive, so the raw JSON tree is never
+# held in memory.
+def parse_schedule(stream):
+    if ijson is None:
+        data = json.load(stream)
+        if 'error' in data:
+            return ScheduleResult(200, (), (data['error'] or {}).get('message', 'Unknown error'))
+        return ScheduleResult(200, tuple(FlightRecord.from_api(flight) for flight in data.get('data') or []))
+
+    recorder = _HeadRecorder(stream)
+    records = tuple(FlightRecord.from_api(flight) for flight in ijson.items(recorder, 'data.item', use_float=True))
+    error = None
+    payload = recorder.payload() if not records else None
+    if payload:
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            data = {}
+        if isinstance(data, dict) and 'error' in data:
+            error = (data['error'] or {}).get('message', 'Unknown error')
+    return ScheduleResult(200, records, error)
+
+
+# Function to keep the records matching an airline (substring) and status filter
+def filter_records(records, airline=None, status=None):
+    if airline:
+        airline = airline.lower()
+        records = [record for record in records if airline in record.airline.lower()]
+    if status:
+        status = status.lower()
+        records = [record for record in records if record.status.lower() == status]
+    return records
+
+
+# Function to filter and sort schedule records; the records themselves are shared, not copied
+def select_records(records, sort_by='departure', airline=None, status=None):
+    attribute = SORT_KEYS.get(sort_by, SORT_KEYS['departure'])
+    return sorted(filter_records(records, airline, status), key=lambda record: getattr(record, attribute) or '')
+
+
+# Function to count the pages needed for a number of records
+def page_count(total, page_size=DEFAULT_PAGE_SIZE):
+    return max(1, math.ceil(total / page_size))
+
+
+# Function to render one page of a schedule; only the records on that page are formatted
+def render_schedule_page(records, page=1, page_size=DEFAULT_PAGE_SIZE, sort_by='departure', airline=None, status=None,
+                         weather=None):
+    selected = select_records(records, sort_by, airline, status)
+    if not selected:
+        return "No flights match those filters."
+    pages = page_count(len(selected), page_size)
+    page = min(max(1, page), pages)
+    start = (page - 1) * page_size
+    shown = selected[start:start + page_size]
+    body = "\n".join(record.to_markdown(weather) for record in shown)
+    return f"{body}\n_Showing flights {start + 1}–{start + len(shown)} of {len(selected)} (page {page} of {pages})._"
+
+
+# Structured schedule search kept in a session instead of its rendered markdown
+class ScheduleView:
+    __slots__ = ('departure_city', 'arrival_city', 'date', 'records')
+
+    def __init__(self, departure_city, arrival_city, date, records):
+        self.departure_city = departure_city
+        self.arrival_city = arrival_city
+        self.date = date
+        self.records = records
+
+    def to_dict(self):
+        return {
+            'departure_city': self.departure_city, 'arrival_city': self.arrival_city, 'date': self.date,
+            'records': [record.to_row() for record in self.records],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        records = tuple(FlightRecord(*row) for row in data['records'])
+        return cls(data['departure_city'], data['arrival_city'], data['date'], records)
+
+    def summary(self):
+        return (
+            f"Here are the available flights from {self.departure_city.upper()} to {self.arrival_city.upper()} "
+            f"on {self.date}: {len(self.records)} flights found."
+        )
+
+    def render(self, page=1, page_size=DEFAULT_PAGE_SIZE, sort_by='departure', airline=None, status=None, weather=None):
+        return render_schedule_page(self.records, page, page_size, sort_by, airline, status, weather)
+
+    def page_count(self, page_size=DEFAULT_PAGE_SIZE, airline=None, status=None):
+        return page_count(len(filter_records(self.records, airline, status)), page_size)
+
+    def airlines(self):
+        return sorted({record.airline for record in self.records})
+
+    def statuses(self):
+        return sorted({record.status for record in self.records})
@@ -0,0 +1,150 @@
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character-based estimate when tiktoken is not installed
+    tiktoken = None
+
+# Default number of prompt tokens allowed per LLM request
+DEFAULT_TOKEN_BUDGET = 3000
+
+# Number of most recent messages always kept verbatim when they fit
+DEFAULT_RECENT_MESSAGES = 6
+
+# Tokens added by the chat format around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Older plain messages longer than this are truncated
+MAX_OLD_MESSAGE_CHARS = 400
+
+_encoding = None
+
+FLIGHT_STATUS_RE = re.compile(r'\*\*Flight Status for (?P<flight>[^:*]+):\*\*')
+STATUS_LINE_RE = re.compile(r'\*\*Status:\*\*\s*(?P<status>.+)')
+DEPARTURE_LINE_RE = re.compile(r'\*\*Departure Airport:\*\*\s*(?P<airport>.+)')
+ARRIVAL_LINE_RE = re.compile(r'\*\*Arrival Airport:\*\*\s*(?P<airport>.+)')
+SCHEDULES_RE = re.compile(r'Here are the available flights from (?P<route>.+?) on (?P<date>[^:]+):')
+SCHEDULE_ROW_RE = re.compile(r'\*\*Flight Number:\*\*')
+SCHEDULE_COUNT_RE = re.compile(r'(?P<count>\d+) flights found')
+WEATHER_RE = re.compile(r'\*\*(?:Current weather|Weather) at (?P<location>[^:*]+):\*\*')
+CONDITION_LINE_RE = re.compile(r'\*\*Condition:\*\*\s*(?P<condition>.+)')
+TEMPERATURE_LINE_RE = re.compile(r'\*\*Temperature:\*\*\s*(?P<temperature>.+)')
+POLICY_RE = re.compile(r'^\*\*(?P<title>Baggage Policy Information|Cancellation and Change Policy|Frequent Flyer Program Information):\*\*')
+
+
+# Function to count the tokens in a piece of text (memoized so each message is only counted once)
+@lru_cache(maxsize=4096)
+def count_text_tokens(text):
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+# Function to count the tokens a single chat message costs
+def count_message_tokens(message):
+    return count_text_tokens(message["content"] or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+# Function to count the tokens of a whole conversation
+def count_messages_tokens(messages):
+    return sum(count_message_tokens(message) for message in messages)
+
+
+# Function to collapse a rendered tool output into a one-line stub, or None if it is not a tool output
+def summarize_tool_output(content):
+    match = FLIGHT_STATUS_RE.search(content)
+    if match:
+        summary = f"Earlier flight status for {match.group('flight').strip()}"
+        details = []
+        status = STATUS_LINE_RE.search(content)
+        departure = DEPARTURE_LINE_RE.search(content)
+        arrival = ARRIVAL_LINE_RE.search(content)
+        if status:
+            details.append(status.group('status').strip())
+        if departure and arrival:
+            details.append(f"{departure.group('airport').strip()} to {arrival.group('airport').strip()}")
+        return f"[{summary}: {', '.join(details)}]" if details else f"[{summary}]"
+
+    match = SCHEDULES_RE.search(content)
+    if match:
+        found = SCHEDULE_COUNT_RE.search(content)
+        count = int(found.group('count')) if found else len(SCHEDULE_ROW_RE.findall(content))
+        return f"[Earlier schedule search: {count} flights from {match.group('route')} on {match.group('date')}]"
+
+    match = WEATHER_RE.search(content)
+    if match:
+        details = []
+        condition = CONDITION_LINE_RE.search(content)
+        temperature = TEMPERATURE_LINE_RE.search(content)
+        if condition:
+            details.append(condition.group('condition').strip())
+        if temperature:
+            details.append(temperature.group('temperature').strip())
+        summary = ', '.join(details) if details else 'not available'
+        return f"[Earlier weather at {match.group('location').strip()}: {summary}]"
+
+    match = POLICY_RE.search(content)
+    if match:
+        return f"[Earlier reply: {match.group('title')}]"
+    return None
+
+
+# Function to compact an older message into a cheaper equivalent
+def compact_message(message):
+    content = message["content"] or ""
+    if message["role"] == "assistant":
+        summary = summarize_tool_output(content)
+        if summary:
+            return {"role": message["role"], "content": summary}
+    if len(content) > MAX_OLD_MESSAGE_CHARS:
+        return {"role": message["role"], "content": content[:MAX_OLD_MESSAGE_CHARS].rstrip() + " …"}
+    return message
+
+
+# Function to fit a conversation into a token budget: keeps the system prompt and the most
+# recent turns verbatim, then adds compacted older turns (newest first) while they still fit.
+# Returns the messages to send and a report of the tokens saved.
+def compact_history(messages, token_budget=DEFAULT_TOKEN_BUDGET, recent_messages=DEFAULT_RECENT_MESSAGES):
+    original_tokens = count_messages_tokens(messages)
+    system = [messages[0]] if messages and messages[0]["role"] == "system" else []
+    conversation = messages[len(system):]
+    used = count_messages_tokens(system)
+
+    kept = []
+    summarized = 0
+    index = len(conversation) - 1
+    # The latest message is always sent, even when it alone exceeds the budget
+    while index >= 0 and len(conversation) - index <= recent_messages:
+        message = conversation[index]
+        tokens = count_message_tokens(message)
+        if kept and used + tokens > token_budget:
+            break
+        kept.append(message)
+        used += tokens
+        index -= 1
+
+    while index >= 0:
+        message = conversation[index]
+        compacted = compact_message(message)
+        tokens = count_message_tokens(compacted)
+        if used + tokens > token_budget:
+            break
+        if compacted is not message:
+            summarized += 1
+        kept.append(compacted)
+        used += tokens
+        index -= 1
+
+    compacted_messages = system + kept[::-1]
+    report = {
+        "original_tokens": original_tokens,
+        "compacted_tokens": used,
+        "saved_tokens": original_tokens - used,
+        "summarized_messages": summarized,
+        "dropped_messages": index + 1,
+    }
+    return compacted_messages, report
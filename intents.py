@@ -0,0 +1,222 @@
+import re
+from collections import namedtuple
+from datetime import datetime
+
+from airports import get_airport_index, normalize_name
+
+# Keywords that signal each intent (matched as substrings of the lower-cased input)
+INTENT_KEYWORDS = {
+    'flight_status': ['status', 'delayed', 'delay'],
+    'weather': ['weather', 'temperature', 'forecast', 'weather like'],
+    'baggage': ['baggage', 'luggage', 'bag', 'carry-on', 'checked bag', 'baggage allowance', 'baggage policy', 'baggage fees'],
+    'cancellation': ['cancel', 'change', 'refund', 'reschedule', 'cancellation policy', 'change flight'],
+    'frequent_flyer': ['frequent flyer', 'loyalty program', 'miles', 'points', 'membership', 'reward program'],
+}
+
+DEPARTURE_PREFIXES = ['from ', 'leaving ', 'departing ']
+ARRIVAL_PREFIXES = ['to ', 'arriving at ', 'going to ', 'destination ', 'arriving in ']
+
+# Longest place name (in words) looked up after a departure/arrival prefix, e.g. 'ho chi minh city'
+MAX_PLACE_WORDS = 4
+
+# Date formats tried, in order, on a matched date string
+DATE_FORMATS = ('%B %d %Y', '%B %d, %Y', '%Y/%m/%d', '%Y-%m-%d', '%m/%d/%Y')
+
+
+# Function to build one alternation that tries longer phrases first
+def _alternation(phrases):
+    return '|'.join(re.escape(phrase) for phrase in sorted(set(phrases), key=len, reverse=True))
+
+
+_KEYWORD_TO_INTENTS = {}
+for _intent, _keywords in INTENT_KEYWORDS.items():
+    for _keyword in _keywords:
+        _KEYWORD_TO_INTENTS.setdefault(_keyword, []).append(_intent)
+
+# Every intent keyword in one pattern. The zero-width lookahead tries a match at every position,
+# so overlapping keywords are all found in a single left-to-right pass over the text.
+KEYWORD_RE = re.compile(f"(?=({_alternation(_KEYWORD_TO_INTENTS)}))")
+FLIGHT_NUMBER_RE = re.compile(r'\b([A-Za-z]{2}\s?\d{1,4})\b')
+# Stricter form for deciding whether a message is about a specific flight: a spaced number needs an
+# upper-case airline code ('UA 200', not 'up to 23 kg'), and units and short words are never codes
+FLIGHT_MENTION_RE = re.compile(r'\b([A-Za-z]{2})(\s?)\d{1,4}\b')
+NOT_AIRLINE_CODES = frozenset("kg lb cm km mm ml mi hr am pm to in on at by of or up is as no we it".split())
+ORDINAL_RE = re.compile(r'(\d+)(st|nd|rd|th)')
+DATE_RES = [
+    re.compile(r'\b(\w+\s\d{1,2}(?:,|\s)\d{4})\b'),
+    re.compile(r'\b(\d{4}/\d{2}/\d{2})\b'),
+    re.compile(r'\b(\d{4}-\d{2}-\d{2})\b'),
+    re.compile(r'\b(\d{1,2}/\d{1,2}/\d{4})\b'),
+]
+# A departure/arrival prefix followed by the next few words; the lookahead lets the following
+# prefix match inside those words ('from new york to los angeles')
+PLACE_RE = re.compile(
+    f"\\b(?:(?P<departure>{_alternation(DEPARTURE_PREFIXES)})|(?P<arrival>{_alternation(ARRIVAL_PREFIXES)}))"
+    f"(?=(?P<place>[^\\W\\d_]+(?:[ .'-]+[^\\W\\d_]+){{0,{MAX_PLACE_WORDS - 1}}}))",
+    re.IGNORECASE
+)
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+WEATHER_LOCATION_RE = re.compile(r'weather.*(?:at|in|like at|like in|for)?\s+([a-zA-Z\s]{3,})')
+AIRPORT_WORD_RE = re.compile(r'\bairport\b')
+
+# Structured routing result: the chosen intent, every matched intent with its score, and extracted entities
+RouteResult = namedtuple('RouteResult', [
+    'intent', 'scores', 'topics', 'flight_number', 'departure_city', 'arrival_city', 'date', 'weather_location'
+])
+
+
+# Function to check that a keyword found at text[start:end] is a whole word (a plural 's' allowed)
+def _whole_word(text, start, end):
+    if start > 0 and (text[start - 1].isalnum() or text[start - 1] == '_'):
+        return False
+    if end < len(text) and text[end] == 's':
+        end += 1
+    return end == len(text) or not (text[end].isalnum() or text[end] == '_')
+
+
+# Function to find every intent mentioned in the (lower-cased) text, scored by distinct keyword hits.
+# The same pass collects the topics: intents with a keyword present as a whole word, which decide
+# whether a question spans several topics ('changed' or 'baggy' do not count).
+def score_intents(text):
+    matched = set()
+    topics = set()
+    for match in KEYWORD_RE.finditer(text):
+        keyword = match.group(1)
+        matched.add(keyword)
+        if _whole_word(text, match.start(), match.start() + len(keyword)):
+            topics.update(_KEYWORD_TO_INTENTS[keyword])
+    scores = {}
+    for keyword in matched:
+        for intent in _KEYWORD_TO_INTENTS[keyword]:
+            scores[intent] = scores.get(intent, 0) + 1
+    return scores, frozenset(topics)
+
+
+# Function to extract flight number from user input
+def extract_flight_number(user_input):
+    flight_number_match = FLIGHT_NUMBER_RE.search(user_input)
+    if flight_number_match:
+        return flight_number_match.group(1).replace(" ", "")
+    return None
+
+
+# Function to check whether the text mentions something that really looks like a flight number
+def mentions_flight_number(text):
+    for match in FLIGHT_MENTION_RE.finditer(text):
+        code, space = match.group(1), match.group(2)
+        if code.lower() in NOT_AIRLINE_CODES or (space and not code.isupper()):
+            continue
+        return True
+    return False
+
+
+# Function to parse the first supported date in the (lower-cased) text into YYYY-MM-DD
+def extract_date(text):
+    text = ORDINAL_RE.sub(r'\1', text)
+    for date_re in DATE_RES:
+        date_match = date_re.search(text)
+        if date_match:
+            break
+    else:
+        return None
+    date_str = date_match.group(1)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+# Function to resolve the words following a prefix to an IATA code: the longest exact city, alias
+# or airport name first, then an IATA code (lower-case only when the word cannot start a place
+# name, since 'san' and 'los' are codes too), then a typo-tolerant match
+def resolve_place(place):
+    index = get_airport_index()
+    words = normalize_name(place).split()
+    if not words:
+        return None
+    windows = [' '.join(words[:count]) for count in range(len(words), 0, -1)]
+    for window in windows:
+        code = index.primary_code(window)
+        if code:
+            return code
+    first_word = place.split()[0]
+    if len(first_word) == 3 and first_word.isalpha() and (
+        first_word.isupper() or not index.starts_name(first_word.lower())
+    ):
+        airport = index.lookup_code(first_word)
+        if airport:
+            return airport.iata
+    for window in windows:
+        name = index.fuzzy_name(window)
+        if name:
+            return index.primary_code(name)
+    return None
+
+
+# Function to extract the departure and arrival IATA codes from user input
+def extract_cities(user_input):
+    departure_city = None
+    arrival_city = None
+    for match in PLACE_RE.finditer(user_input):
+        code = resolve_place(match.group('place'))
+        if not code:
+            continue
+        if match.group('departure'):
+            departure_city = code
+        else:
+            arrival_city = code
+    return departure_city, arrival_city
+
+
+# Function to extract city codes and date from user input
+def extract_flight_search_details(user_input):
+    departure_city, arrival_city = extract_cities(user_input)
+    return departure_city, arrival_city, extract_date(user_input.lower())
+
+
+# Function to pull the location out of a weather question ('' when none can be found)
+def extract_weather_location(user_input):
+    user_input_clean = PUNCTUATION_RE.sub('', user_input.lower())
+    location_match = WEATHER_LOCATION_RE.search(user_input_clean)
+    if location_match:
+        # Remove any trailing words like 'airport'
+        return AIRPORT_WORD_RE.sub('', location_match.group(1).strip()).strip()
+    # Default to extracting the last word as the location
+    words = user_input_clean.split()
+    return words[-1] if words else ''
+
+
+# Function to route user input: normalizes once, scores every intent in one pass and extracts
+# the entities the chosen intent needs. Precedence matches the original submit_input checks.
+def route(user_input):
+    text = user_input.lower()
+    scores, topics = score_intents(text)
+    flight_number = extract_flight_number(user_input)
+    departure_city = arrival_city = date = weather_location = None
+
+    if flight_number and 'flight_status' in scores:
+        intent = 'flight_status'
+    else:
+        # Place lookups are the costliest step, and a schedule search needs a date anyway
+        date = extract_date(text)
+        if date:
+            departure_city, arrival_city = extract_cities(user_input)
+        if departure_city and arrival_city and date:
+            intent = 'flight_schedules'
+        elif 'weather' in scores and not flight_number:
+            intent = 'weather'
+            weather_location = extract_weather_location(user_input)
+        elif 'baggage' in scores:
+            intent = 'baggage'
+        elif 'cancellation' in scores:
+            intent = 'cancellation'
+        elif 'frequent_flyer' in scores:
+            intent = 'frequent_flyer'
+        else:
+            intent = 'chat'
+
+    return RouteResult(
+        intent, scores, topics, flight_number, departure_city, arrival_city, date, weather_location
+    )
@@ -0,0 +1,39 @@
+# Function to provide baggage policy information
+def get_baggage_policy():
+    baggage_policy = (
+        "**Baggage Policy Information:**\n"
+        "- **Carry-on Baggage:** Passengers are allowed one carry-on bag and one personal item.\n"
+        "- **Checked Baggage:** The allowance for checked bags depends on your ticket class.\n"
+        "  - Economy Class: 1 bag up to 23 kg (50 lbs)\n"
+        "  - Business Class: 2 bags up to 32 kg (70 lbs) each\n"
+        "- **Excess Baggage Fees:** Additional fees apply for overweight or extra bags.\n"
+        "- **Special Items:** Sports equipment and musical instruments may have special regulations.\n"
+        "\nFor more detailed information, please visit our [Baggage Policy](https://www.exampleairline.com/baggage-policy) page or let me know if you have specific questions!"
+    )
+    return baggage_policy
+
+# Function to provide cancellation and change policy information
+def get_cancellation_policy():
+    cancellation_policy = (
+        "**Cancellation and Change Policy:**\n"
+        "- **24-Hour Flexibility:** You can change or cancel your flight within 24 hours of booking without any fees.\n"
+        "- **Fees:** After 24 hours, fees may apply depending on your fare type.\n"
+        "  - Economy Saver: Changes and cancellations are subject to a fee of $200.\n"
+        "  - Economy Flex: Changes are free; cancellations are subject to a fee of $100.\n"
+        "  - Business Class: Changes and cancellations are free.\n"
+        "- **Refunds:** Refunds will be processed to the original form of payment within 7-10 business days.\n"
+        "\nIf you need assistance with changing or cancelling your flight, please provide your booking reference or contact our customer service at 1-800-EXAMPLE."
+    )
+    return cancellation_policy
+
+# Function to provide frequent flyer program information
+def get_frequent_flyer_info():
+    ff_info = (
+        "**Frequent Flyer Program Information:**\n"
+        "- **Enrollment:** Join our Frequent Flyer Program for free and start earning miles today!\n"
+        "- **Earning Miles:** Earn miles on flights, hotel stays, car rentals, and with our partners.\n"
+        "- **Redeeming Miles:** Redeem miles for flights, seat upgrades, and other rewards.\n"
+        "- **Tier Benefits:** Enjoy exclusive benefits like priority boarding, lounge access, and extra baggage allowance as you move up tiers.\n"
+        "\nTo enroll or learn more, visit our [Frequent Flyer Program](https://www.exampleairline.com/frequent-flyer) page or let me know if you have questions!"
+    )
+    return ff_info
@@ -0,0 +1,227 @@
+import logging
+import threading
+import time
+from collections import deque, namedtuple
+
+logger = logging.getLogger("aerochat")
+
+# Seconds between polls of all tracked flights
+DEFAULT_POLL_INTERVAL = 60
+
+# Sessions stop receiving updates for a flight this long after they last asked about it; every
+# tracked flight costs one AviationStack call per interval until then
+DEFAULT_SUBSCRIPTION_TTL = 30 * 60
+
+# Flight statuses after which nothing more changes; such flights are dropped once the change is pushed
+FINAL_STATUSES = frozenset({'landed', 'cancelled', 'diverted'})
+
+# Updates kept per session until the client picks them up
+MAX_PENDING_UPDATES = 50
+
+# Fields of a flight record whose changes are pushed to subscribers, with their display labels
+TRACKED_FIELDS = {
+    'status': 'Status',
+    'departure_terminal': 'Departure terminal',
+    'departure_gate': 'Departure gate',
+    'departure_delay': 'Departure delay (min)',
+    'departure_estimated': 'Estimated departure',
+    'arrival_terminal': 'Arrival terminal',
+    'arrival_gate': 'Arrival gate',
+    'arrival_delay': 'Arrival delay (min)',
+    'arrival_estimated': 'Estimated arrival',
+}
+
+# A change to one tracked flight: {field: (old, new)} plus the full new snapshot
+FlightUpdate = namedtuple('FlightUpdate', ['flight_number', 'changes', 'snapshot'])
+
+
+# Function to reduce an AviationStack flight record to the fields tracked for changes
+def flight_snapshot(record):
+    departure = record.get('departure') or {}
+    arrival = record.get('arrival') or {}
+    return {
+        'status': record.get('flight_status'),
+        'departure_terminal': departure.get('terminal'),
+        'departure_gate': departure.get('gate'),
+        'departure_delay': departure.get('delay'),
+        'departure_estimated': departure.get('estimated'),
+        'arrival_terminal': arrival.get('terminal'),
+        'arrival_gate': arrival.get('gate'),
+        'arrival_delay': arrival.get('delay'),
+        'arrival_estimated': arrival.get('estimated'),
+    }
+
+
+# Function to render a flight update as a chat message
+def format_flight_update(update):
+    lines = [f"**Update for {update.flight_number}:**"]
+    for field, (old, new) in update.changes.items():
+        lines.append(f"- **{TRACKED_FIELDS[field]}:** {old or 'N/A'} → {new or 'N/A'}")
+    return "\n".join(lines)
+
+
+# Shared background poller: sessions subscribe to flight numbers, every tracked flight is fetched
+# once per interval no matter how many sessions follow it, and only changes are pushed out.
+class FlightStatusPoller:
+    def __init__(self, fetch_records, interval=DEFAULT_POLL_INTERVAL, batch_size=1,
+                 subscription_ttl=DEFAULT_SUBSCRIPTION_TTL, clock=time.monotonic):
+        # fetch_records(flight_numbers) -> {flight_number: AviationStack record}; called with up to
+        # batch_size flights at a time
+        self.fetch_records = fetch_records
+        self.interval = interval
+        self.batch_size = batch_size
+        self.subscription_ttl = subscription_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._subscriptions = {}  # flight number -> {session id: last time the session asked}
+        self._states = {}  # flight number -> latest snapshot
+        self._pending = {}  # session id -> deque of FlightUpdate
+        self._listeners = {}  # session id -> callable(FlightUpdate)
+        self._stop = threading.Event()
+        self._thread = None
+        self.polls = 0
+        self.fetches = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="aerochat-flight-poller", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll_once()
+            except Exception:
+                logger.exception("Flight status poll failed")
+
+    # Function to register interest in a flight; seeds the shared state table with a known record.
+    # Flights that have already landed, been cancelled or diverted are not tracked.
+    def subscribe(self, session_id, flight_number, record=None):
+        flight_number = flight_number.upper()
+        if record is not None and record.get('flight_status') in FINAL_STATUSES:
+            return
+        with self._lock:
+            self._subscriptions.setdefault(flight_number, {})[session_id] = self._clock()
+            if record is not None and flight_number not in self._states:
+                self._states[flight_number] = flight_snapshot(record)
+
+    def unsubscribe(self, session_id, flight_number=None):
+        with self._lock:
+            flights = [flight_number.upper()] if flight_number else list(self._subscriptions)
+            for flight in flights:
+                subscribers = self._subscriptions.get(flight, {})
+                subscribers.pop(session_id, None)
+                if not subscribers:
+                    self._subscriptions.pop(flight, None)
+                    self._states.pop(flight, None)
+            if flight_number is None:
+                self._pending.pop(session_id, None)
+                self._listeners.pop(session_id, None)
+
+    # Function to have updates for a session pushed to a callback (called from the poller thread)
+    def set_listener(self, session_id, listener):
+        with self._lock:
+            if listener is None:
+                self._listeners.pop(session_id, None)
+            else:
+                self._listeners[session_id] = listener
+
+    # Function to take the updates queued for a session since it last asked
+    def drain(self, session_id):
+        with self._lock:
+            pending = self._pending.pop(session_id, None)
+        return list(pending) if pending else []
+
+    def tracked_flights(self):
+        with self._lock:
+            return sorted(self._subscriptions)
+
+    def state(self, flight_number):
+        with self._lock:
+            snapshot = self._states.get(flight_number.upper())
+            return dict(snapshot) if snapshot else None
+
+    def _expire_subscriptions(self):
+        cutoff = self._clock() - self.subscription_ttl
+        expired = set()
+        for flight in list(self._subscriptions):
+            subscribers = self._subscriptions[flight]
+            for session_id, last_seen in list(subscribers.items()):
+                if last_seen < cutoff:
+                    del subscribers[session_id]
+                    expired.add(session_id)
+            if not subscribers:
+                del self._subscriptions[flight]
+                self._states.pop(flight, None)
+        # Sessions left without any tracked flight also lose their queued updates and listener
+        for subscribers in self._subscriptions.values():
+            expired.difference_update(subscribers)
+        for session_id in expired:
+            self._pending.pop(session_id, None)
+            self._listeners.pop(session_id, None)
+
+    # Function to fetch every tracked flight once and push the changes; returns the updates
+    def poll_once(self):
+        with self._lock:
+            self._expire_subscriptions()
+            flights = sorted(self._subscriptions)
+        self.polls += 1
+
+        records = {}
+        for start in range(0, len(flights), self.batch_size):
+            batch = flights[start:start + self.batch_size]
+            self.fetches += 1
+            try:
+                records.update(self.fetch_records(batch))
+            except Exception:
+                logger.exception("Fetching flight records failed for %s", ", ".join(batch))
+
+        updates = []
+        notifications = []
+        with self._lock:
+            for flight, record in records.items():
+                flight = flight.upper()
+                subscribers = self._subscriptions.get(flight)
+                if not subscribers:
+                    continue
+                snapshot = flight_snapshot(record)
+                previous = self._states.get(flight)
+                # A finished flight is polled no more; its subscribers still get this last change
+                if snapshot['status'] in FINAL_STATUSES:
+                    del self._subscriptions[flight]
+                    self._states.pop(flight, None)
+                else:
+                    self._states[flight] = snapshot
+                if previous is None:
+                    continue
+                changes = {
+                    field: (previous[field], snapshot[field])
+                    for field in TRACKED_FIELDS if previous[field] != snapshot[field]
+                }
+                if not changes:
+                    continue
+                update = FlightUpdate(flight, changes, snapshot)
+                updates.append(update)
+                for session_id in subscribers:
+                    listener = self._listeners.get(session_id)
+                    if listener is not None:
+                        notifications.append((listener, update))
+                    else:
+                        self._pending.setdefault(session_id, deque(maxlen=MAX_PENDING_UPDATES)).append(update)
+
+        for listener, update in notifications:
+            try:
+                listener(update)
+            except Exception:
+                logger.exception("Flight update listener failed")
+        return updates
@@ -0,0 +1,305 @@
+import atexit
+import contextlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # No cross-process locking of the ledger file where fcntl is unavailable
+    fcntl = None
+
+logger = logging.getLogger("aerochat")
+
+# Request priorities; lower values are served first
+PRIORITY_INTERACTIVE = 0  # Lookups a user is waiting on (flight status, schedules, weather questions)
+PRIORITY_ENRICHMENT = 1  # Secondary data attached to another answer (weather alongside a flight)
+PRIORITY_BACKGROUND = 2  # Refreshes nobody is waiting on (the flight status poller)
+
+# Seconds each priority may wait for a token before the call is skipped
+PRIORITY_TIMEOUTS = {
+    PRIORITY_INTERACTIVE: 5.0,
+    PRIORITY_ENRICHMENT: 1.0,
+    PRIORITY_BACKGROUND: 0.0,
+}
+
+# Below this fraction of the monthly quota only interactive lookups reach the provider
+LOW_BUDGET_FRACTION = 0.1
+
+# Per-provider defaults: sustained requests per second, burst size and monthly quota (None = unlimited)
+DEFAULT_LIMITS = {
+    'aviationstack': {'rate': 5.0, 'burst': 10, 'monthly_quota': None},
+    'openweather': {'rate': 1.0, 'burst': 10, 'monthly_quota': 1000000},
+}
+
+# The ledger is written to disk after this many calls or seconds, whichever comes first
+LEDGER_FLUSH_EVERY = 20
+LEDGER_FLUSH_INTERVAL = 30
+
+# Months of usage kept in the ledger file
+LEDGER_MONTHS_KEPT = 3
+
+# Ledger file used unless QUOTA_LEDGER_PATH says otherwise (set it empty to keep counts in memory only)
+DEFAULT_LEDGER_PATH = 'quota_ledger.json'
+
+
+# Token bucket refilled continuously at `rate` tokens per second up to `burst` (not thread-safe on its own)
+class TokenBucket:
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def try_acquire(self):
+        now = self._refill()
+        if now < self._paused_until or self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    # Seconds until a token can be taken
+    def wait_time(self):
+        now = self._refill()
+        refill = (1 - self._tokens) / self.rate if self._tokens < 1 else 0.0
+        return max(self._paused_until - now, refill)
+
+    # Function to stop handing out tokens for a while, e.g. after the provider answered 429
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self._tokens = 0.0
+
+
+# Calls made to each provider this calendar month (UTC). Counts are kept in memory and merged
+# into a JSON file shared by every process, so restarts and multiple workers share one budget.
+class QuotaLedger:
+    def __init__(self, path=None, quotas=None, clock=time.time):
+        self.path = path
+        self.quotas = dict(quotas or {})
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._month = self._current_month()
+        self._counts = {}
+        self._unflushed = {}
+        self._last_flush = clock()
+        if path:
+            try:
+                self._counts = dict(self._read().get(self._month, {}))
+            except (OSError, ValueError):
+                logger.exception("Reading the quota ledger %s failed", path)
+            atexit.register(self.flush)
+
+    def _current_month(self):
+        return time.strftime('%Y-%m', time.gmtime(self._clock()))
+
+    def _roll_month(self):
+        month = self._current_month()
+        if month != self._month:
+            self._month = month
+            self._counts = {}
+            self._unflushed = {}
+
+    def used(self, provider):
+        with self._lock:
+            self._roll_month()
+            return self._counts.get(provider, 0)
+
+    # Calls left this month, or None when the provider has no quota
+    def remaining(self, provider):
+        quota = self.quotas.get(provider)
+        if quota is None:
+            return None
+        return max(0, quota - self.used(provider))
+
+    def fraction_remaining(self, provider):
+        quota = self.quotas.get(provider)
+        if not quota:
+            return 1.0
+        return self.remaining(provider) / quota
+
+    def record(self, provider, count=1):
+        with self._lock:
+            self._roll_month()
+            self._counts[provider] = self._counts.get(provider, 0) + count
+            self._unflushed[provider] = self._unflushed.get(provider, 0) + count
+            due = self.path and (
+                sum(self._unflushed.values()) >= LEDGER_FLUSH_EVERY
+                or self._clock() - self._last_flush >= LEDGER_FLUSH_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, encoding='utf-8') as ledger_file:
+            return json.load(ledger_file)
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Function to add this process's new calls to the ledger file and pick up the other processes' calls
+    def flush(self):
+        with self._lock:
+            if not self.path or not self._unflushed:
+                return
+            unflushed, self._unflushed = self._unflushed, {}
+            month = self._month
+            self._last_flush = self._clock()
+        try:
+            with self._file_lock():
+                data = self._read()
+                counts = data.setdefault(month, {})
+                for provider, count in unflushed.items():
+                    counts[provider] = counts.get(provider, 0) + count
+                for old_month in sorted(data)[:-LEDGER_MONTHS_KEPT]:
+                    del data[old_month]
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as ledger_file:
+                    json.dump(data, ledger_file)
+                os.replace(temp_path, self.path)
+        except (OSError, ValueError):
+            logger.exception("Writing the quota ledger %s failed", self.path)
+            with self._lock:
+                if month == self._month:
+                    for provider, count in unflushed.items():
+                        self._unflushed[provider] = self._unflushed.get(provider, 0) + count
+            return
+        with self._lock:
+            if month == self._month:
+                for provider, total in counts.items():
+                    self._counts[provider] = total + self._unflushed.get(provider, 0)
+
+
+# Shared limiter: one token bucket per provider, granted strictly by priority (FIFO within a priority),
+# with the monthly quota checked before any waiting
+class RateLimiter:
+    def __init__(self, limits=None, ledger=None, clock=time.monotonic):
+        limits = DEFAULT_LIMITS if limits is None else limits
+        self._clock = clock
+        self.buckets = {provider: TokenBucket(limit['rate'], limit['burst'], clock) for provider, limit in limits.items()}
+        self.ledger = ledger or QuotaLedger(quotas={
+            provider: limit.get('monthly_quota') for provider, limit in limits.items()
+        })
+        self._condition = threading.Condition()
+        self._waiters = {provider: [] for provider in limits}
+        self._tickets = itertools.count()
+        self.granted = dict.fromkeys(limits, 0)
+        self.denied = dict.fromkeys(limits, 0)
+
+    # Build a limiter from os.environ or any other mapping, e.g. AVIATIONSTACK_RATE_LIMIT=2,
+    # AVIATIONSTACK_BURST=5, AVIATIONSTACK_MONTHLY_QUOTA=10000 and QUOTA_LEDGER_PATH=/var/lib/aerochat/quota.json
+    @classmethod
+    def from_mapping(cls, mapping):
+        limits = {}
+        for provider, defaults in DEFAULT_LIMITS.items():
+            prefix = provider.upper()
+            quota = mapping.get(f"{prefix}_MONTHLY_QUOTA", defaults['monthly_quota'])
+            limits[provider] = {
+                'rate': float(mapping.get(f"{prefix}_RATE_LIMIT", defaults['rate'])),
+                'burst': int(mapping.get(f"{prefix}_BURST", defaults['burst'])),
+                'monthly_quota': int(quota) if quota not in (None, '') else None,
+            }
+        ledger = QuotaLedger(mapping.get("QUOTA_LEDGER_PATH", DEFAULT_LEDGER_PATH) or None, {
+            provider: limit['monthly_quota'] for provider, limit in limits.items()
+        })
+        return cls(limits, ledger)
+
+    def budget_low(self, provider):
+        return self.ledger.fraction_remaining(provider) < LOW_BUDGET_FRACTION
+
+    # Function to check the monthly budget: once it runs low only interactive lookups are let through
+    def admits(self, provider, priority):
+        fraction = self.ledger.fraction_remaining(provider)
+        if fraction <= 0:
+            return False
+        return priority == PRIORITY_INTERACTIVE or fraction >= LOW_BUDGET_FRACTION
+
+    # Function to wait for a token; returns False if the budget or the priority's timeout says no
+    def acquire(self, provider, priority=PRIORITY_INTERACTIVE, timeout=None):
+        bucket = self.buckets.get(provider)
+        if bucket is None:
+            return True
+        if not self.admits(provider, priority):
+            with self._condition:
+                self.denied[provider] += 1
+            return False
+
+        timeout = PRIORITY_TIMEOUTS.get(priority, 0.0) if timeout is None else timeout
+        deadline = self._clock() + timeout
+        waiters = self._waiters[provider]
+        with self._condition:
+            ticket = (priority, next(self._tickets))
+            heapq.heappush(waiters, ticket)
+            try:
+                while True:
+                    # Only the highest-priority waiter may take a token
+                    wait = None
+                    if waiters[0] == ticket:
+                        if bucket.try_acquire():
+                            granted = True
+                            break
+                        wait = bucket.wait_time()
+                    remaining = deadline - self._clock()
+                    if remaining <= 0:
+                        granted = False
+                        break
+                    self._condition.wait(remaining if wait is None else min(wait, remaining))
+            finally:
+                waiters.remove(ticket)
+                heapq.heapify(waiters)
+                self._condition.notify_all()
+            if granted:
+                self.granted[provider] += 1
+            else:
+                self.denied[provider] += 1
+        if granted:
+            self.ledger.record(provider)
+        return granted
+
+    # Function to hold back a provider's tokens after it signalled throttling (HTTP 429)
+    def penalize(self, provider, seconds):
+        bucket = self.buckets.get(provider)
+        if bucket is None:
+            return
+        with self._condition:
+            bucket.pause(seconds)
+
+    def stats(self):
+        with self._condition:
+            granted, denied = dict(self.granted), dict(self.denied)
+        return {
+            provider: {
+                'granted': granted[provider],
+                'denied': denied[provider],
+                'quota_used': self.ledger.used(provider),
+                'quota_remaining': self.ledger.remaining(provider),
+            }
+            for provider in self.buckets
+        }
+
+
+# Process-wide limiter for the shared upstream client, configured from the environment
+# (Streamlit also exposes root-level secrets as environment variables)
+default_limiter = RateLimiter.from_mapping(os.environ)
@@ -0,0 +1,300 @@
+import atexit
+import json
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+logger = logging.getLogger("aerochat")
+
+# Size of the hashed feature space used for query vectors
+VECTOR_DIM = 1024
+
+# Random-hyperplane LSH layout: more tables raise recall, more bits per table shrink the buckets.
+# At the default threshold this finds a matching entry roughly 85% of the time.
+LSH_TABLES = 10
+LSH_BITS = 6
+
+# Cosine similarity a cached query needs to be reused for a new one
+DEFAULT_THRESHOLD = 0.7
+
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 2000
+
+# The cache file is rewritten after this many new entries or seconds, whichever comes first
+SAVE_EVERY = 20
+SAVE_INTERVAL = 60
+
+# Questions with fewer content words than this are too short to stand on their own ("yes", "refund?")
+MIN_CONTENT_WORDS = 2
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+# Filler words that would otherwise make unrelated questions look alike
+STOP_WORDS = frozenset(
+    "a an and any are at be can could did do does for how i in is it its me my of on or our please "
+    "that the there this to was we what when where which who will with would you your".split()
+)
+
+# Pronouns and follow-up words that tie a question to the user or to earlier turns, so its answer
+# must not be shared ("what about my booking?", "tell me more about that")
+CONTEXT_WORDS = frozenset(
+    "me my mine myself i'm i've we're our ours us yes yeah yep no nope ok okay sure thanks it that this "
+    "those these them they he she his her him more else again above earlier previous same".split()
+)
+
+# Modifiers that change the answer to an otherwise identical question (domestic or international,
+# short- or long-haul): a cached reply is only reused when both questions have the same ones
+MODIFIER_WORDS = frozenset(
+    "domestic international short long medium economy business first premium basic checked carry "
+    "overweight oversized infant infants child children adult adults senior seniors unaccompanied "
+    "one round refundable nonrefundable non free paid extra before after early late".split()
+)
+
+
+# Function to check whether a question can be answered without the conversation around it,
+# which is the only kind of question whose answer may be shared with other sessions
+def is_self_contained(query):
+    words = WORD_RE.findall(query.lower())
+    if any(word in CONTEXT_WORDS for word in words):
+        return False
+    return sum(word not in STOP_WORDS for word in words) >= MIN_CONTENT_WORDS
+
+
+# Function to check that neither question has an answer-changing modifier the other lacks
+def same_modifiers(query, other):
+    words = set(WORD_RE.findall(query.lower())) & MODIFIER_WORDS
+    return words == set(WORD_RE.findall(other.lower())) & MODIFIER_WORDS
+
+
+# Function to embed a query as a sparse, L2-normalized vector of hashed word and character n-grams.
+# crc32 keeps the hashing stable across processes so persisted entries stay valid after restarts.
+def embed(text):
+    words = [word for word in WORD_RE.findall(text.lower()) if word not in STOP_WORDS]
+    features = {}
+    for word in words:
+        features[f"w:{word}"] = features.get(f"w:{word}", 0) + 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            gram = f"c:{padded[i:i + 3]}"
+            features[gram] = features.get(gram, 0) + 0.5
+    for first, second in zip(words, words[1:]):
+        features[f"b:{first} {second}"] = features.get(f"b:{first} {second}", 0) + 1.0
+
+    vector = {}
+    for feature, weight in features.items():
+        hashed = zlib.crc32(feature.encode('utf-8'))
+        index = hashed % VECTOR_DIM
+        sign = 1.0 if (hashed >> 31) & 1 else -1.0
+        vector[index] = vector.get(index, 0.0) + sign * weight
+    norm = math.sqrt(sum(value * value for value in vector.values()))
+    if norm == 0:
+        return {}
+    return {index: value / norm for index, value in vector.items() if value}
+
+
+# Function to compute the cosine similarity of two normalized sparse vectors
+def cosine(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+class _Entry:
+    __slots__ = ("query", "response", "vector", "created_at", "signatures")
+
+    def __init__(self, query, response, vector, created_at, signatures):
+        self.query = query
+        self.response = response
+        self.vector = vector
+        self.created_at = created_at
+        self.signatures = signatures
+
+
+# Approximate nearest-neighbour response cache for free-form questions sent to the LLM
+class SemanticCache:
+    def __init__(self, threshold=DEFAULT_THRESHOLD, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES,
+                 path=None, clock=time.time):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._next_id = 0
+        self._tables = [{} for _ in range(LSH_TABLES)]
+        rng = random.Random(0)
+        self._planes = [
+            [[rng.gauss(0, 1) for _ in range(VECTOR_DIM)] for _ in range(LSH_BITS)]
+            for _ in range(LSH_TABLES)
+        ]
+        self.hits = 0
+        self.misses = 0
+        self.skips = 0
+        self.evictions = 0
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+        self._last_save = clock()
+        if path:
+            if os.path.exists(path):
+                self._load()
+            atexit.register(self.flush)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _signatures(self, vector):
+        signatures = []
+        for planes in self._planes:
+            signature = 0
+            for plane in planes:
+                signature = (signature << 1) | (sum(plane[index] * value for index, value in vector.items()) >= 0)
+            signatures.append(signature)
+        return signatures
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for table, signature in zip(self._tables, entry.signatures):
+            bucket = table.get(signature)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[signature]
+
+    def _insert(self, query, response, vector, created_at):
+        entry_id = self._next_id
+        self._next_id += 1
+        signatures = self._signatures(vector)
+        self._entries[entry_id] = _Entry(query, response, vector, created_at, signatures)
+        for table, signature in zip(self._tables, signatures):
+            table.setdefault(signature, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    # Function to count a lookup that was skipped on purpose (e.g. flight-specific context)
+    def record_skip(self):
+        with self._lock:
+            self.skips += 1
+
+    # Function to return a cached response for a similar enough query, or None
+    def lookup(self, query):
+        if not is_self_contained(query):
+            return None
+        vector = embed(query)
+        if not vector:
+            return None
+        signatures = self._signatures(vector)
+        now = self._clock()
+        with self._lock:
+            candidates = set()
+            for table, signature in zip(self._tables, signatures):
+                candidates.update(table.get(signature, ()))
+            best_id, best_score = None, self.threshold
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if now - entry.created_at > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                score = cosine(vector, entry.vector)
+                if score >= best_score and same_modifiers(query, entry.query):
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_id)
+            return self._entries[best_id].response
+
+    # Function to remember the response given to a query
+    def store(self, query, response):
+        if not is_self_contained(query):
+            return
+        vector = embed(query)
+        if not vector:
+            return
+        with self._lock:
+            self._insert(query, response, vector, self._clock())
+            self._unsaved += 1
+            due = self.path and (
+                self._unsaved >= SAVE_EVERY or self._clock() - self._last_save >= SAVE_INTERVAL
+            )
+        if due:
+            self.flush()
+
+    def _read_records(self):
+        with open(self.path, encoding='utf-8') as cache_file:
+            records = json.load(cache_file)
+        if not isinstance(records, list):
+            raise ValueError("cache file does not hold a list")
+        return records
+
+    def _load(self):
+        try:
+            records = self._read_records()
+        except (OSError, ValueError):
+            # A damaged cache file only costs the cached replies
+            logger.exception("Reading the semantic cache %s failed", self.path)
+            return
+        now = self._clock()
+        for record in records:
+            try:
+                if now - record['created_at'] <= self.ttl:
+                    self._insert(record['query'], record['response'], embed(record['query']), record['created_at'])
+            except (KeyError, TypeError):
+                continue
+
+    # Function to write the cache to its file, merged with the entries other processes saved there.
+    # Runs outside the lookup lock; each process writes through its own temp file.
+    def flush(self):
+        with self._lock:
+            if not self.path or not self._unsaved:
+                return
+            self._unsaved = 0
+            self._last_save = self._clock()
+            records = [
+                {'query': entry.query, 'response': entry.response, 'created_at': entry.created_at}
+                for entry in self._entries.values()
+            ]
+        with self._save_lock:
+            try:
+                merged = {}
+                if os.path.exists(self.path):
+                    try:
+                        for record in self._read_records():
+                            if isinstance(record, dict) and 'query' in record:
+                                merged[record['query']] = record
+                    except (OSError, ValueError):
+                        logger.warning("Replacing unreadable semantic cache %s", self.path)
+                for record in records:
+                    merged[record['query']] = record
+                now = self._clock()
+                kept = sorted(
+                    (record for record in merged.values() if now - record.get('created_at', 0) <= self.ttl),
+                    key=lambda record: record['created_at']
+                )[-self.max_entries:]
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as cache_file:
+                    json.dump(kept, cache_file)
+                os.replace(temp_path, self.path)
+            except (OSError, ValueError, TypeError):
+                logger.exception("Writing the semantic cache %s failed", self.path)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "skips": self.skips,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,178 @@
+# Async HTTP/WebSocket entry point for the chat engine.
+# Run with: uvicorn server:app --workers 4
+import asyncio
+import os
+import threading
+import weakref
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+from engine import ChatEngine, EngineConfig
+from flights import DEFAULT_PAGE_SIZE
+from poller import format_flight_update
+from session_store import create_session_store
+
+app = FastAPI(title="AeroChat")
+
+# Created on the first request so importing this module never reads secrets or opens connections
+_engine = None
+_store = None
+# Guards their creation, which also happens on asyncio.to_thread workers; reentrant since the store
+# hooks itself up to the engine
+_globals_lock = threading.RLock()
+# Serializes the turns of a session within this process; entries go away with their last user
+_session_locks = weakref.WeakValueDictionary()
+
+
+class ChatRequest(BaseModel):
+    session_id: str
+    message: str
+
+
+# Function to get the engine, configured from environment variables
+def get_engine():
+    global _engine
+    with _globals_lock:
+        if _engine is None:
+            _engine = ChatEngine(EngineConfig.from_mapping(os.environ))
+        return _engine
+
+
+# Function to get the session store (SESSION_STORE=sqlite lets several workers share conversations)
+def get_store():
+    global _store
+    with _globals_lock:
+        if _store is None:
+            store = create_session_store(os.environ)
+            # Sessions that idle out or are deleted stop having their flights polled
+            store.set_end_listener(get_engine().end_session)
+            _store = store
+        return _store
+
+
+# Function to get the lock that serializes a session's turns in this process
+def get_session_lock(session_id):
+    lock = _session_locks.get(session_id)
+    if lock is None:
+        lock = _session_locks[session_id] = asyncio.Lock()
+    return lock
+
+
+# Function to load a session (picking up turns other workers added), run a turn on it and save it
+def run_turn(session_id, message):
+    store = get_store()
+    session = store.checkout(session_id)
+    response = get_engine().respond(session, message, False)
+    updates = get_engine().pending_updates(session)
+    store.save(session)
+    return session, response, updates
+
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    async with get_session_lock(request.session_id):
+        session, response, updates = await asyncio.to_thread(run_turn, request.session_id, request.message)
+    return {"session_id": session.session_id, **response.to_dict(), "updates": updates}
+
+
+# Older turns of a conversation, by position in the stored history (sessions keep only recent turns in memory)
+@app.get("/sessions/{session_id}/messages")
+async def session_messages(session_id: str, start: int = 0, limit: int = 50):
+    start = max(0, start)
+    messages = await asyncio.to_thread(get_store().load_messages, session_id, start, start + min(max(1, limit), 500))
+    return {"session_id": session_id, "start": start, "messages": messages}
+
+
+# Prometheus text exposition of span latencies, cache outcomes, token usage and upstream health.
+# Metrics are per process, so scrape each worker (or run a single worker behind the scraper).
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(get_engine().metrics_text(), media_type="text/plain; version=0.0.4")
+
+
+# One page of the session's latest schedule search, sorted by departure, arrival, airline, status or flight
+@app.get("/sessions/{session_id}/schedule")
+async def schedule_page(session_id: str, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE,
+                        sort_by: str = "departure", airline: str = None, status: str = None):
+    store = get_store()
+    # Checking out an unknown id would start a new session
+    if not await asyncio.to_thread(store.exists, session_id):
+        raise HTTPException(status_code=404, detail="Unknown session")
+    session = await asyncio.to_thread(store.checkout, session_id)
+    if session.schedule is None:
+        raise HTTPException(status_code=404, detail="No schedule search in this session")
+    page_size = min(max(1, page_size), 100)
+    pages = session.schedule.page_count(page_size, airline, status)
+    page = min(max(1, page), pages)
+    # Rendering looks up the weather at both ends of each flight, so it runs off the event loop
+    content = await asyncio.to_thread(
+        get_engine().schedule_page, session, page, page_size, sort_by, airline, status
+    )
+    return {
+        "session_id": session_id,
+        "page": page,
+        "pages": pages,
+        "content": content,
+    }
+
+
+# Function to record a pushed flight update in the stored conversation
+def record_update(session_id, content):
+    store = get_store()
+    session = store.checkout(session_id)
+    session.add_message("assistant", content)
+    store.save(session)
+
+
+# Function to forward flight status changes for a session to its socket as {"type": "update"} frames
+async def push_flight_updates(websocket, session_id, updates):
+    while True:
+        update = await updates.get()
+        content = format_flight_update(update)
+        async with get_session_lock(session_id):
+            await asyncio.to_thread(record_update, session_id, content)
+        await websocket.send_json({
+            "type": "update", "flight_number": update.flight_number, "content": content,
+            "changes": {field: list(change) for field, change in update.changes.items()},
+        })
+
+
+# Each text frame is one user message. Streamed replies are sent as {"type": "delta"} frames,
+# and every turn ends with a {"type": "response"} frame holding the structured result.
+# Flight status changes are pushed as {"type": "update"} frames whenever the poller sees them.
+@app.websocket("/ws/{session_id}")
+async def chat_socket(websocket: WebSocket, session_id: str):
+    await websocket.accept()
+    engine = get_engine()
+    store = get_store()
+    # Held for the life of the socket so the turns and the pushed updates share one lock
+    lock = get_session_lock(session_id)
+    pusher = None
+    if engine.config.track_flights:
+        loop = asyncio.get_running_loop()
+        updates = asyncio.Queue()
+        engine.poller.set_listener(session_id, lambda update: loop.call_soon_threadsafe(updates.put_nowait, update))
+        pusher = asyncio.create_task(push_flight_updates(websocket, session_id, updates))
+    try:
+        while True:
+            message = await websocket.receive_text()
+            async with lock:
+                session = await asyncio.to_thread(store.checkout, session_id)
+                response = await asyncio.to_thread(engine.respond, session, message, True)
+                if response.stream is not None:
+                    while True:
+                        delta = await asyncio.to_thread(next, response.stream, None)
+                        if delta is None:
+                            break
+                        await websocket.send_json({"type": "delta", "content": delta})
+                # Saved once the streamed reply has been recorded
+                await asyncio.to_thread(store.save, session)
+            await websocket.send_json({"type": "response", "session_id": session.session_id, **response.to_dict()})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if pusher is not None:
+            engine.poller.set_listener(session_id, None)
+            pusher.cancel()
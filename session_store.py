@@ -0,0 +1,438 @@
+import contextlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from engine import ChatSession, SYSTEM_PROMPT
+from flights import ScheduleView
+
+logger = logging.getLogger("aerochat")
+
+# Live sessions untouched for this long are dropped from memory (their history stays in the store)
+DEFAULT_IDLE_TIMEOUT = 30 * 60
+
+# Stored sessions untouched for this long are deleted by purge(); the memory backend keeps them
+# for a shorter time since nothing it holds survives a restart anyway
+DEFAULT_SESSION_TTL = 7 * 24 * 60 * 60
+MEMORY_SESSION_TTL = 24 * 60 * 60
+
+# Per-session caps on the decoded messages kept in memory; older turns are loaded on demand
+MAX_RESIDENT_MESSAGES = 40
+MAX_RESIDENT_BYTES = 256 * 1024
+
+# Encoded payloads at least this long are zlib-compressed
+COMPRESS_MIN_BYTES = 256
+
+# Seconds between idle-eviction sweeps (run opportunistically on checkout)
+EVICTION_INTERVAL = 60
+
+# Seconds between purges of expired stored sessions (also run on checkout)
+PURGE_INTERVAL = 10 * 60
+
+_PLAIN = b'\x00'
+_COMPRESSED = b'\x01'
+
+
+# Function to encode a JSON-serializable value as compact bytes, compressing larger payloads
+def encode_value(value):
+    data = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    if len(data) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return _COMPRESSED + compressed
+    return _PLAIN + data
+
+
+def decode_value(blob):
+    blob = bytes(blob)
+    data = zlib.decompress(blob[1:]) if blob[:1] == _COMPRESSED else blob[1:]
+    return json.loads(data)
+
+
+# Messages are stored as [role, content] pairs
+def encode_message(message):
+    return encode_value([message["role"], message["content"]])
+
+
+def decode_message(blob):
+    role, content = decode_value(blob)
+    return {"role": role, "content": content}
+
+
+def encode_schedule(schedule):
+    return encode_value(schedule.to_dict()) if schedule is not None else None
+
+
+def decode_schedule(blob):
+    return ScheduleView.from_dict(decode_value(blob)) if blob is not None else None
+
+
+# Rough memory held by one decoded message
+def _message_bytes(message):
+    return len(message["content"] or "") + 100
+
+
+# A session handed out by the store, with the log version it was loaded at
+class _LiveSession:
+    __slots__ = ('session', 'version', 'last_access', 'saved_schedule')
+
+    def __init__(self, session, version, last_access, saved_schedule):
+        self.session = session
+        self.version = version
+        self.last_access = last_access
+        self.saved_schedule = saved_schedule
+
+
+# Pluggable session store. Each session is an append-only log of encoded messages plus a little
+# state (greeted flag, latest schedule search). Only the most recent messages are decoded into the
+# ChatSession; session.offset is the log position of messages[1], so older turns can be loaded
+# with load_messages(). Backends implement the _read_state/_read_messages/_write/_delete hooks.
+class SessionStore:
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT, max_resident_messages=MAX_RESIDENT_MESSAGES,
+                 max_resident_bytes=MAX_RESIDENT_BYTES, session_ttl=DEFAULT_SESSION_TTL, clock=time.time):
+        self.idle_timeout = idle_timeout
+        self.session_ttl = session_ttl
+        self.max_resident_messages = max_resident_messages
+        self.max_resident_bytes = max_resident_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._live = {}
+        # Called with the id of every session dropped for idleness or deleted
+        self._end_listener = None
+        self._last_sweep = clock()
+        self._last_purge = clock()
+        self.loads = 0
+        self.evictions = 0
+        self.purged = 0
+
+    # Backend hooks
+    def _read_state(self, session_id):
+        # -> (greeted, schedule blob, message count) or None
+        raise NotImplementedError
+
+    def _read_messages(self, session_id, start, stop):
+        # -> encoded messages [start, stop) of the session's log
+        raise NotImplementedError
+
+    def _write(self, session_id, start, blobs, greeted, schedule_blob, schedule_changed, touched_at):
+        # Append blobs after the log's last message (at least position start), update the session's
+        # state and return the new message count
+        raise NotImplementedError
+
+    def _delete(self, session_id):
+        raise NotImplementedError
+
+    def _expired_sessions(self, cutoff):
+        # -> ids of sessions last touched before cutoff
+        raise NotImplementedError
+
+    # Function to get the session to serve a turn, reusing the live copy unless another process has
+    # added to its log since; a missing or unknown id starts a new session
+    def checkout(self, session_id=None):
+        now = self._clock()
+        if now - self._last_sweep >= EVICTION_INTERVAL:
+            self.evict_idle()
+        if now - self._last_purge >= PURGE_INTERVAL:
+            self._last_purge = now
+            try:
+                self.purge()
+            except Exception:
+                logger.exception("Purging expired sessions failed")
+        if session_id is None:
+            session = ChatSession()
+            with self._lock:
+                self._live[session.session_id] = _LiveSession(session, 0, now, None)
+            return session
+        state = self._read_state(session_id)
+        with self._lock:
+            live = self._live.get(session_id)
+            if live is not None and (state is None or live.version == state[2]):
+                live.last_access = now
+                return live.session
+        session = self._load(session_id, state) if state is not None else ChatSession(session_id)
+        with self._lock:
+            self._live[session.session_id] = _LiveSession(
+                session, session.persisted, now, session.schedule
+            )
+        return session
+
+    def _load(self, session_id, state):
+        greeted, schedule_blob, count = state
+        start = max(0, count - self.max_resident_messages)
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        messages += [decode_message(blob) for blob in self._read_messages(session_id, start, count)]
+        self.loads += 1
+        session = ChatSession(
+            session_id, messages, bool(greeted), decode_schedule(schedule_blob), offset=start, persisted=count
+        )
+        self._trim(session)
+        return session
+
+    # Function to append the session's new messages (and changed state) to the store
+    def save(self, session):
+        new_messages = session.messages[1 + session.persisted - session.offset:]
+        with self._lock:
+            live = self._live.get(session.session_id)
+            schedule_changed = live is None or live.saved_schedule is not session.schedule
+        count = self._write(
+            session.session_id, session.persisted, [encode_message(message) for message in new_messages],
+            session.greeted, encode_schedule(session.schedule) if schedule_changed else None,
+            schedule_changed, self._clock()
+        )
+        session.persisted += len(new_messages)
+        self._trim(session)
+        # If another process appended in the meantime, the next checkout reloads the merged log
+        version = session.persisted if count == session.persisted else None
+        with self._lock:
+            self._live[session.session_id] = _LiveSession(session, version, self._clock(), session.schedule)
+
+    # Function to drop the oldest decoded messages once the session exceeds its memory caps
+    def _trim(self, session):
+        resident = sum(_message_bytes(message) for message in session.messages[1:])
+        drop = 0
+        while len(session.messages) - 1 - drop > self.max_resident_messages or (
+            resident > self.max_resident_bytes and len(session.messages) - 1 - drop > 1
+        ):
+            resident -= _message_bytes(session.messages[1 + drop])
+            drop += 1
+        # Never drop messages that have not been saved yet
+        drop = min(drop, session.persisted - session.offset)
+        if drop > 0:
+            del session.messages[1:1 + drop]
+            session.offset += drop
+
+    # Function to read older turns of a session (log positions [start, stop)) without keeping them
+    def load_messages(self, session_id, start=0, stop=None):
+        if stop is None:
+            state = self._read_state(session_id)
+            stop = state[2] if state is not None else 0
+        return [decode_message(blob) for blob in self._read_messages(session_id, start, stop)]
+
+    # Function to drop live sessions idle for longer than idle_timeout; returns how many were dropped
+    def evict_idle(self):
+        now = self._clock()
+        with self._lock:
+            self._last_sweep = now
+            idle = [
+                session_id for session_id, live in self._live.items()
+                if now - live.last_access >= self.idle_timeout
+            ]
+            for session_id in idle:
+                del self._live[session_id]
+            self.evictions += len(idle)
+        for session_id in idle:
+            self._session_ended(session_id)
+        return len(idle)
+
+    # Function to delete stored sessions untouched for max_age (default session_ttl) seconds
+    def purge(self, max_age=None):
+        expired = self._expired_sessions(self._clock() - (self.session_ttl if max_age is None else max_age))
+        for session_id in expired:
+            self.delete(session_id)
+        with self._lock:
+            self._last_purge = self._clock()
+            self.purged += len(expired)
+        return len(expired)
+
+    # Function to tell whether a session is live in this process or has been saved
+    def exists(self, session_id):
+        with self._lock:
+            if session_id in self._live:
+                return True
+        return self._read_state(session_id) is not None
+
+    def delete(self, session_id):
+        with self._lock:
+            self._live.pop(session_id, None)
+        self._delete(session_id)
+        self._session_ended(session_id)
+
+    # Function to have a callback told when a session ends (e.g. to stop following its flights)
+    def set_end_listener(self, listener):
+        self._end_listener = listener
+
+    def _session_ended(self, session_id):
+        if self._end_listener is None:
+            return
+        try:
+            self._end_listener(session_id)
+        except Exception:
+            logger.exception("Session end listener failed")
+
+    def stats(self):
+        with self._lock:
+            live = list(self._live.values())
+        return {
+            "live_sessions": len(live),
+            "resident_messages": sum(len(entry.session.messages) - 1 for entry in live),
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "purged": self.purged,
+        }
+
+
+class _StoredSession:
+    __slots__ = ('greeted', 'schedule', 'messages', 'touched_at')
+
+    def __init__(self):
+        self.greeted = False
+        self.schedule = None
+        self.messages = []
+        self.touched_at = 0.0
+
+
+# Single-process backend keeping every session's encoded log in memory
+class MemorySessionStore(SessionStore):
+    def __init__(self, **options):
+        options.setdefault('session_ttl', MEMORY_SESSION_TTL)
+        super().__init__(**options)
+        self._sessions = {}
+        self._data_lock = threading.Lock()
+
+    def _read_state(self, session_id):
+        with self._data_lock:
+            stored = self._sessions.get(session_id)
+            if stored is None:
+                return None
+            return stored.greeted, stored.schedule, len(stored.messages)
+
+    def _read_messages(self, session_id, start, stop):
+        with self._data_lock:
+            stored = self._sessions.get(session_id)
+            return list(stored.messages[start:stop]) if stored is not None else []
+
+    def _write(self, session_id, start, blobs, greeted, schedule_blob, schedule_changed, touched_at):
+        with self._data_lock:
+            stored = self._sessions.get(session_id)
+            if stored is None:
+                stored = self._sessions[session_id] = _StoredSession()
+            stored.messages.extend(blobs)
+            stored.greeted = greeted
+            if schedule_changed:
+                stored.schedule = schedule_blob
+            stored.touched_at = touched_at
+            return len(stored.messages)
+
+    def _delete(self, session_id):
+        with self._data_lock:
+            self._sessions.pop(session_id, None)
+
+    def _expired_sessions(self, cutoff):
+        with self._data_lock:
+            return [session_id for session_id, stored in self._sessions.items() if stored.touched_at < cutoff]
+
+
+# SQLite backend: an append-only messages table plus one state row per session. WAL mode lets
+# several worker processes on the same host read and append to the same conversations.
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, path, **options):
+        super().__init__(**options)
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                greeted INTEGER NOT NULL DEFAULT 0,
+                schedule BLOB,
+                message_count INTEGER NOT NULL DEFAULT 0,
+                touched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                payload BLOB NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS sessions_touched_at ON sessions (touched_at);
+        """)
+
+    # One connection per thread
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit mode; writes take the database lock up front in _transaction()
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    # Write transaction holding the lock from its first read, so concurrent appends never collide
+    @contextlib.contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def _read_state(self, session_id):
+        return self._connection().execute(
+            "SELECT greeted, schedule, message_count FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+
+    def _read_messages(self, session_id, start, stop):
+        rows = self._connection().execute(
+            "SELECT payload FROM messages WHERE session_id = ? AND seq >= ? AND seq < ? ORDER BY seq",
+            (session_id, start, stop)
+        )
+        return [row[0] for row in rows]
+
+    def _write(self, session_id, start, blobs, greeted, schedule_blob, schedule_changed, touched_at):
+        with self._transaction() as connection:
+            # Another process may have appended since this session was loaded; its turns stay in
+            # the log and ours follow them
+            row = connection.execute(
+                "SELECT message_count FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            start = max(start, row[0] if row else 0)
+            connection.executemany(
+                "INSERT INTO messages (session_id, seq, payload) VALUES (?, ?, ?)",
+                [(session_id, start + index, blob) for index, blob in enumerate(blobs)]
+            )
+            connection.execute(
+                "INSERT INTO sessions (session_id, greeted, schedule, message_count, touched_at) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (session_id) DO UPDATE SET "
+                "greeted = excluded.greeted, message_count = excluded.message_count, "
+                "touched_at = excluded.touched_at"
+                + (", schedule = excluded.schedule" if schedule_changed else ""),
+                (session_id, int(greeted), schedule_blob, start + len(blobs), touched_at)
+            )
+        return start + len(blobs)
+
+    def _delete(self, session_id):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def _expired_sessions(self, cutoff):
+        rows = self._connection().execute("SELECT session_id FROM sessions WHERE touched_at < ?", (cutoff,))
+        return [row[0] for row in rows]
+
+
+# Function to build the store named by SESSION_STORE ("memory" or "sqlite") from a mapping of settings
+def create_session_store(mapping):
+    options = {
+        'idle_timeout': float(mapping.get("SESSION_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT)),
+        'max_resident_messages': int(mapping.get("SESSION_MAX_RESIDENT_MESSAGES", MAX_RESIDENT_MESSAGES)),
+        'max_resident_bytes': int(mapping.get("SESSION_MAX_RESIDENT_BYTES", MAX_RESIDENT_BYTES)),
+    }
+    if mapping.get("SESSION_TTL"):
+        options['session_ttl'] = float(mapping["SESSION_TTL"])
+    backend = mapping.get("SESSION_STORE", "memory").lower()
+    if backend == "sqlite":
+        path = mapping.get("SESSION_DB_PATH", "sessions.db")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return SQLiteSessionStore(path, **options)
+    if backend != "memory":
+        logger.warning("Unknown SESSION_STORE %r, keeping sessions in memory", backend)
+    return MemorySessionStore(**options)
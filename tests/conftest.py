@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+
+# The app modules live at the repository root, next to the benchmarks package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_servers import StubConfig, start_stubs, stop_stubs  # noqa: E402
+from cache import TTLCache  # noqa: E402
+from engine import ChatEngine, EngineConfig  # noqa: E402
+from upstream import UpstreamClient  # noqa: E402
+
+
+# Local AviationStack, OpenWeather and OpenAI stand-ins answering without added latency; the OpenAI
+# stub answers requests that offer tools with tool calls
+@pytest.fixture
+def stubs():
+    running = start_stubs({
+        'aviationstack': StubConfig(latency=0.0, jitter=0.0),
+        'openweather': StubConfig(latency=0.0, jitter=0.0),
+        'openai': StubConfig(latency=0.0, jitter=0.0, tool_calls=True),
+    }, schedule_size=5)
+    yield running
+    stop_stubs(running)
+
+
+# Function to build a ChatEngine talking to the stubs, with its own cache
+def make_engine(stubs, **options):
+    upstream = UpstreamClient(base_urls={name: stubs[name].base_url for name in ('aviationstack', 'openweather')})
+    config = EngineConfig(
+        openai_api_key='stub', aviationstack_api_key='stub', openweather_api_key='stub',
+        openai_base_url=stubs['openai'].base_url, **{'track_flights': False, **options}
+    )
+    return ChatEngine(config, upstream=upstream, cache=TTLCache())
+
+
+@pytest.fixture
+def engine(stubs):
+    return make_engine(stubs)
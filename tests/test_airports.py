@@ -0,0 +1,34 @@
+from airports import edit_distance, get_airport_index, normalize_name
+from intents import extract_cities, resolve_place
+
+
+def test_edit_distance_counts_transpositions_and_gives_up_past_the_limit():
+    assert edit_distance('york', 'yrok', 1) == 1
+    assert edit_distance('chicago', 'chicgo', 2) == 1
+    assert edit_distance('denver', 'boston', 2) == 3
+    assert normalize_name('São Paulo!') == 'sao paulo'
+
+
+def test_codes_cities_aliases_and_typos_resolve_to_the_primary_airport():
+    index = get_airport_index()
+    assert index.resolve('jfk').iata == 'JFK'
+    assert index.resolve('KLAX').iata == 'LAX'
+    assert index.resolve('San Francisco').iata == 'SFO'
+    assert index.resolve('san fran').iata == 'SFO'
+    assert index.resolve('Chicgo').iata == 'ORD'
+    assert index.resolve('   ') is None
+    assert index.resolve('Narnia') is None
+
+
+def test_multi_word_typos_must_match_word_by_word():
+    index = get_airport_index()
+    assert index.fuzzy_name('san fransisco') == 'san francisco'
+    assert index.fuzzy_name('san juann') != 'san francisco'
+    assert index.fuzzy_name('new yrok') == 'new york'
+
+
+def test_places_after_prefixes_accept_lower_case_codes_but_not_name_starts():
+    assert resolve_place('lax tomorrow') == 'LAX'
+    assert resolve_place('san fran on march 5') == 'SFO'
+    assert extract_cities("flights from jfk to san fran") == ('JFK', 'SFO')
+    assert extract_cities("flights from new yrok to los angeles") == ('JFK', 'LAX')
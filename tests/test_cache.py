@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cache import TTLCache, make_key
+
+
+def test_concurrent_misses_share_one_load():
+    cache = TTLCache()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        return {'status': 'active'}
+
+    key = make_key('flight_status', flight_iata='aa100')
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(cache.get_or_load, key, loader) for _ in range(8)]
+        # Wait until every follower has joined the leader's in-flight call
+        while cache.stats()['coalesced'] < 7:
+            threading.Event().wait(0.01)
+        release.set()
+        results = [future.result(5) for future in futures]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert cache.get(key) == {'status': 'active'}
+    assert cache.stats()['coalesced'] == 7
+
+
+def test_load_errors_reach_every_waiter_and_are_not_cached():
+    cache = TTLCache()
+    release = threading.Event()
+    calls = []
+
+    def loader():
+        calls.append(1)
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(cache.get_or_load, 'key', loader) for _ in range(4)]
+        while cache.stats()['coalesced'] < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result(5)
+
+    assert len(calls) == 1
+    assert 'key' not in cache
+    assert cache.get_or_load('key', lambda: 'recovered') == 'recovered'
+
+
+def test_should_cache_keeps_failed_results_out():
+    cache = TTLCache()
+    assert cache.get_or_load('key', lambda: (503, None), should_cache=lambda result: result[0] == 200) == (503, None)
+    assert 'key' not in cache
+    assert cache.get_or_load('key', lambda: (200, {}), should_cache=lambda result: result[0] == 200) == (200, {})
+    assert 'key' in cache
+
+
+def test_expired_entries_stay_available_as_stale():
+    now = [0.0]
+    cache = TTLCache(default_ttl=10, stale_ttl=60, clock=lambda: now[0])
+    cache.set('key', 'value')
+    now[0] = 20
+    assert cache.get('key') is None
+    assert cache.get_stale('key') == 'value'
+    now[0] = 80
+    assert cache.get_stale('key') is None
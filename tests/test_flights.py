@@ -0,0 +1,39 @@
+import io
+import json
+
+import flights
+from benchmarks.bench_schedules import synthetic_payload
+from flights import ScheduleView, parse_schedule, select_records
+
+
+def test_streamed_and_plain_parses_agree(monkeypatch):
+    payload = synthetic_payload(50)
+    streamed = parse_schedule(io.BytesIO(payload))
+    monkeypatch.setattr(flights, 'ijson', None)
+    plain = parse_schedule(io.BytesIO(payload))
+    assert len(streamed.records) == 50
+    assert [record.to_dict() for record in streamed.records] == [record.to_dict() for record in plain.records]
+
+
+def test_error_payloads_report_their_message(monkeypatch):
+    payload = json.dumps({'error': {'code': 'invalid_access_key', 'message': 'Invalid access key'}}).encode('utf-8')
+    assert parse_schedule(io.BytesIO(payload)).error == 'Invalid access key'
+    monkeypatch.setattr(flights, 'ijson', None)
+    assert parse_schedule(io.BytesIO(payload)).error == 'Invalid access key'
+    assert parse_schedule(io.BytesIO(b'{"data": []}')).error is None
+
+
+def test_schedule_pages_are_sorted_filtered_and_serializable():
+    records = parse_schedule(io.BytesIO(synthetic_payload(25))).records
+    view = ScheduleView('JFK', 'LAX', '2025-03-05', records)
+    assert view.page_count(page_size=10) == 3
+
+    by_departure = select_records(records, 'departure')
+    assert [record.departure_scheduled for record in by_departure] == sorted(
+        record.departure_scheduled for record in records
+    )
+    landed = select_records(records, status='landed')
+    assert landed and all(record.status == 'landed' for record in landed)
+
+    restored = ScheduleView.from_dict(json.loads(json.dumps(view.to_dict())))
+    assert restored.render(page=2, page_size=10) == view.render(page=2, page_size=10)
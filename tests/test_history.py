@@ -0,0 +1,64 @@
+from history import (
+    MAX_OLD_MESSAGE_CHARS, compact_history, compact_message, count_messages_tokens, summarize_tool_output,
+)
+
+SYSTEM = {"role": "system", "content": "You are an airline assistant."}
+FLIGHT_STATUS = (
+    "**Flight Status for AA100:**\n"
+    "- **Airline:** American Airlines\n"
+    "- **Status:** active\n"
+    "- **Departure Airport:** John F Kennedy International (JFK)\n"
+    "- **Arrival Airport:** Los Angeles International (LAX)\n"
+    "- **Departure Gate:** B22\n"
+)
+
+
+def conversation(turns):
+    messages = [SYSTEM]
+    for index in range(turns):
+        messages.append({"role": "user", "content": f"question {index} " + "about my trip " * 20})
+        messages.append({"role": "assistant", "content": f"answer {index} " + "with some details " * 20})
+    return messages
+
+
+def test_tool_outputs_collapse_to_one_line():
+    assert summarize_tool_output(FLIGHT_STATUS) == (
+        "[Earlier flight status for AA100: active, John F Kennedy International (JFK) to Los Angeles International (LAX)]"
+    )
+    assert summarize_tool_output("Sure, happy to help!") is None
+    long_reply = {"role": "user", "content": "x" * (MAX_OLD_MESSAGE_CHARS * 2)}
+    assert len(compact_message(long_reply)["content"]) <= MAX_OLD_MESSAGE_CHARS + 2
+
+
+def test_short_conversations_are_sent_unchanged():
+    messages = conversation(2)
+    compacted, report = compact_history(messages, token_budget=10000)
+    assert compacted == messages
+    assert report["saved_tokens"] == 0 and report["dropped_messages"] == 0
+
+
+def test_long_conversations_fit_the_budget_keeping_the_latest_turns():
+    messages = conversation(30)
+    messages.insert(1, {"role": "assistant", "content": FLIGHT_STATUS})
+    compacted, report = compact_history(messages, token_budget=1000, recent_messages=4)
+
+    assert compacted[0] == SYSTEM
+    assert compacted[-4:] == messages[-4:]
+    assert count_messages_tokens(compacted) == report["compacted_tokens"] <= 1000
+    assert report["dropped_messages"] > 0
+    assert report["saved_tokens"] == report["original_tokens"] - report["compacted_tokens"]
+
+
+def test_the_latest_message_is_sent_even_over_budget():
+    messages = [SYSTEM, {"role": "user", "content": "word " * 2000}]
+    compacted, _ = compact_history(messages, token_budget=100)
+    assert compacted == messages
+
+
+def test_older_tool_outputs_are_summarized_even_within_budget():
+    messages = [SYSTEM, {"role": "user", "content": "status of AA100"}, {"role": "assistant", "content": FLIGHT_STATUS}]
+    messages += conversation(2)[1:]
+    compacted, report = compact_history(messages, token_budget=10000, recent_messages=4)
+    assert compacted[2]["content"].startswith("[Earlier flight status for AA100")
+    assert compacted[3:] == messages[3:]
+    assert report["summarized_messages"] == 1
@@ -0,0 +1,39 @@
+from benchmarks.bench_intents import legacy_route, load_corpus
+from intents import resolve_place, route
+
+
+def test_router_matches_the_original_keyword_chain_on_the_sample_queries():
+    for query in load_corpus():
+        assert route(query).intent == legacy_route(query), query
+
+
+def test_routes_extract_the_entities_of_their_intent():
+    routed = route("What is the status of flight UA 245?")
+    assert (routed.intent, routed.flight_number) == ('flight_status', 'UA245')
+
+    routed = route("Show me flights from New York to Los Angeles on March 5th 2025")
+    assert routed.intent == 'flight_schedules'
+    assert (routed.departure_city, routed.arrival_city, routed.date) == ('JFK', 'LAX', '2025-03-05')
+
+    routed = route("What's the weather like in Chicago?")
+    assert (routed.intent, routed.weather_location) == ('weather', 'chicago')
+
+    # A flight number takes precedence over the weather keyword, as in the original chain
+    assert route("weather delay for AA100?").intent == 'flight_status'
+    assert route("Can I bring a carry-on bag?").intent == 'baggage'
+    assert route("hello there").intent == 'chat'
+
+
+def test_topics_count_whole_keywords_only():
+    assert route("Has the gate for UA 200 changed? what is the status").topics == {'flight_status'}
+    assert route("Is AA100 delayed, and what is the weather in Denver?").topics == {'flight_status', 'weather'}
+    assert route("how many bags can I bring and what about refunds?").topics == {'baggage', 'cancellation'}
+    # Substring hits still score the intent for single-topic routing
+    routed = route("Has the gate for UA 200 changed?")
+    assert 'cancellation' in routed.scores and not routed.topics
+
+
+def test_empty_places_resolve_to_nothing():
+    for place in ("", "   ", "?!"):
+        assert resolve_place(place) is None, repr(place)
+    assert resolve_place("JFK") == 'JFK'
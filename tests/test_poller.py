@@ -0,0 +1,94 @@
+from engine import EngineConfig
+from poller import DEFAULT_SUBSCRIPTION_TTL, FlightStatusPoller
+from session_store import MemorySessionStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def record(status, gate='A1'):
+    return {'flight_status': status, 'departure': {'gate': gate}, 'arrival': {}}
+
+
+def make_poller(records, clock=None, **options):
+    fetched = []
+
+    def fetch_records(flights):
+        fetched.extend(flights)
+        return {flight: records[flight] for flight in flights}
+
+    return FlightStatusPoller(fetch_records, clock=clock or FakeClock(), **options), fetched
+
+
+def test_finished_flights_are_pushed_once_and_then_dropped():
+    records = {'AA100': record('active'), 'UA245': record('scheduled')}
+    poller, fetched = make_poller(records)
+    poller.subscribe('s1', 'AA100', records['AA100'])
+    poller.subscribe('s1', 'UA245', records['UA245'])
+
+    records['AA100'] = record('landed')
+    updates = poller.poll_once()
+    assert [update.flight_number for update in updates] == ['AA100']
+    assert [update.changes for update in poller.drain('s1')] == [{'status': ('active', 'landed')}]
+    assert poller.tracked_flights() == ['UA245']
+
+    fetched.clear()
+    poller.poll_once()
+    assert fetched == ['UA245']
+
+
+def test_flights_already_finished_are_not_tracked():
+    poller, fetched = make_poller({})
+    for status in ('landed', 'cancelled', 'diverted'):
+        poller.subscribe('s1', 'AA100', record(status))
+    assert poller.tracked_flights() == []
+    poller.poll_once()
+    assert fetched == []
+
+
+def test_subscriptions_expire_after_the_ttl():
+    clock = FakeClock()
+    records = {'AA100': record('active')}
+    poller, fetched = make_poller(records, clock=clock, subscription_ttl=600)
+    poller.subscribe('s1', 'AA100', records['AA100'])
+
+    clock.now += 599
+    poller.poll_once()
+    assert fetched == ['AA100']
+
+    clock.now += 2
+    poller.poll_once()
+    assert fetched == ['AA100']
+    assert poller.tracked_flights() == []
+
+
+def test_tracking_ttl_is_configurable_and_short_by_default():
+    assert DEFAULT_SUBSCRIPTION_TTL < 60 * 60
+    assert EngineConfig.from_mapping({}).subscription_ttl == DEFAULT_SUBSCRIPTION_TTL
+    assert EngineConfig.from_mapping({'FLIGHT_TRACKING_TTL': '300'}).subscription_ttl == 300
+
+
+def test_ending_a_session_stops_following_its_flights():
+    records = {'AA100': record('active'), 'UA245': record('active')}
+    poller, fetched = make_poller(records)
+    poller.subscribe('s1', 'AA100', records['AA100'])
+    poller.subscribe('s2', 'UA245', records['UA245'])
+
+    clock = FakeClock()
+    store = MemorySessionStore(idle_timeout=60, clock=clock)
+    store.set_end_listener(poller.unsubscribe)
+    store.checkout('s1')
+    store.checkout('s2')
+    store.delete('s2')
+    assert poller.tracked_flights() == ['AA100']
+
+    clock.now += 61
+    assert store.evict_idle() == 1
+    assert poller.tracked_flights() == []
+    poller.poll_once()
+    assert fetched == []
@@ -0,0 +1,138 @@
+import io
+import threading
+import time
+
+import pytest
+import requests
+
+from ratelimit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, QuotaLedger, RateLimiter, TokenBucket
+from upstream import CircuitBreaker, RateLimited, UpstreamClient, UpstreamUnavailable
+
+
+def make_client(stubs, limiter=None, **options):
+    options = {'max_retries': 2, 'backoff_base': 0.001, 'backoff_cap': 0.01, 'failure_threshold': 1,
+               'reset_timeout': 0.05, **options}
+    return UpstreamClient(base_urls={'aviationstack': stubs['aviationstack'].base_url}, limiter=limiter, **options)
+
+
+def make_limiter(rate=100.0, burst=100, monthly_quota=None, ledger=None):
+    limits = {'aviationstack': {'rate': rate, 'burst': burst, 'monthly_quota': monthly_quota}}
+    return RateLimiter(limits, ledger or QuotaLedger(quotas={'aviationstack': monthly_quota}))
+
+
+def test_bucket_refills_at_its_rate_up_to_the_burst():
+    now = [0.0]
+    bucket = TokenBucket(rate=2.0, burst=2, clock=lambda: now[0])
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.wait_time() == pytest.approx(0.5)
+    now[0] = 10.0
+    assert bucket.try_acquire() and bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_low_budget_lets_only_interactive_lookups_through():
+    limiter = make_limiter(monthly_quota=100)
+    limiter.ledger.record('aviationstack', 95)
+    assert limiter.acquire('aviationstack', PRIORITY_INTERACTIVE, timeout=0)
+    assert not limiter.acquire('aviationstack', PRIORITY_BACKGROUND, timeout=0)
+
+    limiter.ledger.record('aviationstack', 4)
+    assert not limiter.acquire('aviationstack', PRIORITY_INTERACTIVE, timeout=0)
+    assert limiter.stats()['aviationstack'] == {
+        'granted': 1, 'denied': 2, 'quota_used': 100, 'quota_remaining': 0,
+    }
+
+
+def test_ledger_file_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'quota_ledger.json')
+    first = QuotaLedger(path, quotas={'aviationstack': 1000})
+    second = QuotaLedger(path, quotas={'aviationstack': 1000})
+    first.record('aviationstack', 3)
+    first.flush()
+    second.record('aviationstack', 2)
+    second.flush()
+    assert second.used('aviationstack') == 5
+    assert QuotaLedger(path).used('aviationstack') == 5
+
+
+def test_waiting_calls_are_served_by_priority():
+    limiter = make_limiter(rate=5.0, burst=1)
+    assert limiter.acquire('aviationstack', timeout=0)
+    served = []
+
+    def wait_for_token(priority):
+        if limiter.acquire('aviationstack', priority, timeout=2):
+            served.append(priority)
+
+    background = threading.Thread(target=wait_for_token, args=(PRIORITY_BACKGROUND,))
+    background.start()
+    time.sleep(0.05)
+    interactive = threading.Thread(target=wait_for_token, args=(PRIORITY_INTERACTIVE,))
+    interactive.start()
+    background.join()
+    interactive.join()
+    # The background poll queued first, but the user's lookup takes the next token
+    assert served == [PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND]
+
+
+def test_probe_refused_by_the_limiter_is_released(stubs):
+    stub = stubs['aviationstack']
+    stub.config.error_rate = 1.0
+    limiter = make_limiter()
+    client = make_client(stubs, limiter=limiter, max_retries=0)
+    with pytest.raises(UpstreamUnavailable):
+        client.get('aviationstack', 'flights', {'flight_iata': 'AA100'})
+    time.sleep(0.06)
+    assert client.breakers['aviationstack'].state == CircuitBreaker.HALF_OPEN
+
+    # The half-open probe is refused by a throttled bucket before reaching the provider
+    limiter.penalize('aviationstack', 60)
+    with pytest.raises(RateLimited):
+        client.get('aviationstack', 'flights', {'flight_iata': 'AA100'}, priority=2)
+    assert stub.calls == 1
+
+    # Once tokens flow again the next call must be let through as the probe, not refused as "circuit open"
+    limiter.buckets['aviationstack']._paused_until = 0.0
+    stub.config.error_rate = 0.0
+    response = client.get('aviationstack', 'flights', {'flight_iata': 'AA100'})
+    assert response.status_code == 200
+    assert client.breakers['aviationstack'].state == CircuitBreaker.CLOSED
+
+
+def test_probe_failing_unexpectedly_is_released(stubs, monkeypatch):
+    client = make_client(stubs, max_retries=0)
+    breaker = client.breakers['aviationstack']
+    breaker.record_failure()
+    time.sleep(0.06)
+
+    def broken_get(*args, **kwargs):
+        raise ValueError("unexpected")
+
+    monkeypatch.setattr(client.session, 'get', broken_get)
+    with pytest.raises(ValueError):
+        client.get('aviationstack', 'flights')
+    monkeypatch.undo()
+
+    assert client.get('aviationstack', 'flights', {'flight_iata': 'AA100'}).status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_429_pauses_the_bucket_for_the_full_retry_after(stubs, monkeypatch):
+    limiter = make_limiter()
+    client = make_client(stubs, limiter=limiter, max_retries=0, backoff_cap=0.01)
+
+    def throttled_get(*args, **kwargs):
+        response = requests.Response()
+        response.status_code = 429
+        response.raw = io.BytesIO(b'')
+        response.headers['Retry-After'] = '120'
+        return response
+
+    monkeypatch.setattr(client.session, 'get', throttled_get)
+    with pytest.raises(UpstreamUnavailable) as error:
+        client.get('aviationstack', 'flights')
+    assert error.value.status_code == 429
+    # The retry sleep within the call is capped, but later callers wait out the whole Retry-After
+    assert limiter.buckets['aviationstack'].wait_time() > 100
+    assert not limiter.acquire('aviationstack', timeout=0)
@@ -0,0 +1,44 @@
+from engine import has_flight_context
+from semantic_cache import SemanticCache, is_self_contained
+
+
+def test_faq_questions_are_self_contained():
+    for question in ("can I bring a stroller", "how do I upgrade with miles", "What is the pet policy?",
+                     "Do you have wifi on long-haul flights?"):
+        assert is_self_contained(question), question
+
+
+def test_follow_ups_and_personal_questions_are_not_self_contained():
+    for question in ("yes", "tell me more", "what about that one?", "Can I bring my dog on the plane?", "refund?"):
+        assert not is_self_contained(question), question
+
+
+def test_only_user_flight_numbers_count_as_flight_context():
+    policy = [
+        {"role": "user", "content": "How much baggage can I bring?"},
+        {"role": "assistant", "content": "Checked bags may weigh up to 23 kg."},
+    ]
+    assert not has_flight_context(policy)
+    assert not has_flight_context([{"role": "user", "content": "is a bag up to 23 kg free?"}])
+    assert has_flight_context([{"role": "user", "content": "status of ua245"}])
+    assert has_flight_context([{"role": "user", "content": "Is flight UA 245 delayed?"}])
+
+
+def test_paraphrases_share_a_reply():
+    cache = SemanticCache()
+    cache.store("What is the pet policy?", "Pets travel in the cabin.")
+    assert cache.lookup("what is your pet policy") == "Pets travel in the cabin."
+    assert cache.lookup("How do I join the frequent flyer program?") is None
+
+
+def test_questions_differing_in_a_modifier_do_not_share_a_reply():
+    near_misses = [
+        ("Can unaccompanied minors fly domestic", "Can unaccompanied minors fly international"),
+        ("Is wifi free on long-haul flights?", "Is wifi free on short-haul flights?"),
+        ("Can I change a refundable ticket?", "Can I change a nonrefundable ticket?"),
+    ]
+    for cached, asked in near_misses:
+        cache = SemanticCache()
+        cache.store(cached, "cached reply")
+        assert cache.lookup(cached) == "cached reply"
+        assert cache.lookup(asked) is None, asked
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from session_store import MemorySessionStore
+
+
+@pytest.fixture
+def app_state(engine, monkeypatch):
+    store = MemorySessionStore()
+    monkeypatch.setattr(server, '_engine', engine)
+    monkeypatch.setattr(server, '_store', store)
+    return engine, store
+
+
+def test_engine_and_store_are_created_once_under_concurrent_first_use(monkeypatch):
+    monkeypatch.setattr(server, '_engine', None)
+    monkeypatch.setattr(server, '_store', None)
+    created = []
+
+    class SlowEngine:
+        def __init__(self, config):
+            created.append(self)
+            time.sleep(0.05)
+
+        def end_session(self, session_id):
+            pass
+
+    monkeypatch.setattr(server, 'ChatEngine', SlowEngine)
+    start = threading.Barrier(8, timeout=5)
+
+    def first_use():
+        start.wait()
+        return server.get_store(), server.get_engine()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: first_use(), range(8)))
+    assert len(created) == 1
+    assert len({id(store) for store, _ in results}) == 1
+    assert all(engine is created[0] for _, engine in results)
+
+
+def test_schedule_page_of_an_unknown_session_is_404_and_starts_nothing(app_state):
+    _, store = app_state
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.schedule_page('no-such-session'))
+    assert error.value.status_code == 404
+    assert store.stats()['live_sessions'] == 0
+    assert not store.exists('no-such-session')
+
+
+def test_schedule_page_of_a_session_without_a_search_is_404(app_state):
+    _, store = app_state
+    reply = asyncio.run(server.chat(server.ChatRequest(session_id='s1', message='What is the baggage policy?')))
+    assert reply['session_id'] == 's1'
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.schedule_page('s1'))
+    assert error.value.detail == "No schedule search in this session"
@@ -0,0 +1,70 @@
+from session_store import MemorySessionStore, SQLiteSessionStore, decode_value, encode_value
+
+
+def contents(session):
+    return [message["content"] for message in session.messages[1:]]
+
+
+def test_encoded_values_round_trip():
+    small = {'greeting': 'hi'}
+    large = {'text': 'flight status ' * 100}
+    assert decode_value(encode_value(small)) == small
+    assert decode_value(encode_value(large)) == large
+    assert len(encode_value(large)) < len(str(large))
+
+
+def test_sqlite_stores_merge_concurrent_turns(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    first, second = SQLiteSessionStore(path), SQLiteSessionStore(path)
+
+    session = first.checkout()
+    session.add_message("user", "status of AA100")
+    session.add_message("assistant", "AA100 is on time")
+    first.save(session)
+
+    # A second worker picks the conversation up and adds a turn
+    other = second.checkout(session.session_id)
+    assert contents(other) == ["status of AA100", "AA100 is on time"]
+    other.add_message("user", "and UA200?")
+    other.add_message("assistant", "UA200 is delayed")
+    second.save(other)
+
+    # The first worker still holds its older copy and appends after the other worker's turn
+    session.add_message("user", "thanks")
+    first.save(session)
+
+    expected = ["status of AA100", "AA100 is on time", "and UA200?", "UA200 is delayed", "thanks"]
+    assert [message["content"] for message in first.load_messages(session.session_id)] == expected
+    assert contents(first.checkout(session.session_id)) == expected
+    assert contents(second.checkout(session.session_id)) == expected
+
+
+def test_sqlite_keeps_only_recent_messages_resident(tmp_path):
+    path = str(tmp_path / 'sessions.db')
+    store = SQLiteSessionStore(path, max_resident_messages=4)
+    session = store.checkout()
+    for index in range(10):
+        session.add_message("user", f"question {index}")
+    store.save(session)
+
+    reloaded = SQLiteSessionStore(path, max_resident_messages=4).checkout(session.session_id)
+    assert contents(reloaded) == [f"question {index}" for index in range(6, 10)]
+    assert reloaded.offset == 6
+    assert len(store.load_messages(session.session_id)) == 10
+
+
+def test_memory_store_purges_untouched_sessions_on_checkout():
+    now = [0.0]
+    store = MemorySessionStore(session_ttl=100, clock=lambda: now[0])
+    session = store.checkout()
+    session.add_message("user", "hello")
+    store.save(session)
+
+    now[0] = 50
+    store.checkout()
+    assert store.load_messages(session.session_id) == [{"role": "user", "content": "hello"}]
+
+    now[0] = 1000
+    store.checkout()
+    assert store.load_messages(session.session_id) == []
+    assert store.stats()["purged"] == 1
@@ -0,0 +1,31 @@
+from benchmarks.stub_servers import LLM_REPLY
+from engine import ChatSession, SYSTEM_PROMPT
+from history import count_messages_tokens, count_text_tokens
+
+QUESTION = "Do you serve vegetarian meals on board?"
+
+
+def test_streamed_chunks_arrive_in_order_with_estimated_usage(engine):
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, {"role": "user", "content": QUESTION}]
+    span = engine.tracer.start_span('llm.stream')
+    timings = {}
+    chunks = list(engine.stream_chatbot_response(messages, timings, span))
+
+    words = LLM_REPLY.split(' ')
+    assert chunks == [words[0]] + [f" {word}" for word in words[1:]]
+    # The stub's stream carries no usage, so the span holds the local estimates
+    assert span.duration is not None
+    assert span.attributes['prompt_tokens'] == count_messages_tokens(messages)
+    assert span.attributes['completion_tokens'] == count_text_tokens(LLM_REPLY)
+    assert 0 < timings['time_to_first_token'] <= timings['total_time']
+
+
+def test_streamed_turns_record_the_whole_reply(stubs, engine):
+    session = ChatSession()
+    response = engine.respond(session, QUESTION, stream=True)
+    assert response.intent == 'chat'
+    assert "".join(response.stream) == LLM_REPLY
+    assert session.messages[-2:] == [
+        {"role": "user", "content": QUESTION}, {"role": "assistant", "content": LLM_REPLY},
+    ]
+    assert stubs['openai'].calls == 1
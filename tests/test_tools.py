@@ -0,0 +1,50 @@
+import threading
+
+from benchmarks.stub_servers import LLM_REPLY, TOOL_PREAMBLE, TOOL_REPLY
+from engine import ChatSession
+
+MULTI_TOPIC = "Is AA100 delayed, and what is the weather in Denver?"
+
+
+def test_multi_topic_questions_run_their_tool_calls_in_parallel(stubs, engine):
+    dispatcher = engine.dispatcher
+    run_tool = dispatcher.run_tool
+    # Both calls of the step have to be running at the same time to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    names = []
+
+    def run_tool_together(session, call, parent):
+        names.append(call.name)
+        barrier.wait()
+        return run_tool(session, call, parent)
+
+    dispatcher.run_tool = run_tool_together
+    response = engine.respond(ChatSession(), MULTI_TOPIC, stream=False)
+
+    assert response.intent == 'tools'
+    assert sorted(names) == ['get_flight_status', 'get_weather_info']
+    assert response.replies == [TOOL_REPLY.format(count=2)]
+    assert stubs['aviationstack'].calls >= 1 and stubs['openweather'].calls >= 1
+    # Replies built from live data never enter the shared response cache
+    assert len(engine.response_cache) == 0
+
+
+def test_streamed_tool_replies_keep_text_before_the_tool_calls_apart(engine):
+    session = ChatSession()
+    response = engine.respond(session, MULTI_TOPIC, stream=True)
+    text = "".join(response.stream)
+    assert text == f"{TOOL_PREAMBLE}\n\n{TOOL_REPLY.format(count=2)}"
+    assert session.messages[-1] == {"role": "assistant", "content": text}
+
+
+def test_single_topic_questions_skip_the_model(stubs, engine):
+    response = engine.respond(ChatSession(), "What is the status of AA100?", stream=False)
+    assert response.intent == 'flight_status'
+    assert "AA100" in response.replies[0]
+    assert stubs['openai'].calls == 0
+
+
+def test_questions_without_tools_to_call_get_a_plain_reply(stubs, engine):
+    response = engine.respond(ChatSession(), "Do you serve vegetarian meals on board?", stream=False)
+    assert response.replies == [LLM_REPLY]
+    assert stubs['openai'].tool_requests == 0
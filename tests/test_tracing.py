@@ -0,0 +1,59 @@
+import json
+import time
+
+import pytest
+
+from engine import ChatEngine, ChatSession
+from tracing import TURN_SPAN, Tracer
+
+
+def test_spans_nest_and_feed_the_metrics():
+    tracer = Tracer()
+    with tracer.span(TURN_SPAN, intent='weather') as turn:
+        with tracer.span('upstream.openweather') as call:
+            call.set('bytes', 512)
+            call.set('cache', 'miss')
+        with pytest.raises(ValueError):
+            with tracer.span('llm.completion', prompt_tokens=30, completion_tokens=12):
+                raise ValueError("boom")
+    assert call.parent_id == turn.span_id and call.trace_id == turn.trace_id
+    assert tracer.current_span() is None
+
+    snapshot = tracer.snapshot()
+    assert snapshot['upstream.openweather']['bytes'] == 512
+    assert snapshot['upstream.openweather']['cache'] == {'miss': 1}
+    assert snapshot['llm.completion']['errors'] == 1
+
+    text = tracer.render_prometheus()
+    assert 'aerochat_span_duration_seconds_count{span="turn"} 1' in text
+    assert 'aerochat_span_errors_total{span="llm.completion"} 1' in text
+    assert 'aerochat_llm_tokens_total{type="prompt"} 30' in text
+    assert 'aerochat_turns_total{intent="weather"} 1' in text
+
+
+def test_each_turn_records_its_spans_and_intent(stubs, engine):
+    tracer = Tracer()
+    engine = ChatEngine(engine.config, upstream=engine.upstream, cache=engine.cache, tracer=tracer)
+    engine.respond(ChatSession(), "What is the status of AA100?", stream=False)
+    snapshot = tracer.snapshot()
+    assert snapshot[TURN_SPAN]['count'] == 1
+    assert 'route' in snapshot
+    assert 'aerochat_turns_total{intent="flight_status"} 1' in engine.metrics_text()
+
+
+def test_sampled_turns_are_written_to_the_trace_file(tmp_path):
+    path = tmp_path / 'trace.jsonl'
+    tracer = Tracer(str(path), sample_rate=1.0)
+    with tracer.span(TURN_SPAN, intent='chat'):
+        with tracer.span('route'):
+            pass
+    # The writer thread flushes the file about once a second
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline and (not path.exists() or path.read_text().count("\n") < 2):
+        time.sleep(0.05)
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [span['name'] for span in spans] == ['route', TURN_SPAN]
+    assert spans[0]['parent_id'] == spans[1]['span_id']
+
+    unsampled = Tracer(sample_rate=0.0)
+    assert not unsampled._sampled('ffffffff00000000')
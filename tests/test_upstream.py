@@ -0,0 +1,43 @@
+import time
+
+import pytest
+
+from upstream import CircuitBreaker, UpstreamClient, UpstreamUnavailable
+
+
+def make_client(stubs, limiter=None, **options):
+    options = {'max_retries': 2, 'backoff_base': 0.001, 'backoff_cap': 0.01, 'failure_threshold': 1,
+               'reset_timeout': 0.05, **options}
+    return UpstreamClient(base_urls={'aviationstack': stubs['aviationstack'].base_url}, limiter=limiter, **options)
+
+
+def test_retries_then_opens_the_breaker(stubs):
+    stub = stubs['aviationstack']
+    stub.config.error_rate = 1.0
+    client = make_client(stubs)
+
+    with pytest.raises(UpstreamUnavailable) as error:
+        client.get('aviationstack', 'flights', {'flight_iata': 'AA100'})
+    assert error.value.status_code == 503
+    assert stub.calls == 3
+    assert client.breakers['aviationstack'].state == CircuitBreaker.OPEN
+
+    # While open, calls fail fast without reaching the provider
+    with pytest.raises(UpstreamUnavailable, match='circuit open'):
+        client.get('aviationstack', 'flights', {'flight_iata': 'AA100'})
+    assert stub.calls == 3
+
+
+def test_successful_probe_closes_the_breaker(stubs):
+    stub = stubs['aviationstack']
+    stub.config.error_rate = 1.0
+    client = make_client(stubs, max_retries=0)
+    with pytest.raises(UpstreamUnavailable):
+        client.get('aviationstack', 'flights', {'flight_iata': 'AA100'})
+
+    stub.config.error_rate = 0.0
+    time.sleep(0.06)
+    response = client.get('aviationstack', 'flights', {'flight_iata': 'AA100'})
+    assert response.status_code == 200
+    assert response.json()['data'][0]['flight']['iata'] == 'AA100'
+    assert client.breakers['aviationstack'].state == CircuitBreaker.CLOSED
@@ -0,0 +1,43 @@
+import time
+
+from weather import FORECAST_SLACK, ForecastPoint, WeatherReport, grid_cell
+
+
+def wait_for_prefetches(service):
+    deadline = time.monotonic() + 5
+    while service._prefetching and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_nearby_points_share_a_grid_cell():
+    assert grid_cell(40.6413, -73.7781) == grid_cell(40.6398, -73.7789) == (40.6, -73.8)
+    assert grid_cell(40.6413, -73.7781) != grid_cell(40.7769, -73.8740)
+
+
+def test_forecast_is_used_only_near_its_periods():
+    report = WeatherReport('Clear sky', 20, 40, (ForecastPoint(1000, 'Light rain', 15),))
+    assert report.brief(1000 + FORECAST_SLACK) == "Light rain, 15°C (forecast)"
+    assert report.brief(1000 + FORECAST_SLACK + 1) == "Clear sky, 20°C"
+    assert report.brief() == "Clear sky, 20°C"
+
+
+def test_locations_in_one_cell_share_one_batch_of_calls(stubs, engine):
+    reports = engine.weather.lookup_many(['JFK', 'jfk', 'New York', 'LAX'])
+    # One current-conditions and one forecast call per distinct cell
+    assert stubs['openweather'].calls == 4
+    assert reports['JFK'] is reports['jfk'] is reports['New York']
+    assert reports['LAX'] is not None and reports['LAX'].forecast
+
+    engine.weather.lookup_many(['JFK', 'LAX'])
+    assert stubs['openweather'].calls == 4
+
+
+def test_prefetched_cells_are_answered_from_the_cache(stubs, engine):
+    assert engine.weather.prefetch(['DEN', 'Denver']) == 2
+    wait_for_prefetches(engine.weather)
+    assert stubs['openweather'].calls == 2
+    assert engine.weather.prefetch(['DEN']) == 0
+
+    assert engine.weather.lookup('Denver') is not None
+    assert stubs['openweather'].calls == 2
+    assert engine.weather.stats() == {'lookups': 2, 'prefetches': 2}
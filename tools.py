@@ -0,0 +1,360 @@
+import contextvars
+import json
+import logging
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from flights import DEFAULT_PAGE_SIZE, SORT_KEYS, select_records
+from history import count_messages_tokens, count_text_tokens
+from intents import resolve_place
+from policies import get_baggage_policy, get_cancellation_policy, get_frequent_flyer_info
+from ratelimit import PRIORITY_INTERACTIVE
+from weather import parse_timestamp
+
+logger = logging.getLogger("aerochat")
+
+# Model round trips per turn; the last one is made without tools so the model has to answer
+MAX_TOOL_ROUNDS = 3
+
+# Tool calls run from a single model step (extra calls get an error result)
+MAX_TOOL_CALLS_PER_STEP = 8
+
+# Seconds a step waits for its tool calls before answering the slow ones with an error
+TOOL_TIMEOUT = 15
+
+# Flights from a schedule search included in a tool result; the rest stay in the session's pager
+MAX_TOOL_FLIGHTS = DEFAULT_PAGE_SIZE
+
+# Reply used when the model answers with neither text nor tool calls
+EMPTY_REPLY = "Error: the model returned an empty reply"
+
+# Tools offered to the model (OpenAI function-calling schemas)
+TOOL_SCHEMAS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_flight_status",
+            "description": "Live status of one flight: airline, status, terminals, gates, scheduled times and the current weather at both airports.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "flight_number": {"type": "string", "description": "IATA flight number, e.g. AA100"},
+                },
+                "required": ["flight_number"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_flight_schedules",
+            "description": "Flights between two airports on a date, with the expected weather at departure and arrival.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "departure": {"type": "string", "description": "Departure airport IATA code or city name"},
+                    "arrival": {"type": "string", "description": "Arrival airport IATA code or city name"},
+                    "date": {"type": "string", "description": "Travel date as YYYY-MM-DD"},
+                    "sort_by": {"type": "string", "enum": list(SORT_KEYS)},
+                    "airline": {"type": "string", "description": "Only flights of this airline (full name)"},
+                },
+                "required": ["departure", "arrival", "date"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_weather_info",
+            "description": "Current weather and the forecast for the next 24 hours at an airport or city.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "location": {"type": "string", "description": "Airport IATA code or city name"},
+                },
+                "required": ["location"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_baggage_policy",
+            "description": "The airline's carry-on, checked baggage and excess baggage policy.",
+            "parameters": {"type": "object", "properties": {}, "additionalProperties": False},
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_cancellation_policy",
+            "description": "The airline's cancellation, change and refund policy.",
+            "parameters": {"type": "object", "properties": {}, "additionalProperties": False},
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_frequent_flyer_info",
+            "description": "How the frequent flyer program works: enrollment, earning and redeeming miles, tier benefits.",
+            "parameters": {"type": "object", "properties": {}, "additionalProperties": False},
+        },
+    },
+]
+
+
+# Function to describe one end of an AviationStack flight record
+def _flight_end(end):
+    end = end or {}
+    return {
+        'airport': end.get('airport'), 'iata': end.get('iata'), 'terminal': end.get('terminal'),
+        'gate': end.get('gate'), 'scheduled': end.get('scheduled'), 'estimated': end.get('estimated'),
+        'delay_minutes': end.get('delay'),
+    }
+
+
+# A tool call as returned by the API, or assembled from streamed deltas
+class ToolCall:
+    __slots__ = ('id', 'name', 'arguments')
+
+    def __init__(self, id, name, arguments):
+        self.id = id
+        self.name = name
+        self.arguments = arguments
+
+    def to_message(self):
+        return {"id": self.id, "type": "function", "function": {"name": self.name, "arguments": self.arguments}}
+
+
+# Function to stream one chat completion as text deltas (preceded by lead, if any), collecting the text
+# in parts and any tool call fragments in calls ({index: ToolCall}). Returns False if the request failed,
+# after yielding the error. The caller ends the span.
+def stream_completion(client, messages, span, timings, start, parts, calls=None, lead="", **options):
+    calls = {} if calls is None else calls
+    try:
+        stream = client.chat.completions.create(messages=messages, stream=True, **options)
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            # Tool calls arrive in fragments keyed by index: the id and name first, then the arguments
+            for fragment in delta.tool_calls or ():
+                call = calls.get(fragment.index)
+                if call is None:
+                    call = calls[fragment.index] = ToolCall(fragment.id, '', '')
+                if fragment.function is not None:
+                    call.name += fragment.function.name or ''
+                    call.arguments += fragment.function.arguments or ''
+            if delta.content:
+                if 'time_to_first_token' not in timings:
+                    timings['time_to_first_token'] = time.perf_counter() - start
+                if lead and not parts:
+                    yield lead
+                parts.append(delta.content)
+                yield delta.content
+    except Exception as e:
+        span.set('error', type(e).__name__)
+        yield f"Error: {str(e)}"
+        return False
+    finally:
+        # Streamed chunks carry no usage, so token counts are estimated locally
+        span.set('prompt_tokens', count_messages_tokens(messages))
+        span.set('completion_tokens', count_text_tokens("".join(parts)))
+    return True
+
+
+# Runs the model with the tools above: every tool call of a step runs concurrently on the engine's
+# tool pool, results go back as JSON tool messages, and the loop stops after max_rounds round trips.
+# Tool calls and results only live in the request messages; the session records the final reply.
+class ToolDispatcher:
+    def __init__(self, engine, max_rounds=MAX_TOOL_ROUNDS):
+        self.engine = engine
+        self.max_rounds = max_rounds
+        self.handlers = {
+            'get_flight_status': self.flight_status,
+            'get_flight_schedules': self.flight_schedules,
+            'get_weather_info': self.weather_info,
+            'get_baggage_policy': lambda session: {'policy': 'baggage', 'details': get_baggage_policy()},
+            'get_cancellation_policy': lambda session: {'policy': 'cancellation', 'details': get_cancellation_policy()},
+            'get_frequent_flyer_info': lambda session: {'policy': 'frequent_flyer', 'details': get_frequent_flyer_info()},
+        }
+
+    # Tool handlers: each takes the session plus the model's arguments and returns a JSON-serializable dict
+
+    def flight_status(self, session, flight_number):
+        engine = self.engine
+        flight_number = flight_number.replace(' ', '').upper()
+        status_code, data = engine.fetch_flight_status(flight_number)
+        if status_code != 200:
+            return {'error': f"Flight data unavailable (status code {status_code})"}
+        if not data.get('data'):
+            return {'error': f"No flight found with number {flight_number}"}
+        record = data['data'][0]
+        departure, arrival = _flight_end(record.get('departure')), _flight_end(record.get('arrival'))
+        reports = engine.weather.lookup_many(
+            [departure['iata'], arrival['iata']], PRIORITY_INTERACTIVE, engine.config.weather_timeout
+        )
+        for end in (departure, arrival):
+            report = reports.get(end['iata'])
+            end['weather'] = report.to_dict() if report is not None else None
+        # Keep following the flight so later changes are pushed to the session
+        if engine.config.track_flights:
+            engine.poller.subscribe(session.session_id, flight_number, record)
+        return {
+            'flight_number': (record.get('flight') or {}).get('iata') or flight_number,
+            'airline': (record.get('airline') or {}).get('name'),
+            'status': record.get('flight_status'),
+            'departure': departure,
+            'arrival': arrival,
+        }
+
+    def flight_schedules(self, session, departure, arrival, date, sort_by='departure', airline=None):
+        engine = self.engine
+        departure_code, arrival_code = resolve_place(departure), resolve_place(arrival)
+        if not departure_code or not arrival_code:
+            return {'error': f"Unknown airport: {departure if not departure_code else arrival}"}
+        view, message = engine.get_flight_schedule_view(departure_code, arrival_code, date)
+        if view is None:
+            return {'error': message}
+        # The full result stays browsable with the schedule pager
+        session.schedule = view
+        records = select_records(view.records, sort_by if sort_by in SORT_KEYS else 'departure', airline)
+        airports = {record.departure_iata for record in records} | {record.arrival_iata for record in records}
+        reports = engine.weather.lookup_many(airports, PRIORITY_INTERACTIVE, engine.config.weather_timeout)
+        flights = []
+        for record in records[:MAX_TOOL_FLIGHTS]:
+            flight = record.to_dict()
+            for end, airport, scheduled in (
+                ('departure', record.departure_iata, record.departure_scheduled),
+                ('arrival', record.arrival_iata, record.arrival_scheduled),
+            ):
+                report = reports.get(airport)
+                flight[f"{end}_weather"] = report.brief(parse_timestamp(scheduled)) if report is not None else None
+            flights.append(flight)
+        return {
+            'departure': departure_code, 'arrival': arrival_code, 'date': date,
+            'total_flights': len(records), 'flights': flights,
+            'more_in_schedule_view': len(records) > len(flights),
+        }
+
+    def weather_info(self, session, location):
+        report = self.engine.weather.lookup(location, PRIORITY_INTERACTIVE, self.engine.config.weather_timeout)
+        if report is None:
+            return {'location': location, 'error': "Weather information not available"}
+        return {'location': location, **report.to_dict()}
+
+    # Function to run one tool call and encode its result (or error) as JSON for the model
+    def run_tool(self, session, call, parent):
+        handler = self.handlers.get(call.name)
+        with self.engine.tracer.activate(parent), self.engine.tracer.span(f"tool_call.{call.name}") as span:
+            if handler is None:
+                result = {'error': f"Unknown tool {call.name}"}
+            else:
+                try:
+                    arguments = json.loads(call.arguments or '{}')
+                    result = handler(session, **arguments)
+                except (ValueError, TypeError) as error:
+                    span.set('error', type(error).__name__)
+                    result = {'error': f"Invalid arguments for {call.name}: {error}"}
+                except Exception as error:
+                    logger.exception("Tool %s failed", call.name)
+                    span.set('error', type(error).__name__)
+                    result = {'error': f"{call.name} failed"}
+        return json.dumps(result, default=str, ensure_ascii=False)
+
+    # Function to run every tool call of one step at the same time; returns the tool messages in call order
+    def run_tools(self, session, calls, parent):
+        futures = [
+            self.engine.executor.submit(contextvars.copy_context().run, self.run_tool, session, call, parent)
+            for call in calls[:MAX_TOOL_CALLS_PER_STEP]
+        ]
+        deadline = time.monotonic() + TOOL_TIMEOUT
+        messages = []
+        for call, future in zip(calls, futures):
+            try:
+                content = future.result(timeout=max(0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                content = json.dumps({'error': f"{call.name} timed out"})
+            messages.append({"role": "tool", "tool_call_id": call.id, "content": content})
+        for call in calls[MAX_TOOL_CALLS_PER_STEP:]:
+            messages.append({
+                "role": "tool", "tool_call_id": call.id,
+                "content": json.dumps({'error': f"Too many tool calls in one step (limit {MAX_TOOL_CALLS_PER_STEP})"}),
+            })
+        return messages
+
+    def _step_options(self, round_number):
+        # The last round offers no tools, so the model answers with what it has
+        if round_number < self.max_rounds - 1:
+            return {'tools': TOOL_SCHEMAS, 'tool_choice': 'auto'}
+        return {}
+
+    def _continue(self, messages, content, calls, session, parent):
+        messages.append({"role": "assistant", "content": content or None, "tool_calls": [call.to_message() for call in calls]})
+        messages.extend(self.run_tools(session, calls, parent))
+
+    # Function to answer a turn, running the tools the model asks for; returns (reply, tools_used)
+    def complete(self, session, messages):
+        engine = self.engine
+        messages = list(messages)
+        tools_used = False
+        with engine.tracer.span('tools.dispatch') as dispatch:
+            for round_number in range(self.max_rounds):
+                with engine.tracer.span('llm.completion') as span:
+                    try:
+                        response = engine.client.chat.completions.create(
+                            model=engine.config.model, messages=messages, **self._step_options(round_number)
+                        )
+                    except Exception as e:
+                        span.set('error', type(e).__name__)
+                        return f"Error: {str(e)}", tools_used
+                    if response.usage is not None:
+                        span.set('prompt_tokens', response.usage.prompt_tokens)
+                        span.set('completion_tokens', response.usage.completion_tokens)
+                message = response.choices[0].message
+                if not message.tool_calls:
+                    dispatch.set('rounds', round_number + 1)
+                    return message.content or EMPTY_REPLY, tools_used
+                calls = [ToolCall(call.id, call.function.name, call.function.arguments) for call in message.tool_calls]
+                tools_used = True
+                self._continue(messages, message.content, calls, session, dispatch)
+        return "Error: no reply after the tool calls", tools_used
+
+    # Function to stream a turn as text deltas, running requested tools between the streamed steps.
+    # state['tools_used'] tells the caller whether the reply depends on live data.
+    def stream(self, session, messages, timings, parent, state):
+        engine = self.engine
+        messages = list(messages)
+        dispatch = engine.tracer.start_span('tools.dispatch', parent)
+        start = time.perf_counter()
+        # Text the model streamed before asking for tools stays on screen; later steps start a new paragraph
+        shown = False
+        try:
+            for round_number in range(self.max_rounds):
+                span = engine.tracer.start_span('llm.stream', dispatch)
+                parts = []
+                calls = {}
+                try:
+                    completed = yield from stream_completion(
+                        engine.client, messages, span, timings, start, parts, calls, "\n\n" if shown else "",
+                        model=engine.config.model, **self._step_options(round_number)
+                    )
+                finally:
+                    span.end()
+                if not completed:
+                    return
+                shown = shown or bool(parts)
+                if not calls:
+                    dispatch.set('rounds', round_number + 1)
+                    if not parts:
+                        yield EMPTY_REPLY
+                    return
+                state['tools_used'] = True
+                self._continue(messages, "".join(parts), [calls[index] for index in sorted(calls)], session, dispatch)
+            yield "Error: no reply after the tool calls"
+        finally:
+            timings['total_time'] = time.perf_counter() - start
+            dispatch.end()
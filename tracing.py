@@ -0,0 +1,265 @@
+import bisect
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger("aerochat")
+
+# Upper bounds (in seconds) of the latency histogram buckets exported per span name
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Finished spans buffered for the trace file before new ones are dropped
+MAX_PENDING_SPANS = 10000
+
+# Seconds between flushes of the trace file
+TRACE_FLUSH_INTERVAL = 1.0
+
+# Name of the span covering one chat turn; its intent attribute feeds the per-intent turn counter
+TURN_SPAN = 'turn'
+
+_current_span = contextvars.ContextVar("aerochat_span", default=None)
+_span_ids = itertools.count(1)
+
+
+# Function to escape a Prometheus label value
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# One timed operation within a turn. Attributes with known names feed the metrics:
+# bytes (payload size), cache (hit/miss), prompt_tokens/completion_tokens and error.
+class Span:
+    __slots__ = ('tracer', 'name', 'trace_id', 'span_id', 'parent_id', 'start', 'duration', 'attributes')
+
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(8).hex()
+        self.span_id = next(_span_ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.perf_counter()
+        self.duration = None
+        self.attributes = attributes
+
+    def set(self, name, value):
+        self.attributes[name] = value
+
+    def end(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.start
+            self.tracer._finish(self)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id,
+            'name': self.name, 'duration': self.duration, 'attributes': self.attributes,
+        }
+
+
+# Context manager making a span the parent of the spans opened inside it (and ending it on exit)
+class _ActiveSpan:
+    __slots__ = ('span', 'token', 'end_on_exit')
+
+    def __init__(self, span, end_on_exit=True):
+        self.span = span
+        self.token = None
+        self.end_on_exit = end_on_exit
+
+    def __enter__(self):
+        self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, error_type, error, traceback):
+        _current_span.reset(self.token)
+        if error_type is not None:
+            self.span.attributes['error'] = error_type.__name__
+        if self.end_on_exit:
+            self.span.end()
+        return False
+
+
+# Per-span-name aggregates exported as Prometheus metrics
+class _SpanStats:
+    __slots__ = ('buckets', 'count', 'total', 'errors', 'bytes', 'cache')
+
+    def __init__(self):
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.errors = 0
+        self.bytes = 0
+        self.cache = {}
+
+
+# In-process tracer: spans are aggregated into latency histograms and counters under one short lock,
+# and optionally written (sampled) to a JSONL trace file by a background thread
+class Tracer:
+    def __init__(self, trace_path=None, sample_rate=1.0):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._tokens = {'prompt': 0, 'completion': 0}
+        self._turns = {}
+        self.trace_path = None
+        self.sample_rate = sample_rate
+        self._pending = queue.Queue(maxsize=MAX_PENDING_SPANS)
+        self._writer = None
+        self.dropped_spans = 0
+        if trace_path:
+            self.open_trace_file(trace_path, sample_rate)
+
+    # Function to start writing finished spans to a JSONL file, keeping a fraction of the turns
+    def open_trace_file(self, trace_path, sample_rate=None):
+        with self._lock:
+            self.trace_path = trace_path
+            if sample_rate is not None:
+                self.sample_rate = sample_rate
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._write_traces, name="aerochat-trace-writer", daemon=True)
+                self._writer.start()
+
+    # Function to open a span as a child of the current one, for use in a with block
+    def span(self, name, **attributes):
+        return _ActiveSpan(Span(self, name, _current_span.get(), attributes))
+
+    # Function to open a span that is ended explicitly (e.g. around a generator consumed elsewhere)
+    def start_span(self, name, parent=None, **attributes):
+        return Span(self, name, parent if parent is not None else _current_span.get(), attributes)
+
+    # Function to make an explicitly ended span the parent of the spans opened in a with block
+    def activate(self, span):
+        return _ActiveSpan(span, end_on_exit=False)
+
+    def current_span(self):
+        return _current_span.get()
+
+    def _finish(self, span):
+        attributes = span.attributes
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = _SpanStats()
+            stats.buckets[bisect.bisect_left(DURATION_BUCKETS, span.duration)] += 1
+            stats.count += 1
+            stats.total += span.duration
+            if attributes:
+                if 'error' in attributes:
+                    stats.errors += 1
+                if 'bytes' in attributes:
+                    stats.bytes += attributes['bytes']
+                if 'cache' in attributes:
+                    stats.cache[attributes['cache']] = stats.cache.get(attributes['cache'], 0) + 1
+                if 'prompt_tokens' in attributes:
+                    self._tokens['prompt'] += attributes['prompt_tokens']
+                if 'completion_tokens' in attributes:
+                    self._tokens['completion'] += attributes['completion_tokens']
+                if span.name == TURN_SPAN and 'intent' in attributes:
+                    self._turns[attributes['intent']] = self._turns.get(attributes['intent'], 0) + 1
+
+        if self.trace_path and self._sampled(span.trace_id):
+            try:
+                self._pending.put_nowait(span)
+            except queue.Full:
+                self.dropped_spans += 1
+
+    # Sampling is decided per trace so a sampled turn keeps all of its spans
+    def _sampled(self, trace_id):
+        if self.sample_rate >= 1:
+            return True
+        return int(trace_id[:8], 16) < self.sample_rate * 0x100000000
+
+    def _write_traces(self):
+        while True:
+            spans = [self._pending.get()]
+            time.sleep(TRACE_FLUSH_INTERVAL)
+            while True:
+                try:
+                    spans.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with open(self.trace_path, 'a', encoding='utf-8') as trace_file:
+                    trace_file.writelines(json.dumps(span.to_dict(), default=str) + "\n" for span in spans)
+            except OSError:
+                logger.exception("Writing %d spans to %s failed", len(spans), self.trace_path)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    'count': stats.count, 'total': stats.total, 'errors': stats.errors,
+                    'bytes': stats.bytes, 'cache': dict(stats.cache),
+                }
+                for name, stats in self._stats.items()
+            }
+
+    # Function to render the collected metrics in the Prometheus text exposition format
+    def render_prometheus(self):
+        with self._lock:
+            stats_items = sorted((name, stats) for name, stats in self._stats.items())
+            tokens = dict(self._tokens)
+            turns = sorted(self._turns.items())
+            lines = [
+                "# HELP aerochat_span_duration_seconds Time spent in each instrumented operation.",
+                "# TYPE aerochat_span_duration_seconds histogram",
+            ]
+            for name, stats in stats_items:
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS + ('+Inf',), stats.buckets):
+                    cumulative += count
+                    lines.append(f'aerochat_span_duration_seconds_bucket{{span="{_label(name)}",le="{bound}"}} {cumulative}')
+                lines.append(f'aerochat_span_duration_seconds_sum{{span="{_label(name)}"}} {stats.total}')
+                lines.append(f'aerochat_span_duration_seconds_count{{span="{_label(name)}"}} {stats.count}')
+            lines += [
+                "# HELP aerochat_span_errors_total Operations that raised or returned an error.",
+                "# TYPE aerochat_span_errors_total counter",
+            ]
+            lines += [f'aerochat_span_errors_total{{span="{_label(name)}"}} {stats.errors}' for name, stats in stats_items]
+            lines += [
+                "# HELP aerochat_payload_bytes_total Upstream payload bytes received.",
+                "# TYPE aerochat_payload_bytes_total counter",
+            ]
+            lines += [
+                f'aerochat_payload_bytes_total{{span="{_label(name)}"}} {stats.bytes}'
+                for name, stats in stats_items if stats.bytes
+            ]
+            lines += [
+                "# HELP aerochat_cache_lookups_total Cache lookups by outcome.",
+                "# TYPE aerochat_cache_lookups_total counter",
+            ]
+            for name, stats in stats_items:
+                for outcome, count in sorted(stats.cache.items()):
+                    lines.append(
+                        f'aerochat_cache_lookups_total{{span="{_label(name)}",outcome="{_label(outcome)}"}} {count}'
+                    )
+            lines += [
+                "# HELP aerochat_llm_tokens_total Tokens sent to and received from the LLM.",
+                "# TYPE aerochat_llm_tokens_total counter",
+            ]
+            lines += [f'aerochat_llm_tokens_total{{type="{kind}"}} {count}' for kind, count in sorted(tokens.items())]
+            lines += [
+                "# HELP aerochat_turns_total Chat turns by routed intent.",
+                "# TYPE aerochat_turns_total counter",
+            ]
+            lines += [f'aerochat_turns_total{{intent="{_label(intent)}"}} {count}' for intent, count in turns]
+        return "\n".join(lines) + "\n"
+
+
+# Decorator wrapping a method in a span of the given name, using the object's tracer attribute
+def traced(name):
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# Process-wide tracer shared by the engine, the upstream client and the clients
+default_tracer = Tracer()
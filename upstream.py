@@ -0,0 +1,185 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ratelimit import default_limiter, PRIORITY_INTERACTIVE
+from tracing import default_tracer
+
+# Base URLs of the upstream providers (override through the environment to point at a local stub server)
+DEFAULT_BASE_URLS = {
+    'aviationstack': os.environ.get('AVIATIONSTACK_BASE_URL', 'https://api.aviationstack.com/v1'),
+    'openweather': os.environ.get('OPENWEATHER_BASE_URL', 'https://api.openweathermap.org/data/2.5'),
+}
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# Status codes that are worth retrying
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+# Raised when a provider is unreachable, keeps failing, or its circuit breaker is open
+class UpstreamUnavailable(Exception):
+    def __init__(self, provider, reason, status_code=None):
+        super().__init__(f"{provider} unavailable: {reason}")
+        self.provider = provider
+        self.reason = reason
+        self.status_code = status_code
+
+
+# Raised without calling the provider when the rate limiter or the monthly quota refuses the request
+class RateLimited(UpstreamUnavailable):
+    def __init__(self, provider, reason='rate limited'):
+        super().__init__(provider, reason, 429)
+
+
+# Per-provider circuit breaker: opens after consecutive failures, lets a single probe through after a cool-down
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self):
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._probing = False
+
+    # Function to give back an unused half-open probe (the request ended before reaching the provider)
+    def release_probe(self):
+        with self._lock:
+            self._probing = False
+
+
+# Shared HTTP client with keep-alive connection pools, timeouts, jittered retries and circuit breakers
+class UpstreamClient:
+    def __init__(self, base_urls=None, timeout=DEFAULT_TIMEOUT, max_retries=2, backoff_base=0.25,
+                 backoff_cap=2.0, pool_maxsize=20, failure_threshold=5, reset_timeout=30, tracer=None,
+                 limiter=None):
+        self.base_urls = dict(DEFAULT_BASE_URLS, **(base_urls or {}))
+        self.tracer = tracer if tracer is not None else default_tracer
+        # Optional RateLimiter consulted before every attempt (None sends requests unthrottled)
+        self.limiter = limiter
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.base_urls), pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.breakers = {
+            provider: CircuitBreaker(failure_threshold, reset_timeout) for provider in self.base_urls
+        }
+
+    # Seconds the provider asked us to wait (Retry-After), or None
+    def _retry_after(self, response):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return None
+
+    # Seconds to sleep before the next attempt; never more than backoff_cap within a call
+    def _backoff(self, attempt, response=None):
+        retry_after = self._retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_cap)
+        # Full jitter: sleep a random amount up to the exponential backoff
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    # Function to GET a provider endpoint, returning the final response or raising UpstreamUnavailable.
+    # With stream=True the body is left unread so callers can parse it incrementally from response.raw.
+    # The priority decides the order in which the rate limiter hands out tokens.
+    def get(self, provider, path, params=None, stream=False, priority=PRIORITY_INTERACTIVE):
+        with self.tracer.span(f"upstream.{provider}", path=path, priority=priority) as span:
+            breaker = self.breakers[provider]
+            if not breaker.allow_request():
+                raise UpstreamUnavailable(provider, 'circuit open')
+
+            url = f"{self.base_urls[provider].rstrip('/')}/{path.lstrip('/')}"
+            settled = False
+            try:
+                for attempt in range(self.max_retries + 1):
+                    if self.limiter is not None and not self.limiter.acquire(provider, priority):
+                        span.set('rate_limited', True)
+                        raise RateLimited(provider)
+                    span.set('attempts', attempt + 1)
+                    response = None
+                    try:
+                        response = self.session.get(url, params=params, timeout=self.timeout, stream=stream)
+                    except requests.RequestException as error:
+                        failure = UpstreamUnavailable(provider, str(error))
+                    else:
+                        span.set('status_code', response.status_code)
+                        if response.status_code not in RETRY_STATUS_CODES:
+                            breaker.record_success()
+                            settled = True
+                            if not stream:
+                                span.set('bytes', len(response.content))
+                            return response
+                        failure = UpstreamUnavailable(provider, f"HTTP {response.status_code}", response.status_code)
+                        if response.status_code == 429 and self.limiter is not None:
+                            # Honour the provider's full Retry-After for every later caller, not just this one
+                            retry_after = self._retry_after(response)
+                            self.limiter.penalize(
+                                provider, retry_after if retry_after is not None else self._backoff(attempt)
+                            )
+                        # Release the pooled connection of an unread streamed body before retrying
+                        response.close()
+                    if attempt < self.max_retries:
+                        time.sleep(self._backoff(attempt, response))
+
+                breaker.record_failure()
+                settled = True
+                raise failure
+            finally:
+                # Refused by the limiter or failed unexpectedly: a half-open breaker must not keep
+                # its probe slot, or the provider would stay unavailable until a restart
+                if not settled:
+                    breaker.release_probe()
+
+
+# Process-wide client shared by every Streamlit session
+default_client = UpstreamClient(limiter=default_limiter)
@@ -0,0 +1,247 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from airports import get_airport_index
+from cache import make_key
+from ratelimit import PRIORITY_BACKGROUND, PRIORITY_ENRICHMENT
+
+logger = logging.getLogger("aerochat")
+
+# Side of a weather grid cell in degrees (about 11 km); airports in the same cell share one lookup
+GRID_DEGREES = 0.1
+
+# 3-hour forecast periods fetched per cell (24 hours ahead)
+FORECAST_PERIODS = 8
+
+# A forecast period is used for times within this many seconds of it; later times get current conditions
+FORECAST_SLACK = 90 * 60
+
+# Forecast periods shown in a weather answer
+FORECAST_SHOWN = 3
+
+# Worker threads for weather lookups, and how many of them prefetches may occupy at once
+DEFAULT_WEATHER_WORKERS = 6
+MAX_PREFETCHES = 4
+
+ForecastPoint = namedtuple('ForecastPoint', ['time', 'description', 'temperature'])
+
+
+# Function to snap coordinates to the centre-aligned grid cell used as the lookup key
+def grid_cell(lat, lon):
+    return (
+        round(round(lat / GRID_DEGREES) * GRID_DEGREES, 4),
+        round(round(lon / GRID_DEGREES) * GRID_DEGREES, 4),
+    )
+
+
+# Function to parse an AviationStack timestamp ("2025-03-05T10:05:00+00:00") to epoch seconds
+def parse_timestamp(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+# Current conditions in one grid cell plus its short-range forecast
+class WeatherReport:
+    __slots__ = ('description', 'temperature', 'humidity', 'forecast')
+
+    def __init__(self, description, temperature, humidity, forecast=()):
+        self.description = description
+        self.temperature = temperature
+        self.humidity = humidity
+        self.forecast = forecast
+
+    # Build a report from OpenWeather /weather and (optionally) /forecast payloads
+    @classmethod
+    def from_api(cls, current, forecast=None):
+        points = []
+        for period in (forecast or {}).get('list') or []:
+            try:
+                points.append(ForecastPoint(
+                    period['dt'], period['weather'][0]['description'].capitalize(), period['main']['temp']
+                ))
+            except (KeyError, IndexError, TypeError):
+                continue
+        return cls(
+            current['weather'][0]['description'].capitalize(), current['main']['temp'], current['main']['humidity'],
+            tuple(points)
+        )
+
+    # Function to pick the forecast period closest to a time, or None outside the forecast
+    def forecast_at(self, timestamp):
+        if timestamp is None or not self.forecast:
+            return None
+        point = min(self.forecast, key=lambda point: abs(point.time - timestamp))
+        return point if abs(point.time - timestamp) <= FORECAST_SLACK else None
+
+    # One-line summary, forecast for the given time when it is covered, otherwise current conditions
+    def brief(self, timestamp=None):
+        point = self.forecast_at(timestamp)
+        if point is not None:
+            return f"{point.description}, {point.temperature}°C (forecast)"
+        return f"{self.description}, {self.temperature}°C"
+
+    def to_dict(self):
+        return {
+            'condition': self.description, 'temperature_c': self.temperature, 'humidity': self.humidity,
+            'forecast': [
+                {
+                    'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(point.time)),
+                    'condition': point.description, 'temperature_c': point.temperature,
+                }
+                for point in self.forecast
+            ],
+        }
+
+    def to_markdown(self):
+        text = (
+            f"- **Condition:** {self.description}\n"
+            f"- **Temperature:** {self.temperature}°C\n"
+            f"- **Humidity:** {self.humidity}%"
+        )
+        upcoming = [point for point in self.forecast if point.time > time.time()][:FORECAST_SHOWN]
+        if upcoming:
+            periods = ", ".join(
+                f"{time.strftime('%H:%M', time.gmtime(point.time))} UTC {point.description.lower()} {point.temperature}°C"
+                for point in upcoming
+            )
+            text += f"\n- **Next hours:** {periods}"
+        return text
+
+
+# Weather lookups grouped by grid cell. Every location resolving to the same cell shares one
+# current-conditions call and one forecast call, both cached through the fetch function, and a
+# batch of locations is looked up on a bounded pool with one task per distinct call.
+class WeatherService:
+    def __init__(self, fetch, cache, workers=DEFAULT_WEATHER_WORKERS):
+        # fetch(endpoint, params, priority) -> (status_code, data), cached under make_key(endpoint, **params)
+        self.fetch = fetch
+        self.cache = cache
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._prefetching = set()
+        self.lookups = 0
+        self.prefetches = 0
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="aerochat-weather")
+            return self._executor
+
+    # Function to turn a location into query params: the grid cell of a known airport, city or alias,
+    # otherwise the name itself
+    def locate(self, location):
+        if not location:
+            return None
+        airport = get_airport_index().resolve(location)
+        if airport:
+            lat, lon = grid_cell(airport.lat, airport.lon)
+            return {'lat': lat, 'lon': lon, 'units': 'metric'}
+        return {'q': location, 'units': 'metric'}
+
+    def _calls(self, params):
+        return (
+            ('weather', params),
+            ('forecast', {**params, 'cnt': FORECAST_PERIODS}),
+        )
+
+    def _run(self, endpoint, params, priority):
+        try:
+            status_code, data = self.fetch(endpoint, params, priority)
+        except Exception:
+            logger.exception("Weather %s lookup failed for %s", endpoint, params)
+            return None
+        return data if status_code == 200 else None
+
+    # Function to look up several locations at once; returns {location: WeatherReport or None}.
+    # Lookups still running at the timeout are left to finish in the background (and fill the cache).
+    def lookup_many(self, locations, priority=PRIORITY_ENRICHMENT, timeout=None):
+        cells = {}
+        for location in set(locations):
+            params = self.locate(location)
+            if params is not None:
+                cells.setdefault(tuple(sorted(params.items())), []).append(location)
+        # Forecasts are extras: below the monthly budget threshold they are skipped for non-interactive calls
+        priorities = {'weather': priority, 'forecast': max(priority, PRIORITY_ENRICHMENT)}
+        payloads = {}
+        futures = {}
+        for cell in cells:
+            for endpoint, params in self._calls(dict(cell)):
+                if make_key(endpoint, **params) in self.cache:
+                    # Cached (e.g. prefetched): answered inline without a trip through the pool
+                    payloads[cell, endpoint] = self._run(endpoint, params, priorities[endpoint])
+                    continue
+                # Run each lookup in a copy of the caller's context so its spans stay part of the turn
+                futures[cell, endpoint] = self.executor.submit(
+                    contextvars.copy_context().run, self._run, endpoint, params, priorities[endpoint]
+                )
+        with self._lock:
+            self.lookups += len(payloads) + len(futures)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for key, future in futures.items():
+            try:
+                payloads[key] = future.result(None if deadline is None else max(0, deadline - time.monotonic()))
+            except Exception:
+                payloads[key] = None
+
+        reports = dict.fromkeys(locations)
+        for cell, cell_locations in cells.items():
+            current = payloads.get((cell, 'weather'))
+            if current is None:
+                continue
+            try:
+                report = WeatherReport.from_api(current, payloads.get((cell, 'forecast')))
+            except (KeyError, IndexError, TypeError):
+                logger.warning("Unexpected weather payload for %s", dict(cell))
+                continue
+            for location in cell_locations:
+                reports[location] = report
+        return reports
+
+    def lookup(self, location, priority=PRIORITY_ENRICHMENT, timeout=None):
+        return self.lookup_many([location], priority, timeout)[location]
+
+    # Function to warm the cache for locations about to be shown (tracked flights, schedule searches)
+    # without waiting. Cells already cached or being fetched are skipped, and at most MAX_PREFETCHES
+    # calls run at a time so prefetching never takes every worker.
+    def prefetch(self, locations, priority=PRIORITY_BACKGROUND):
+        submitted = 0
+        for location in set(locations):
+            params = self.locate(location)
+            if params is None:
+                continue
+            for endpoint, call_params in self._calls(params):
+                key = make_key(endpoint, **call_params)
+                if key in self.cache:
+                    continue
+                with self._lock:
+                    if key in self._prefetching or len(self._prefetching) >= MAX_PREFETCHES:
+                        continue
+                    self._prefetching.add(key)
+                    self.prefetches += 1
+                self.executor.submit(self._prefetch_one, key, endpoint, call_params, priority)
+                submitted += 1
+        return submitted
+
+    def _prefetch_one(self, key, endpoint, params, priority):
+        try:
+            self._run(endpoint, params, priority)
+        finally:
+            with self._lock:
+                self._prefetching.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {'lookups': self.lookups, 'prefetches': self.prefetches}